@@ -1,5 +1,9 @@
 from django.contrib import admin
-from django.utils.html import format_html_join
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import build_q_object_from_lookup_parameters
+from django.core.exceptions import ValidationError
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language_bidi
 from django.utils.translation import gettext_lazy as _
 from django_mptt_admin.admin import DjangoMpttAdmin
 from mptt.admin import TreeRelatedFieldListFilter
@@ -7,13 +11,44 @@ from mptt.admin import TreeRelatedFieldListFilter
 from document.models import DocumentType
 from netbelge.path import normalize_path
 
-from .models import Department
+from .cache import department_choices
+from .models import Department, subtree_lookups
 
 
 class DepartmentFilter(TreeRelatedFieldListFilter):
     title = "Üst Birim"
     parameter_name = "parent__id"
 
+    def field_choices(self, field, request, model_admin):
+        # Build the indented choices from one cached, ordered tree query
+        # instead of get_choices() plus a second lookup of every node's level.
+        indent = getattr(model_admin, "mptt_level_indent", self.mptt_level_indent)
+        side = "right" if get_language_bidi() else "left"
+        return [
+            (pk, name, mark_safe(f' style="padding-{side}:{indent * level}px"'))
+            for pk, name, level in department_choices()
+        ]
+
+    def queryset(self, request, queryset):
+        # Match the selected department and its descendants with one range
+        # on the joined lft/rght columns instead of mptt's IN list of ids.
+        parameters = dict(self.used_parameters)
+        parameters.pop(self.changed_lookup_kwarg, None)
+        try:
+            queryset = queryset.filter(
+                build_q_object_from_lookup_parameters(parameters)
+            )
+            if self.lookup_val:
+                department = Department.objects.only("tree_id", "lft", "rght").get(
+                    pk=self.lookup_val
+                )
+                queryset = queryset.filter(
+                    **subtree_lookups(department, self.field_path)
+                )
+        except (Department.DoesNotExist, ValueError, ValidationError) as exc:
+            raise IncorrectLookupParameters(exc)
+        return queryset
+
 
 @admin.register(Department)
 class DepartmentAdmin(DjangoMpttAdmin):
@@ -55,7 +90,3 @@ class DepartmentAdmin(DjangoMpttAdmin):
         if not change:
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
-
-    @admin.display(description=_("Tam Dizin"))
-    def full_path(self, obj):
-        return obj.full_path
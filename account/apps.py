@@ -6,3 +6,6 @@ class AccountConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "account"
     verbose_name = _("Hesap")
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,27 @@
+from django.conf import settings
+
+from netbelge.cache import ObjectCache, TieredCache
+
+from .models import Department
+
+tree_cache = TieredCache(
+    "netbelge-tree",
+    maxsize=16,
+    timeout=settings.DEPARTMENT_TREE_CACHE_TIMEOUT,
+    local_timeout=settings.PATH_CACHE_LOCAL_TIMEOUT,
+)
+
+department_cache = ObjectCache(
+    "netbelge-department", timeout=settings.RESPONSE_CACHE_TIMEOUT
+)
+
+
+def department_choices():
+    return tree_cache.get_or_set(
+        "choices",
+        lambda: list(
+            Department.objects.order_by("tree_id", "lft").values_list(
+                "pk", "name", "level"
+            )
+        ),
+    )
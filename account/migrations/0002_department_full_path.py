@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+def populate_full_path(apps, schema_editor):
+    Department = apps.get_model("account", "Department")
+    full_paths = {}
+    for pk, parent_id, path in Department.objects.order_by(
+        "tree_id", "lft"
+    ).values_list("pk", "parent_id", "path"):
+        if parent_id:
+            full_paths[pk] = f"{full_paths[parent_id]}/{path}"
+        else:
+            full_paths[pk] = path
+        Department.objects.filter(pk=pk).update(full_path=full_paths[pk])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="department",
+            name="full_path",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=1000,
+                null=True,
+                verbose_name="Tam Dizin",
+            ),
+        ),
+        migrations.RunPython(populate_full_path, migrations.RunPython.noop),
+    ]
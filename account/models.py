@@ -1,5 +1,7 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.utils.html import format_html_join
 from django.utils.translation import gettext_lazy as _
 from mptt.models import MPTTModel, TreeForeignKey
@@ -27,6 +29,14 @@ class Department(MPTTModel):
         null=True,
     )
 
+    full_path = models.CharField(
+        _("Tam Dizin"),
+        max_length=1000,
+        blank=True,
+        editable=False,
+        null=True,
+    )
+
     description = models.TextField(_("Açıklama"), blank=True, null=True)
 
     created_at = models.DateTimeField(_("Oluşturulma Tarihi"), auto_now_add=True)
@@ -58,10 +68,74 @@ class Department(MPTTModel):
 
     def save(self, *args, **kwargs):
         self.path = normalize_path(self.name)
-        super().save(*args, **kwargs)
-
-    @property
-    def full_path(self):
+        if self.parent_id is not None:
+            # mptt positions the node from the parent instance's tree columns.
+            self.parent.refresh_from_db(
+                fields=["full_path", "tree_id", "lft", "rght", "level"]
+            )
         if self.parent:
-            return f"{self.parent.full_path}/{self.path}"
-        return self.path
+            self.full_path = f"{self.parent.full_path}/{self.path}"
+        else:
+            self.full_path = self.path
+
+        # The parent and path before this save; mptt's move_node() already
+        # rewrites its own cached parent, so signal handlers read them here.
+        # The tree columns are taken from the table as well (here and for the
+        # parent above): mptt writes back whatever the instances hold, and
+        # ones loaded before other nodes were inserted or moved would corrupt
+        # the tree.
+        old_full_path = self._previous_parent_id = None
+        if self.pk:
+            row = (
+                Department.objects.filter(pk=self.pk)
+                .values_list(
+                    "full_path", "parent_id", "tree_id", "lft", "rght", "level"
+                )
+                .first()
+            )
+            if row is not None:
+                old_full_path, self._previous_parent_id = row[:2]
+                self.tree_id, self.lft, self.rght, self.level = row[2:]
+        self._previous_full_path = old_full_path
+
+        # Keep the node and its descendants' paths in one transaction, so
+        # on_commit handlers of the save see the rewritten subtree.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if old_full_path and old_full_path != self.full_path:
+                self.update_descendant_paths(old_full_path)
+
+    def update_descendant_paths(self, old_full_path):
+        # Rewrite the stored full path of every descendant in a single UPDATE
+        # using the lft/rght range maintained by mptt.
+        return self.get_descendants().update(
+            full_path=Concat(
+                Value(self.full_path),
+                Substr("full_path", len(old_full_path) + 1),
+                output_field=models.CharField(),
+            )
+        )
+
+
+def subtree_lookups(department, field="department"):
+    # Rows whose ``field`` is ``department`` or one of its descendants, as a
+    # range on the joined department's lft/rght columns rather than an IN
+    # list of every descendant id.
+    return {
+        f"{field}__tree_id": department.tree_id,
+        f"{field}__lft__gte": department.lft,
+        f"{field}__rght__lte": department.rght,
+    }
+
+
+class SubtreeQuerySet(models.QuerySet):
+    # For models linked to a department: Model.objects.in_subtree(department)
+    # returns the rows of that department and all of its descendants.
+
+    def in_subtree(self, department, field="department"):
+        if not isinstance(department, Department):
+            department = Department.objects.only("tree_id", "lft", "rght").get(
+                pk=department
+            )
+        return self.filter(**subtree_lookups(department, field))
@@ -0,0 +1,19 @@
+from netbelge.api import SparseModelSerializer
+
+from .models import Department
+
+
+class DepartmentSerializer(SparseModelSerializer):
+    class Meta:
+        model = Department
+        fields = (
+            "id",
+            "parent",
+            "name",
+            "path",
+            "full_path",
+            "level",
+            "description",
+            "created_at",
+            "updated_at",
+        )
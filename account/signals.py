@@ -0,0 +1,35 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from . import tree
+from .cache import department_cache, tree_cache
+from .models import Department
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(node_moved, sender=Department)
+def invalidate_department_tree(sender, instance, **kwargs):
+    tree_cache.clear()
+    # A rename or move changes the stored full path of every descendant.
+    department_cache.clear()
+
+
+@receiver(post_save, sender=Department)
+def patch_saved_department(sender, instance, created, **kwargs):
+    parent_ids = {instance.parent_id, instance._previous_parent_id}
+    moved = created or instance.parent_id != instance._previous_parent_id
+    transaction.on_commit(
+        partial(tree.department_saved, instance.pk, parent_ids, moved)
+    )
+
+
+@receiver(post_delete, sender=Department)
+def patch_deleted_department(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(tree.department_deleted, instance.pk, instance.parent_id)
+    )
@@ -1,3 +1,127 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from . import tree
+from .models import Department
+
+
+class DepartmentPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+
+    def create(self, name, parent=None):
+        return Department.objects.create(
+            name=name, parent=parent, created_by=self.user, updated_by=self.user
+        )
+
+    def full_paths(self):
+        return dict(Department.objects.values_list("name", "full_path"))
+
+    def assertTreeConsistent(self):
+        for department in Department.objects.all():
+            self.assertEqual(
+                set(department.get_descendants().values_list("pk", flat=True)),
+                set(
+                    Department.objects.filter(
+                        full_path__startswith=f"{department.full_path}/"
+                    ).values_list("pk", flat=True)
+                ),
+            )
+
+    def test_rename_and_move_rewrite_descendants(self):
+        # The instances are never refreshed: creating "Arşiv" shifts the tree
+        # ids stored in them.
+        root = self.create("Genel Müdürlük")
+        hr = self.create("İnsan Kaynakları", root)
+        self.create("Bordro", hr)
+        archive = self.create("Arşiv")
+        self.assertEqual(
+            self.full_paths()["Bordro"], "genel-mudurluk/insan-kaynaklari/bordro"
+        )
+
+        hr.name = "Personel"
+        hr.save()
+        self.assertEqual(self.full_paths()["Bordro"], "genel-mudurluk/personel/bordro")
+        self.assertTreeConsistent()
+
+        hr.parent = archive
+        hr.save()
+        self.assertEqual(
+            self.full_paths(),
+            {
+                "Genel Müdürlük": "genel-mudurluk",
+                "Arşiv": "arsiv",
+                "Personel": "arsiv/personel",
+                "Bordro": "arsiv/personel/bordro",
+            },
+        )
+        self.assertTreeConsistent()
+
+
+class DepartmentTreeCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, name, parent=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Department.objects.create(
+                name=name, parent=parent, created_by=self.user, updated_by=self.user
+            )
+
+    def assertTreeFresh(self):
+        # Expand everything from the patched cache, then rebuild from scratch.
+        cached = tree.get_tree(depth=tree.MAX_DEPTH)
+        cache.clear()
+        self.assertEqual(cached, tree.get_tree(depth=tree.MAX_DEPTH))
+
+    def test_patches_rename_move_and_delete(self):
+        root = self.create("Genel Müdürlük")
+        hr = self.create("İnsan Kaynakları", root)
+        self.create("Bordro", hr)
+        it = self.create("Bilgi İşlem", root)
+        archive = self.create("Arşiv")
+        self.assertTreeFresh()
+
+        hr.refresh_from_db()
+        hr.name = "Personel"
+        with self.captureOnCommitCallbacks(execute=True):
+            hr.save()
+        self.assertTreeFresh()
+
+        hr.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            hr.move_to(it)
+        self.assertTreeFresh()
+
+        hr.refresh_from_db()
+        hr.parent = archive
+        with self.captureOnCommitCallbacks(execute=True):
+            hr.save()
+        self.assertTreeFresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.get(pk=archive.pk).delete()
+        self.assertTreeFresh()
+
+    def test_tree_endpoint(self):
+        root = self.create("Genel Müdürlük")
+        self.create("Bilgi İşlem", root)
+        self.client.force_login(self.user)
+
+        response = self.client.get("/api/departments/tree/")
+        self.assertEqual(response.json()[0]["full_path"], "genel-mudurluk")
+        self.assertNotIn("children", response.json()[0])
+
+        response = self.client.get("/api/departments/tree/", {"depth": 2})
+        self.assertEqual(
+            response.json()[0]["children"][0]["full_path"],
+            "genel-mudurluk/bilgi-islem",
+        )
+        response = self.client.get("/api/departments/tree/", {"parent": 999})
+        self.assertEqual(response.status_code, 404)
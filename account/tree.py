@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from .models import Department
+
+# The department tree is cached one level at a time: every key holds the
+# compact, ordered children of a single parent. Clients expand the tree
+# lazily, and a save, move or delete only rewrites the levels it touched
+# instead of invalidating a snapshot of the whole hierarchy.
+
+PREFIX = "netbelge-tree:level"
+ROOT = "root"
+MAX_DEPTH = 10
+
+
+def _cache():
+    return caches["default"]
+
+
+def level_key(parent_id):
+    return f"{PREFIX}:{parent_id or ROOT}"
+
+
+def _node(row):
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "full_path": row["full_path"],
+        "has_children": row["rght"] - row["lft"] > 1,
+    }
+
+
+def _rows(queryset):
+    return queryset.order_by("tree_id", "lft").values(
+        "id", "parent_id", "name", "full_path", "lft", "rght"
+    )
+
+
+def build_levels(parent_ids):
+    # Load the children of every requested parent with a single query.
+    parent_ids = set(parent_ids)
+    query = Q(parent_id__in=[pk for pk in parent_ids if pk])
+    if None in parent_ids:
+        query |= Q(parent__isnull=True)
+
+    levels = {pk: [] for pk in parent_ids}
+    for row in _rows(Department.objects.filter(query)):
+        levels[row["parent_id"]].append(_node(row))
+    return levels
+
+
+def store_levels(levels):
+    _cache().set_many(
+        {level_key(pk): nodes for pk, nodes in levels.items()},
+        timeout=settings.DEPARTMENT_TREE_CACHE_TIMEOUT,
+    )
+
+
+def get_levels(parent_ids):
+    keys = {level_key(pk): pk for pk in parent_ids}
+    levels = {keys[key]: nodes for key, nodes in _cache().get_many(keys).items()}
+    missing = [pk for pk in keys.values() if pk not in levels]
+    if missing:
+        built = build_levels(missing)
+        store_levels(built)
+        levels.update(built)
+    return levels
+
+
+def get_tree(parent_id=None, depth=1):
+    # Expand ``depth`` levels below ``parent_id`` with one cache round trip
+    # per level; nodes beyond the last level keep only ``has_children``.
+    nodes = get_levels([parent_id])[parent_id]
+    frontier = nodes
+    for _ in range(min(depth, MAX_DEPTH) - 1):
+        expand = [node for node in frontier if node["has_children"]]
+        if not expand:
+            break
+        levels = get_levels([node["id"] for node in expand])
+        frontier = []
+        for node in expand:
+            node["children"] = levels[node["id"]]
+            frontier.extend(node["children"])
+    return nodes
+
+
+def refresh_subtree(department):
+    # Rewrite every level below ``department`` from one lft/rght range query.
+    levels = {department.pk: []}
+    for row in _rows(department.get_descendants()):
+        levels.setdefault(row["parent_id"], []).append(_node(row))
+        if row["rght"] - row["lft"] > 1:
+            levels.setdefault(row["id"], [])
+    store_levels(levels)
+
+
+def with_grandparents(parent_ids):
+    # Adding or removing a child flips ``has_children`` of its parent, which
+    # lives one level further up.
+    parents = Department.objects.filter(pk__in=[pk for pk in parent_ids if pk])
+    return set(parent_ids) | set(parents.values_list("parent_id", flat=True))
+
+
+def department_saved(pk, parent_ids, moved=False):
+    # ``parent_ids`` holds the parents before and after the save. Both levels
+    # are rebuilt; the subtree is only rewritten when the stored full path
+    # changed, or when the cached level cannot tell.
+    department = Department.objects.filter(pk=pk).first()
+    if department is None:
+        return
+
+    parent_ids = set(parent_ids) | {department.parent_id}
+    previous = None
+    for parent_id in parent_ids:
+        for node in _cache().get(level_key(parent_id)) or ():
+            if node["id"] == pk:
+                previous = node
+
+    if moved:
+        parent_ids = with_grandparents(parent_ids)
+    store_levels(build_levels(parent_ids))
+    if department.is_leaf_node():
+        _cache().delete(level_key(pk))
+    elif previous is None or previous["full_path"] != department.full_path:
+        refresh_subtree(department)
+
+
+def department_deleted(pk, parent_id):
+    # Cascaded children are reported one by one, so only the deleted node's
+    # own level is dropped and the parent rebuilt if it survived.
+    _cache().delete(level_key(pk))
+    if parent_id is None or Department.objects.filter(pk=parent_id).exists():
+        store_levels(build_levels(with_grandparents([parent_id])))
@@ -0,0 +1,8 @@
+from rest_framework.routers import SimpleRouter
+
+from . import views
+
+router = SimpleRouter()
+router.register("departments", views.DepartmentViewSet, basename="department")
+
+urlpatterns = router.urls
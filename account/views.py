@@ -1,3 +1,47 @@
-from django.shortcuts import render
+from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
 
-# Create your views here.
+from netbelge.api import CachedRetrieveMixin, CursorPagination, ModelViewPermissions
+
+from . import tree
+from .cache import department_cache
+from .models import Department
+from .serializers import DepartmentSerializer
+
+
+class DepartmentPagination(CursorPagination):
+    ordering = ("tree_id", "lft")
+
+
+class DepartmentViewSet(CachedRetrieveMixin, viewsets.ReadOnlyModelViewSet):
+    object_cache = department_cache
+    serializer_class = DepartmentSerializer
+    permission_classes = (permissions.IsAuthenticated, ModelViewPermissions)
+    pagination_class = DepartmentPagination
+
+    def get_queryset(self):
+        queryset = Department.objects.all()
+        if self.action == "list" and self.request.query_params.get("parent"):
+            queryset = queryset.filter(parent_id=self.request.query_params["parent"])
+        return queryset
+
+    @action(detail=False)
+    def tree(self, request):
+        # The children of ?parent=<id> (the roots by default), expanded
+        # ?depth=<n> levels deep from the cached per-level snapshot.
+        try:
+            parent_id = int(request.query_params.get("parent") or 0) or None
+            depth = max(1, int(request.query_params.get("depth", 1)))
+        except ValueError:
+            raise ParseError("parent ve depth tam sayı olmalı.")
+
+        nodes = tree.get_tree(parent_id, depth)
+        if (
+            parent_id
+            and not nodes
+            and not Department.objects.filter(pk=parent_id).exists()
+        ):
+            raise NotFound()
+        return Response(nodes)
@@ -1,14 +1,48 @@
 from django import forms
-from django.contrib import admin
-from django.db import models
-from django.utils.html import format_html_join
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.db import IntegrityError, models
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
+from mptt.forms import TreeNodeChoiceField
 
 from account.admin import DepartmentFilter
+from account.models import Department
 
+from . import bulk, search, thumbnails
+from .changelist import DocumentChangeList, DocumentPaginator
+from .jobs import thumbnail_queue
 from .models import Document, DocumentFile, DocumentSection, DocumentType
 
 
+class MoveDocumentsForm(forms.Form):
+    department = TreeNodeChoiceField(
+        Department.objects.all(), label=_("Birim"), required=False
+    )
+    document_type = forms.ModelChoiceField(
+        DocumentType.objects.select_related("department"),
+        label=_("Belge Türü"),
+        required=False,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get("department") and not cleaned_data.get("document_type"):
+            raise forms.ValidationError(_("Birim veya belge türü seçmelisiniz."))
+        return cleaned_data
+
+
+class ReassignOwnerForm(forms.Form):
+    owner = forms.ModelChoiceField(
+        User.objects.filter(is_active=True), label=_("Oluşturan")
+    )
+
+
 class SectionInline(admin.TabularInline):
     model = DocumentSection
     extra = 0
@@ -22,6 +56,7 @@ class SectionInline(admin.TabularInline):
 @admin.register(DocumentType)
 class DocumentTypeAdmin(admin.ModelAdmin):
     list_display = ("name", "department", "path")
+    list_select_related = ("department",)
     search_fields = ("name", "description")
     list_filter = (("department", DepartmentFilter),)
     inlines = [SectionInline]
@@ -65,7 +100,7 @@ class DocumentTypeAdmin(admin.ModelAdmin):
     )
 
     def full_path(self, obj):
-        return f"{obj.department.full_path}/{obj.path}"
+        return obj.full_path()
 
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user
@@ -74,30 +109,67 @@ class DocumentTypeAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
     def save_formset(self, request, form, formset, change):
-        instances = formset.save(commit=False)
-        for obj in formset.deleted_objects:
-            obj.delete()
-        for instance in instances:
+        # Sections have no signals or files: delete, insert and update them
+        # with one statement each.
+        formset.save(commit=False)
+        model = formset.model
+        model.objects.filter(
+            pk__in=[obj.pk for obj in formset.deleted_objects]
+        ).delete()
+
+        for instance in formset.new_objects:
+            instance.created_by = instance.updated_by = request.user
+        model.objects.bulk_create(formset.new_objects)
+
+        now = timezone.now()
+        fields = {"updated_by", "updated_at"}
+        for instance, changed in formset.changed_objects:
             instance.updated_by = request.user
-            if not change:
-                instance.created_by = request.user
-            instance.save()
-        formset.save_m2m()
+            instance.updated_at = now
+            fields.update(changed)
+        if formset.changed_objects:
+            model.objects.bulk_update(
+                [instance for instance, changed in formset.changed_objects], fields
+            )
 
 
 class DocumentFileInline(admin.StackedInline):
     model = DocumentFile
     extra = 0
-    readonly_fields = ("file_link",)
+    readonly_fields = ("file_link", "preview")
 
     @admin.display(description=_("Dosya"))
     def file_link(self, obj):
-        return format_html_join(
-            "\n",
+        if not obj.pk:
+            return "-"
+        return format_html(
             '<a href="{}">{}</a>',
-            ((file.file.url, file.file) for file in obj.files.all()),
+            reverse("documentfile-download", args=[obj.pk]),
+            obj.file,
         )
 
+    @admin.display(description=_("Önizleme"))
+    def preview(self, obj):
+        if not obj.pk:
+            return "-"
+        # Never rendered here: a document may have many scans. Without a
+        # queue the image is rendered when the link is followed.
+        try:
+            thumbnail = thumbnails.request(obj, "thumbnail", generate_missing=False)
+        except thumbnails.Unavailable:
+            return _("Önizleme yok")
+        url = reverse("documentfile-thumbnail", args=[obj.pk])
+        if thumbnail is None:
+            if thumbnail_queue.enabled:
+                return _("Önizleme hazırlanıyor")
+            return format_html('<a href="{}">{}</a>', url, _("Önizlemeyi oluştur"))
+        return format_html(
+            '<a href="{}?kind=preview"><img src="{}" alt=""></a>', url, url
+        )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("thumbnails")
+
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
@@ -108,6 +180,7 @@ class DocumentAdmin(admin.ModelAdmin):
         "document_no",
         "department",
     )
+    list_select_related = ("document_type", "department")
 
     list_filter = (
         "document_type",
@@ -116,8 +189,12 @@ class DocumentAdmin(admin.ModelAdmin):
 
     search_fields = ("title", "document_no", "description")
     date_hierarchy = "date"
+    ordering = ("-date", "-id")
+    paginator = DocumentPaginator
+    show_full_result_count = False
 
     inlines = (DocumentFileInline,)
+    actions = ("move_documents", "reassign_owner", "delete_documents")
     readonly_fields = ("created_at", "updated_at", "created_by", "updated_by")
     fieldsets = (
         (
@@ -134,6 +211,31 @@ class DocumentAdmin(admin.ModelAdmin):
         ),
     )
 
+    def get_changelist(self, request, **kwargs):
+        return DocumentChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.is_supported():
+            return super().get_search_results(request, queryset, search_term)
+        ids = search.search_ids(search_term)
+        if len(ids) >= settings.SEARCH_RESULT_LIMIT:
+            self.message_user(
+                request,
+                _(
+                    "Yalnızca en iyi eşleşen %(limit)d belge gösteriliyor; "
+                    "aramayı daraltın."
+                )
+                % {"limit": settings.SEARCH_RESULT_LIMIT},
+                messages.WARNING,
+            )
+        # Document numbers are also matched by substring (see search_documents).
+        return (
+            queryset.filter(
+                models.Q(pk__in=ids) | models.Q(document_no__icontains=search_term)
+            ),
+            False,
+        )
+
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user
         if not change:
@@ -142,8 +244,12 @@ class DocumentAdmin(admin.ModelAdmin):
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
-        for obj in formset.deleted_objects:
-            obj.delete()
+        bulk.delete_document_files(
+            DocumentFile.objects.filter(
+                pk__in=[obj.pk for obj in formset.deleted_objects]
+            )
+        )
+        # New and replaced files are uploaded one by one.
         for instance in instances:
             instance.updated_by = request.user
             if not change:
@@ -151,6 +257,74 @@ class DocumentAdmin(admin.ModelAdmin):
             instance.save()
         formset.save_m2m()
 
+    def get_actions(self, request):
+        # The stock action collects and deletes every related row one by one.
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def confirm_action(self, request, queryset, form, title):
+        # Actions render this intermediate page first; it posts the selection
+        # back to the changelist with "apply" set.
+        select_across = request.POST.get("select_across") == "1"
+        selected = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+        context = {
+            **self.admin_site.each_context(request),
+            "title": title,
+            "opts": self.model._meta,
+            "form": form,
+            "action": request.POST["action"],
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "select_across": select_across,
+            "selected": selected,
+            "count": None if select_across else len(selected),
+        }
+        return TemplateResponse(
+            request, "admin/document/document/bulk_action.html", context
+        )
+
+    @admin.action(description=_("Seçili belgeleri taşı"), permissions=["change"])
+    def move_documents(self, request, queryset):
+        form = MoveDocumentsForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return self.confirm_action(request, queryset, form, _("Belgeleri taşı"))
+        try:
+            count = bulk.move_documents(queryset, request.user, **form.cleaned_data)
+        except IntegrityError:
+            self.message_user(
+                request,
+                _("Hedefte aynı numaralı belgeler var; hiçbir belge taşınmadı."),
+                messages.ERROR,
+            )
+            return None
+        self.message_user(request, _("%(count)d belge taşındı.") % {"count": count})
+
+    @admin.action(
+        description=_("Seçili belgelerin sahibini değiştir"), permissions=["change"]
+    )
+    def reassign_owner(self, request, queryset):
+        form = ReassignOwnerForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return self.confirm_action(
+                request, queryset, form, _("Belgelerin sahibini değiştir")
+            )
+        count = bulk.reassign_owner(queryset, request.user, form.cleaned_data["owner"])
+        self.message_user(
+            request, _("%(count)d belgenin sahibi değiştirildi.") % {"count": count}
+        )
+
+    @admin.action(
+        description=_("Seçili belgeleri dosyalarıyla sil"), permissions=["delete"]
+    )
+    def delete_documents(self, request, queryset):
+        form = forms.Form(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return self.confirm_action(
+                request, queryset, form, _("Belgeleri dosyalarıyla sil")
+            )
+        count = bulk.delete_documents(queryset)
+        self.message_user(request, _("%(count)d belge silindi.") % {"count": count})
+
 
 admin.site.site_header = _("NetBelge Yönetim Paneli")
 admin.site.site_title = _("NetBelge Yönetim Paneli")
@@ -6,3 +6,6 @@ class DocumentConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "document"
     verbose_name = _("Belge Yönetimi")
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,111 @@
+import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import permission_required
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from account.models import Department
+from netbelge.api import CursorPagination
+from netbelge.pagination import keyset_before
+
+from . import downloads
+from .models import Document, DocumentFile
+from .serializers import DocumentSerializer
+from .views import document_filters
+
+# Native async counterparts of the document list, detail and download
+# endpoints for the uvicorn worker deployment. Queries go through the async
+# ORM and file bytes are streamed from an async iterator, so a slow client
+# holds a socket rather than a worker thread.
+
+CURSOR_VAR = "cursor"
+
+
+def page_size(params):
+    try:
+        size = int(params.get(CursorPagination.page_size_query_param, 0))
+    except ValueError:
+        size = 0
+    return min(size, CursorPagination.max_page_size) or CursorPagination.page_size
+
+
+def documents(request):
+    queryset = Document.objects.select_related("department", "document_type")
+    fields = request.GET.get("fields")
+    if not fields or "files" in fields.split(","):
+        queryset = queryset.prefetch_related(
+            Prefetch("files", queryset=DocumentFile.objects.defer("content"))
+        )
+    return queryset.filter(**document_filters(request.GET))
+
+
+def serialize(request, instance, many=False):
+    # The serializers are plain CPU work once rows and prefetches are loaded;
+    # wrapping the request gives them query_params for sparse fieldsets.
+    return DocumentSerializer(
+        instance, many=many, context={"request": Request(request)}
+    ).data
+
+
+@permission_required("document.view_document", raise_exception=True)
+async def document_list(request):
+    params = request.GET
+    queryset = documents(request)
+    if params.get("department"):
+        if params.get("subtree") in ("1", "true"):
+            department = await aget_object_or_404(
+                Department.objects.only("tree_id", "lft", "rght"),
+                pk=params["department"],
+            )
+            queryset = queryset.in_subtree(department)
+        else:
+            queryset = queryset.filter(department_id=params["department"])
+
+    # Keyset paging on (date, id), the same order as the admin changelist.
+    if params.get(CURSOR_VAR):
+        try:
+            date, pk = params[CURSOR_VAR].split("_")
+            date, pk = datetime.date.fromisoformat(date), int(pk)
+        except ValueError:
+            return JsonResponse({"detail": "Geçersiz imleç."}, status=400)
+        queryset = queryset.filter(keyset_before(date, pk))
+
+    size = page_size(params)
+    rows = [row async for row in queryset.order_by("-date", "-id")[: size + 1]]
+    next_url = None
+    if len(rows) > size:
+        rows = rows[:size]
+        query = params.copy()
+        query[CURSOR_VAR] = f"{rows[-1].date.isoformat()}_{rows[-1].pk}"
+        next_url = request.build_absolute_uri(f"?{query.urlencode()}")
+
+    return JsonResponse(
+        {"next": next_url, "results": serialize(request, rows, many=True)},
+        encoder=JSONEncoder,
+    )
+
+
+@permission_required("document.view_document", raise_exception=True)
+async def document_detail(request, pk):
+    document = await aget_object_or_404(documents(request), pk=pk)
+    return JsonResponse(serialize(request, document), encoder=JSONEncoder)
+
+
+@permission_required("document.view_documentfile", raise_exception=True)
+async def download_file(request, pk):
+    document_file = await aget_object_or_404(
+        DocumentFile.objects.defer("content"), pk=pk
+    )
+    # Opening the file, signing a URL or resolving a deduplicated blob may
+    # touch the disk, the network or the database; the bytes themselves are
+    # read by the async iterator.
+    return await sync_to_async(downloads.serve)(
+        request,
+        document_file,
+        as_attachment="inline" not in request.GET,
+        asynchronous=True,
+    )
@@ -0,0 +1,495 @@
+import datetime
+import io
+import itertools
+import json
+import math
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import storages
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from account.cache import tree_cache
+from account.models import Department
+from netbelge.path import normalize_path
+
+from . import bulk, search, statistics
+from .cache import list_cache, path_cache
+from .models import Document, DocumentFile, DocumentType, upload_to
+
+# Synthetic archives and timed scenarios for `manage.py benchmark`. The
+# archive is generated from a seed, so two runs with the same parameters
+# measure the same rows on any database.
+
+SCALES = {
+    "small": {
+        "depth": 4,
+        "fanout": 3,
+        "document_types": 200,
+        "documents": 20_000,
+        "files": 2,
+    },
+    "medium": {
+        "depth": 6,
+        "fanout": 3,
+        "document_types": 2_000,
+        "documents": 500_000,
+        "files": 2,
+    },
+    "large": {
+        "depth": 7,
+        "fanout": 4,
+        "document_types": 5_000,
+        "documents": 2_000_000,
+        "files": 2,
+    },
+}
+
+BATCH_SIZE = 5000
+WORDS = (
+    "dilekçe",
+    "karar",
+    "tutanak",
+    "rapor",
+    "sözleşme",
+    "fatura",
+    "yazışma",
+    "genelge",
+    "tebligat",
+    "makbuz",
+    "ihale",
+    "personel",
+    "bütçe",
+    "denetim",
+    "talep",
+    "onay",
+)
+PATHS = (
+    "yazisma/{yil}/{ay}",
+    "{belge_turu}/{yil}",
+    "arsiv/{belge_no}",
+    "fatura/{yil}/{ay}/{gun}",
+    "kayit",
+)
+FIRST_DATE = datetime.date(2000, 1, 1)
+DAYS = 26 * 365
+
+
+def department_count(depth, fanout):
+    # One tree per root, ``fanout`` roots and children per node.
+    return sum(fanout**level for level in range(1, depth + 1))
+
+
+def benchmark_user():
+    user, created = User.objects.get_or_create(
+        username="benchmark", defaults={"is_staff": True, "is_superuser": True}
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=["password"])
+    return user
+
+
+def build_departments(user, depth, fanout):
+    # Nested-set columns are numbered here, so each level is inserted with
+    # one bulk_create instead of one mptt insert (and tree shift) per node.
+    levels = [[] for _ in range(depth)]
+
+    def visit(department, tree_id, level, counter):
+        parent = department.parent
+        department.tree_id = tree_id
+        department.level = level
+        department.lft = next(counter)
+        department.path = normalize_path(department.name)
+        department.full_path = (
+            f"{parent.full_path}/{department.path}" if parent else department.path
+        )
+        department.created_by = department.updated_by = user
+        levels[level].append(department)
+        if level + 1 < depth:
+            for index in range(1, fanout + 1):
+                child = Department(name=f"Birim {index:02d}", parent=department)
+                visit(child, tree_id, level + 1, counter)
+        department.rght = next(counter)
+
+    for tree_id in range(1, fanout + 1):
+        visit(Department(name=f"Kurum {tree_id:02d}"), tree_id, 0, itertools.count(1))
+    for departments in levels:
+        Department.objects.bulk_create(departments, batch_size=BATCH_SIZE)
+    return [department for departments in levels for department in departments]
+
+
+def build_document_types(user, departments, count, rng):
+    document_types = [
+        DocumentType(
+            department=rng.choice(departments),
+            name=f"Tür {index:05d}",
+            path=rng.choice(PATHS),
+            created_by=user,
+            updated_by=user,
+        )
+        for index in range(1, count + 1)
+    ]
+    return DocumentType.objects.bulk_create(document_types, batch_size=BATCH_SIZE)
+
+
+def build_documents(user, document_types, count, files, rng, progress=None):
+    # Documents are spread over the types with a long tail, as in real
+    # archives where a few types hold most of the rows.
+    weights = list(
+        itertools.accumulate(1 / rank for rank in range(1, len(document_types) + 1))
+    )
+    storage = storages[settings.DOCUMENT_FILE_STORAGE]
+    created = 0
+    while created < count:
+        size = min(BATCH_SIZE, count - created)
+        documents = []
+        for index, document_type in enumerate(
+            rng.choices(document_types, cum_weights=weights, k=size), start=created
+        ):
+            date = FIRST_DATE + datetime.timedelta(days=rng.randrange(DAYS))
+            documents.append(
+                Document(
+                    department_id=document_type.department_id,
+                    document_type=document_type,
+                    title=f"{rng.choice(WORDS).capitalize()} {index}",
+                    date=date,
+                    time=(
+                        datetime.time(rng.randrange(8, 18), rng.randrange(60))
+                        if rng.random() < 0.5
+                        else None
+                    ),
+                    document_no=f"{date.year}-{index:08d}",
+                    description=(
+                        " ".join(rng.choices(WORDS, k=8))
+                        if rng.random() < 0.2
+                        else None
+                    ),
+                    created_by=user,
+                    updated_by=user,
+                )
+            )
+
+        document_files = []
+        for document in documents:
+            for number in range(rng.randint(1, 2 * files - 1)):
+                document_file = DocumentFile(
+                    document=document,
+                    size=int(rng.lognormvariate(12, 1.5)),
+                    content=(
+                        " ".join(rng.choices(WORDS, k=20))
+                        if rng.random() < 0.3
+                        else None
+                    ),
+                    created_by=user,
+                    updated_by=user,
+                )
+                document_file.file.name = storage.generate_filename(
+                    upload_to(document_file, f"{document.document_no}-{number}.pdf")
+                )
+                document_files.append(document_file)
+
+        with transaction.atomic():
+            Document.objects.bulk_create(documents)
+            for document_file in document_files:
+                document_file.document_id = document_file.document.pk
+            DocumentFile.objects.bulk_create(document_files)
+        created += size
+        if progress:
+            progress(f"{created}/{count} belge oluşturuldu.")
+
+
+def generate(
+    depth,
+    fanout,
+    document_types,
+    documents,
+    files,
+    seed=1,
+    progress=None,
+):
+    # Builds the archive into the current (empty) database and returns the
+    # row counts and the time it took.
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    user = benchmark_user()
+    departments = build_departments(user, depth, fanout)
+    types = build_document_types(user, departments, document_types, rng)
+    build_documents(user, types, documents, files, rng, progress)
+
+    statistics.rebuild()
+    if search.is_supported():
+        search.clear_index()
+        ids = Document.objects.order_by("pk").values_list("pk", flat=True).iterator()
+        while batch := list(itertools.islice(ids, BATCH_SIZE)):
+            with transaction.atomic():
+                search.index_documents(batch)
+    analyze()
+    clear_caches()
+    return {
+        "seconds": round(time.perf_counter() - started, 3),
+        **archive_counts(),
+    }
+
+
+def archive_counts():
+    return {
+        "departments": Department.objects.count(),
+        "document_types": DocumentType.objects.count(),
+        "documents": Document.objects.count(),
+        "files": DocumentFile.objects.count(),
+    }
+
+
+def analyze():
+    # Fresh planner statistics, as autovacuum would have after a bulk load.
+    if connection.vendor in ("postgresql", "sqlite"):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+def clear_caches():
+    cache.clear()
+    for tiered in (path_cache, list_cache, tree_cache):
+        tiered.local.clear()
+
+
+def summarize(timings, queries):
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "min": round(timings[0], 6),
+        "median": round(timings[len(timings) // 2], 6),
+        "p95": round(timings[math.ceil(0.95 * len(timings)) - 1], 6),
+        "max": round(timings[-1], 6),
+        "queries": sorted(queries)[len(queries) // 2],
+    }
+
+
+class Runner:
+    # Each scenario returns the callable that is timed; ``before`` runs
+    # untimed ahead of every call (cache clearing, cleanup of the previous
+    # run).
+
+    def __init__(self, repeat=5, seed=1, ingest=1000):
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self.ingest = ingest
+        self.user = benchmark_user()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.cleanups = []
+        # The first department of every level, from a root down to a leaf.
+        levels = {}
+        for department in Department.objects.order_by("level", "tree_id", "lft"):
+            levels.setdefault(department.level, department)
+        self.departments = list(levels.values())
+
+    def measure(self, scenario):
+        function, before = getattr(self, scenario)()
+        timings, queries = [], []
+        try:
+            before()
+            function()  # warm up imports, templates and connections
+            for _ in range(self.repeat):
+                before()
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    function()
+                    timings.append(time.perf_counter() - started)
+                queries.append(len(context))
+        finally:
+            while self.cleanups:
+                self.cleanups.pop()()
+        return summarize(timings, queries)
+
+    def run(self, scenarios, progress=None):
+        results = {}
+        for scenario in scenarios:
+            results[scenario] = self.measure(scenario)
+            if progress:
+                progress(f"{scenario}: {results[scenario]['median']:.4f} sn")
+        return results
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} {params}: {response.status_code}")
+
+    def changelist(self):
+        return lambda: self.get("/admin/document/document/"), clear_caches
+
+    def changelist_filtered(self):
+        department = self.departments[min(1, len(self.departments) - 1)]
+        document_type = DocumentType.objects.in_subtree(department).first()
+        params = {"department__id__inhierarchy": department.pk, "date__year": 2010}
+        if document_type is not None:
+            params["document_type__id__exact"] = document_type.pk
+        return lambda: self.get("/admin/document/document/", params), clear_caches
+
+    def changelist_search(self):
+        return (
+            lambda: self.get("/admin/document/document/", {"q": "tutanak"}),
+            clear_caches,
+        )
+
+    def search(self):
+        def function():
+            for query in ("karar", "fatura bütçe", "tebl"):
+                search.search_ids(query)
+
+        return function, clear_caches
+
+    def subtree_count(self):
+        def function():
+            for department in self.departments:
+                Document.objects.in_subtree(department).count()
+
+        return function, clear_caches
+
+    def subtree_page(self):
+        def function():
+            for department in self.departments:
+                list(
+                    Document.objects.in_subtree(department).order_by("-date", "-id")[
+                        :100
+                    ]
+                )
+
+        return function, clear_caches
+
+    def upload_path(self, before):
+        # Target names for files added to random documents, as resolved by
+        # every upload.
+        last = (
+            Document.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        )
+        ids = [self.rng.randint(1, last) for _ in range(1000)]
+        documents = list(
+            Document.objects.filter(pk__in=ids).only(
+                "pk", "document_type_id", "date", "time", "document_no"
+            )
+        )
+        field = DocumentFile._meta.get_field("file")
+
+        def function():
+            for document in documents:
+                field.generate_filename(DocumentFile(document=document), "tarama.pdf")
+
+        return function, before
+
+    def upload_path_cold(self):
+        return self.upload_path(clear_caches)
+
+    def upload_path_warm(self):
+        return self.upload_path(lambda: None)
+
+    def bulk_ingest(self):
+        # ingest_documents over a generated manifest; the imported documents
+        # and their files are deleted again before the next run.
+        directory = Path(tempfile.mkdtemp())
+        for index in range(8):
+            (directory / f"tarama-{index}.pdf").write_bytes(
+                self.rng.randbytes(64 * 1024)
+            )
+        document_types = list(
+            DocumentType.objects.values_list("department__full_path", "name")
+        )
+        manifest = directory / "manifest.jsonl"
+        with open(manifest, "w", encoding="utf-8") as output:
+            for index in range(self.ingest):
+                department, document_type = self.rng.choice(document_types)
+                row = {
+                    "department": department,
+                    "document_type": document_type,
+                    "title": f"Aktarım {index}",
+                    "date": "2024-01-01",
+                    "document_no": f"aktarim-{index:06d}",
+                    "files": [f"tarama-{index % 8}.pdf"],
+                }
+                output.write(json.dumps(row) + "\n")
+        checkpoint = directory / "manifest.checkpoint"
+
+        def function():
+            call_command(
+                "ingest_documents",
+                str(manifest),
+                root=directory,
+                user=self.user.username,
+                checkpoint=checkpoint,
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+
+        def before():
+            checkpoint.unlink(missing_ok=True)
+            bulk.delete_documents(
+                Document.objects.filter(document_no__startswith="aktarim-")
+            )
+            clear_caches()
+
+        self.cleanups += [lambda: shutil.rmtree(directory), before]
+        return function, before
+
+
+SCENARIOS = (
+    "changelist",
+    "changelist_filtered",
+    "changelist_search",
+    "search",
+    "subtree_count",
+    "subtree_page",
+    "upload_path_cold",
+    "upload_path_warm",
+    "bulk_ingest",
+)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "database": connection.vendor,
+        "database_version": ".".join(map(str, connection.get_database_version())),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(previous, current):
+    # (scenario, previous median, current median, change in percent) for the
+    # scenarios measured in both runs.
+    rows = []
+    for name, result in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if before is None or not before["median"]:
+            continue
+        change = (result["median"] - before["median"]) / before["median"] * 100
+        rows.append((name, before["median"], result["median"], change))
+    return rows
@@ -0,0 +1,174 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import storages
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import search, statistics
+from .cache import document_cache, file_cache, list_cache
+from .jobs import cleanup_queue, relocation_queue
+from .models import Document, DocumentFile, Thumbnail, UploadSession
+
+# Set-based counterparts of saving and deleting documents one by one, for
+# admin actions over thousands of rows. Rows are changed with a few batched
+# UPDATE/DELETE statements; the work the model signals would do per object
+# (statistics, search index, caches) is done once per batch, and files are
+# handed to the storage cleanup worker.
+
+BATCH_SIZE = 1000
+
+
+def batches(queryset):
+    ids = iter(list(queryset.order_by().values_list("pk", flat=True)))
+    while batch := list(islice(ids, BATCH_SIZE)):
+        yield batch
+
+
+def delete_rows(queryset):
+    # A single DELETE for the rows of ``queryset``. QuerySet.delete() would
+    # load every row to collect cascades and send the delete signals; the
+    # callers remove dependent rows first and do the signals' work per batch.
+    # Returns the number of rows deleted.
+    meta = queryset.model._meta
+    quote_name = connections[queryset.db].ops.quote_name
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote_name(meta.db_table)} "
+            f"WHERE {quote_name(meta.pk.column)} IN ({sql})",
+            params,
+        )
+        return cursor.rowcount
+
+
+def documents_changed(document_ids):
+    search.index_documents(document_ids)
+    list_cache.clear()
+    document_cache.clear()
+    file_cache.clear()
+
+
+def move_documents(queryset, user, department=None, document_type=None):
+    changes = {"updated_by": user, "updated_at": timezone.now()}
+    if department is not None:
+        changes["department"] = department
+    if document_type is not None:
+        changes["document_type"] = document_type
+
+    moved = []
+    with transaction.atomic():
+        for batch in batches(queryset):
+            documents = Document.objects.filter(pk__in=batch)
+            files = DocumentFile.objects.filter(document_id__in=batch)
+            rollup = statistics.Rollup()
+            rollup.add_documents(documents, sign=-1)
+            rollup.add_files(files, sign=-1)
+            documents.update(**changes)
+            rollup.add_documents(documents)
+            rollup.add_files(files)
+            rollup.apply()
+            moved += batch
+            if document_type is not None:
+                # File paths are built from the document type; the
+                # relocate_files worker moves the files to the new paths.
+                transaction.on_commit(
+                    lambda batch=batch: relocation_queue.push(["documents", batch])
+                )
+        transaction.on_commit(lambda: documents_changed(moved))
+    return len(moved)
+
+
+def reassign_owner(queryset, user, owner):
+    now = timezone.now()
+    changed = []
+    with transaction.atomic():
+        for batch in batches(queryset):
+            Document.objects.filter(pk__in=batch).update(
+                created_by=owner, updated_by=user, updated_at=now
+            )
+            DocumentFile.objects.filter(document_id__in=batch).update(
+                created_by=owner, updated_by=user, updated_at=now
+            )
+            changed += batch
+        transaction.on_commit(lambda: documents_changed(changed))
+    return len(changed)
+
+
+def remove_files(files):
+    # ``files`` are (storage alias, name) pairs whose rows are gone.
+    files = [[alias, name] for alias, name in files if name]
+    if not cleanup_queue.enabled:
+        for alias, name in files:
+            storages[alias].delete(name)
+        return
+    for offset in range(0, len(files), BATCH_SIZE):
+        cleanup_queue.push(*files[offset : offset + BATCH_SIZE])
+
+
+def _delete_files(files, rollup):
+    # Rows of a DocumentFile queryset and their thumbnails, without loading
+    # them; returns their count and the stored files to remove.
+    thumbnails = Thumbnail.objects.filter(document_file__in=files)
+    names = list(files.values_list("storage", "file"))
+    names += thumbnails.values_list("storage", "name")
+    rollup.add_files(files, sign=-1)
+    delete_rows(thumbnails)
+    return delete_rows(files), names
+
+
+def delete_document_files(queryset):
+    deleted = 0
+    files = []
+    document_ids = set()
+    with transaction.atomic():
+        for batch in batches(queryset):
+            batch_files = DocumentFile.objects.filter(pk__in=batch)
+            document_ids.update(batch_files.values_list("document_id", flat=True))
+            rollup = statistics.Rollup()
+            count, names = _delete_files(batch_files, rollup)
+            rollup.apply()
+            deleted += count
+            files += names
+
+        def cleanup():
+            documents_changed(document_ids)
+            remove_files(files)
+
+        transaction.on_commit(cleanup)
+    return deleted
+
+
+def delete_documents(queryset):
+    files = []
+    deleted = []
+    with transaction.atomic():
+        for batch in batches(queryset):
+            rollup = statistics.Rollup()
+            _, names = _delete_files(
+                DocumentFile.objects.filter(document_id__in=batch), rollup
+            )
+            files += names
+
+            # Parts of unfinished uploads live in the default document storage.
+            sessions = UploadSession.objects.filter(document_id__in=batch)
+            files += [
+                (settings.DOCUMENT_FILE_STORAGE, session.part_name(index))
+                for session in sessions.only("pk", "parts")
+                for index in range(session.parts)
+            ]
+            delete_rows(sessions)
+
+            documents = Document.objects.filter(pk__in=batch)
+            rollup.add_documents(documents, sign=-1)
+            delete_rows(documents)
+            rollup.apply()
+            deleted += batch
+
+        def cleanup():
+            search.remove_documents(deleted)
+            documents_changed([])
+            remove_files(files)
+
+        transaction.on_commit(cleanup)
+    return len(deleted)
@@ -0,0 +1,58 @@
+from django.conf import settings
+
+from account.models import Department
+from netbelge.cache import ObjectCache, TieredCache
+from netbelge.path import normalize_path
+
+path_cache = TieredCache(
+    "netbelge-path",
+    maxsize=settings.PATH_CACHE_SIZE,
+    timeout=settings.PATH_CACHE_TIMEOUT,
+    local_timeout=settings.PATH_CACHE_LOCAL_TIMEOUT,
+)
+
+# Changelist counts and date hierarchy buckets, cleared whenever a document
+# is saved or deleted.
+list_cache = TieredCache(
+    "netbelge-document-list",
+    maxsize=256,
+    timeout=settings.DOCUMENT_LIST_CACHE_TIMEOUT,
+    local_timeout=settings.PATH_CACHE_LOCAL_TIMEOUT,
+)
+
+document_cache = ObjectCache(
+    "netbelge-document", timeout=settings.RESPONSE_CACHE_TIMEOUT
+)
+file_cache = ObjectCache("netbelge-file", timeout=settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def department_full_path(department_id):
+    return path_cache.get_or_set(
+        f"department:{department_id}",
+        lambda: Department.objects.values_list("full_path", flat=True).get(
+            pk=department_id
+        ),
+    )
+
+
+def document_type_full_path(document_type_id):
+    from .models import DocumentType
+
+    def load():
+        department_id, path = DocumentType.objects.values_list(
+            "department_id", "path"
+        ).get(pk=document_type_id)
+        return f"{department_full_path(department_id)}/{path}"
+
+    return path_cache.get_or_set(f"document_type:{document_type_id}", load)
+
+
+def document_type_slug(document_type_id):
+    from .models import DocumentType
+
+    return path_cache.get_or_set(
+        f"document_type_slug:{document_type_id}",
+        lambda: normalize_path(
+            DocumentType.objects.values_list("name", flat=True).get(pk=document_type_id)
+        ),
+    )
@@ -0,0 +1,91 @@
+import datetime
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+
+from netbelge.pagination import EstimatedCountPaginator, keyset_before, query_key
+
+from .cache import list_cache
+
+CURSOR_VAR = "c"
+
+
+class DocumentPaginator(EstimatedCountPaginator):
+    cache = list_cache
+
+
+class CachedDateQuerySet:
+    # Stands in for the changelist queryset in the date hierarchy so the
+    # year/month/day buckets come from the list cache.
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def aggregate(self, **kwargs):
+        key = query_key(self.queryset, "aggregate", sorted(kwargs.items()))
+        return list_cache.get_or_set(key, lambda: self.queryset.aggregate(**kwargs))
+
+    def dates(self, field_name, kind, order="ASC"):
+        key = query_key(self.queryset, "dates", field_name, kind, order)
+        return list_cache.get_or_set(
+            key, lambda: list(self.queryset.dates(field_name, kind, order))
+        )
+
+
+class DocumentChangeList(ChangeList):
+    # Pages by a (date, id) cursor instead of OFFSET while the default
+    # ordering is in use. Sorting by a column falls back to numbered pages.
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset = ORDER_VAR not in request.GET
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    @property
+    def date_queryset(self):
+        return CachedDateQuerySet(self.queryset)
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+    def get_results(self, request):
+        if not self.keyset or self.show_all:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        if self.cursor:
+            try:
+                date, pk = self.cursor.split("_")
+                date, pk = datetime.date.fromisoformat(date), int(pk)
+            except ValueError:
+                raise IncorrectLookupParameters
+            queryset = queryset.filter(keyset_before(date, pk))
+
+        rows = list(queryset[: self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            last = rows[self.list_per_page - 1]
+            self.next_cursor = f"{last.date.isoformat()}_{last.pk}"
+
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows[: self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
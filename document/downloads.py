@@ -0,0 +1,154 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from netbelge import metrics
+from netbelge.storage import DeduplicatedStorage
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def resolve(storage, name):
+    # Returns the storage and name that actually hold the bytes.
+    if isinstance(storage, DeduplicatedStorage):
+        return storage.inner, storage.blob_name(storage.digest(name))
+    return storage, name
+
+
+def local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def parse_range(header, size):
+    match = RANGE_RE.match(header or "")
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        start = max(size - int(end), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def iter_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+async def aiter_range(file, start, length):
+    # Reads run in the thread pool so a slow disk never blocks the event
+    # loop; the loop only holds the socket while the client drains it.
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        await sync_to_async(file.seek, thread_sensitive=False)(start)
+        while length > 0:
+            data = await read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+def serve(request, document_file, as_attachment=True, asynchronous=False):
+    etag = quote_etag(f"{document_file.pk}-{document_file.updated_at.timestamp():.6f}")
+    last_modified = int(document_file.updated_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    filename = os.path.basename(document_file.file.name)
+    storage, name = resolve(document_file.file.storage, document_file.file.name)
+    path = local_path(storage, name)
+
+    if path is None:
+        # Remote storages (MinIO/S3) return presigned URLs, so the client
+        # fetches the bytes from the object store directly.
+        response = HttpResponseRedirect(storage.url(name))
+    elif settings.DOWNLOAD_OFFLOAD == "x-accel-redirect":
+        response = HttpResponse(content_type="")
+        response["X-Accel-Redirect"] = settings.DOWNLOAD_ACCEL_PREFIX + quote(name)
+    elif settings.DOWNLOAD_OFFLOAD == "x-sendfile":
+        response = HttpResponse(content_type="")
+        response["X-Sendfile"] = path
+    else:
+        response = file_response(
+            request,
+            metrics.MeteredFile(storage.open(name, "rb"), document_file.storage),
+            etag,
+            asynchronous=asynchronous,
+        )
+
+    if not isinstance(response, HttpResponseRedirect):
+        response["Content-Disposition"] = content_disposition_header(
+            as_attachment, filename
+        )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def file_response(request, file, etag, asynchronous=False):
+    size = file.size
+    if_range = request.headers.get("If-Range")
+    try:
+        byte_range = None
+        if if_range is None or if_range == etag:
+            byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    content_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+    iterate = aiter_range if asynchronous else iter_range
+    if byte_range is None and not asynchronous:
+        # FileResponse hands the file object to wsgi.file_wrapper, which lets
+        # the server use sendfile for the whole body.
+        response = FileResponse(file)
+    elif byte_range is None:
+        # Under ASGI a synchronous iterator would be read into memory first.
+        response = StreamingHttpResponse(
+            aiter_range(file, 0, size), content_type=content_type
+        )
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iterate(file, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
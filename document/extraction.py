@@ -0,0 +1,66 @@
+import io
+import logging
+import os
+
+from django.core.files.storage import storages
+from PIL import Image
+
+from .models import DocumentFile
+
+logger = logging.getLogger(__name__)
+
+EXTRACTORS = {}
+
+
+def register(*extensions):
+    def decorator(func):
+        for extension in extensions:
+            EXTRACTORS[extension.lower()] = func
+        return func
+
+    return decorator
+
+
+@register(".txt", ".csv", ".md", ".xml", ".html", ".json")
+def extract_plain_text(file):
+    data = file.read()
+    for encoding in ("utf-8", "cp1254", "latin-1"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+
+@register(".pdf")
+def extract_pdf(file):
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(file.read()))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+@register(".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp")
+def extract_image(file):
+    import pytesseract
+
+    with Image.open(file) as image:
+        return pytesseract.image_to_string(image, lang="tur")
+
+
+def extract_file(name, storage_alias=None):
+    extractor = EXTRACTORS.get(os.path.splitext(name)[1].lower())
+    if extractor is None:
+        return None
+    storage = DocumentFile._meta.get_field("file").storage
+    if storage_alias:
+        storage = storages[storage_alias]
+    try:
+        with storage.open(name, "rb") as file:
+            text = extractor(file)
+    except ImportError as exc:
+        logger.warning("No extractor library for %s: %s", name, exc)
+        return None
+    except Exception:
+        logger.exception("Text extraction failed for %s", name)
+        return None
+    return text.replace("\x00", "").strip() if text else text
@@ -0,0 +1,6 @@
+from netbelge.queue import JobQueue
+
+extraction_queue = JobQueue("extraction")
+thumbnail_queue = JobQueue("thumbnails")
+cleanup_queue = JobQueue("cleanup")
+relocation_queue = JobQueue("relocation")
@@ -0,0 +1,184 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from document import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Yapay bir arşiv (derin birim ağacı, binlerce belge türü, milyonlarca "
+        "belge) üretir ve yönetim listesi, arama, alt ağaç süzme, dosya yolu "
+        "çözümleme ve toplu aktarım sürelerini ölçer. Arşiv ayrı bir "
+        "veritabanında oluşturulur; sonuçlar JSON olarak yazılır ve önceki "
+        "bir sonuçla karşılaştırılabilir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", choices=sorted(benchmark.SCALES), default="small"
+        )
+        parser.add_argument("--depth", type=int, help="Birim ağacının derinliği.")
+        parser.add_argument(
+            "--fanout", type=int, help="Kök ve her birimin alt birim sayısı."
+        )
+        parser.add_argument("--document-types", type=int)
+        parser.add_argument("--documents", type=int)
+        parser.add_argument("--files", type=int, help="Belge başına ortalama dosya.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--ingest", type=int, default=1000, help="Toplu aktarımdaki belge sayısı."
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=benchmark.SCENARIOS,
+            help="Yalnızca bu senaryoları çalıştır (tekrarlanabilir).",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Arşiv veritabanını sonraki çalıştırmalar için sakla.",
+        )
+        parser.add_argument("--output", type=Path, help="Sonuçların JSON dosyası.")
+        parser.add_argument(
+            "--compare", type=Path, help="Karşılaştırılacak önceki sonuç dosyası."
+        )
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            help="Medyanı bu yüzdeden fazla yavaşlayan senaryo varsa hata ver.",
+        )
+
+    def handle(self, *args, **options):
+        parameters = dict(benchmark.SCALES[options["scale"]])
+        for name in parameters:
+            if options[name] is not None:
+                parameters[name] = options[name]
+        if min(parameters.values()) < 1:
+            raise CommandError("Ölçek değerleri en az 1 olmalıdır.")
+
+        previous = None
+        if options["compare"]:
+            try:
+                previous = json.loads(options["compare"].read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Sonuç dosyası okunamadı: {exc}")
+
+        # Benchmarks never touch the application's data: the archive lives in
+        # a database of its own, created like the test database, and stored
+        # files in a temporary directory removed afterwards. Queues, the
+        # shared cache and the replicas are left out so the numbers do not
+        # depend on (or clear) a running deployment.
+        test_settings = connection.settings_dict["TEST"]
+        if connection.vendor == "sqlite":
+            test_settings["NAME"] = str(settings.BASE_DIR / "benchmark.sqlite3")
+        else:
+            test_settings["NAME"] = f"{connection.settings_dict['NAME']}_benchmark"
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"], serialize=False
+        )
+        media = tempfile.mkdtemp(prefix="netbelge-benchmark-")
+        try:
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=["testserver"],
+                REDIS_URL=None,
+                DATABASE_REPLICAS=[],
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+                    }
+                },
+                STORAGES={
+                    **settings.STORAGES,
+                    "default": {
+                        "BACKEND": "django.core.files.storage.FileSystemStorage",
+                        "OPTIONS": {"location": media},
+                    },
+                },
+                DOCUMENT_FILE_STORAGE="default",
+            ):
+                report = self.run(parameters, options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            shutil.rmtree(media, ignore_errors=True)
+
+        self.stdout.write(f"{'Senaryo':<22}{'medyan':>10}{'p95':>10}{'sorgu':>8}")
+        for name, result in report["results"].items():
+            self.stdout.write(
+                f"{name:<22}{result['median']:>10.4f}{result['p95']:>10.4f}"
+                f"{result['queries']:>8}"
+            )
+
+        if options["output"]:
+            options["output"].write_text(
+                json.dumps(report, indent=2, ensure_ascii=False) + "\n",
+                encoding="utf-8",
+            )
+            self.stdout.write(f"Sonuçlar yazıldı: {options['output']}")
+        else:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+
+        if previous is not None:
+            self.report_changes(previous, report, options["max_regression"])
+
+    def run(self, parameters, options):
+        generation = None
+        expected = {
+            "departments": benchmark.department_count(
+                parameters["depth"], parameters["fanout"]
+            ),
+            "document_types": parameters["document_types"],
+            "documents": parameters["documents"],
+        }
+        counts = benchmark.archive_counts()
+        if any(counts[name] != value for name, value in expected.items()):
+            if counts["departments"]:
+                call_command("flush", interactive=False, verbosity=0)
+            self.stdout.write("Arşiv oluşturuluyor...")
+            generation = benchmark.generate(
+                **parameters, seed=options["seed"], progress=self.stdout.write
+            )
+        else:
+            self.stdout.write("Saklanan arşiv kullanılıyor.")
+
+        runner = benchmark.Runner(
+            repeat=options["repeat"], seed=options["seed"], ingest=options["ingest"]
+        )
+        results = runner.run(
+            options["scenario"] or benchmark.SCENARIOS, progress=self.stdout.write
+        )
+        return {
+            "environment": benchmark.environment(),
+            "parameters": {**parameters, "seed": options["seed"]},
+            "archive": benchmark.archive_counts(),
+            "generation": generation,
+            "repeat": options["repeat"],
+            "results": results,
+        }
+
+    def report_changes(self, previous, report, max_regression):
+        if previous.get("parameters") != report["parameters"]:
+            self.stderr.write("Uyarı: önceki sonuç başka ölçek değerleriyle alınmış.")
+        regressions = []
+        for name, before, after, change in benchmark.compare(previous, report):
+            line = f"{name:<22}{before:>10.4f}{after:>10.4f}{change:>+9.1f}%"
+            if max_regression is not None and change > max_regression:
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f"%{max_regression} sınırını aşan yavaşlama: {', '.join(regressions)}"
+            )
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+from document.jobs import cleanup_queue
+from netbelge.db import closing_connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Toplu silme işlemlerinde kayıtları silinen dosyaları kuyruktan alıp "
+        "depolamadan siler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not cleanup_queue.enabled:
+            raise CommandError("REDIS_URL tanımlı değil, kuyruk kullanılamıyor.")
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                if batch := cleanup_queue.pop(options["batch_size"]):
+                    deleted = sum(pool.map(closing_connections(self.delete), batch))
+                    self.stdout.write(f"{deleted}/{len(batch)} dosya silindi.")
+                    cleanup_queue.ack()
+
+    def delete(self, job):
+        alias, name = job
+        try:
+            storages[alias].delete(name)
+        except Exception as exc:
+            self.stderr.write(f"Silinemedi: {name} ({exc})")
+            return False
+        return True
@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from document import search
+from document.cache import document_cache, file_cache
+from document.extraction import extract_file
+from document.jobs import extraction_queue
+from document.models import DocumentFile
+from netbelge.db import discard_inherited_connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Kuyruktaki belge dosyalarının metnini çıkarır ve içerik alanına yazar. "
+        "--pending ile henüz işlenmemiş tüm dosyaları bir kez işler. Metni "
+        "çıkarılamayan dosyalar da işlenmiş sayılır; içerikleri boş kalır."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help="Kuyruk yerine henüz işlenmemiş dosyaları işle ve çık.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["pending"] and not extraction_queue.enabled:
+            raise CommandError("REDIS_URL tanımlı değil, kuyruk kullanılamıyor.")
+
+        batch_size = options["batch_size"]
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=discard_inherited_connections
+        ) as pool:
+            if options["pending"]:
+                pending = DocumentFile.objects.filter(extracted_at__isnull=True)
+                last = 0
+                while batch := list(
+                    pending.filter(pk__gt=last)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:batch_size]
+                ):
+                    self.process(batch, pool)
+                    last = batch[-1]
+            else:
+                while True:
+                    if batch := extraction_queue.pop(batch_size):
+                        self.process(batch, pool)
+                        extraction_queue.ack()
+
+    def process(self, ids, pool):
+        files = list(
+            DocumentFile.objects.filter(pk__in=ids).only(
+                "pk", "file", "storage", "document_id", "content"
+            )
+        )
+        texts = pool.map(
+            extract_file,
+            [file.file.name for file in files],
+            [file.storage for file in files],
+        )
+
+        with transaction.atomic():
+            # Rows whose file was replaced or deleted during extraction are
+            # left alone; a replaced file has been queued again.
+            current = dict(
+                DocumentFile.objects.select_for_update()
+                .filter(pk__in=[file.pk for file in files])
+                .values_list("pk", "file")
+            )
+
+            # Every file is marked as processed, so files without text (blank
+            # scans, unsupported types, missing extractor libraries) are not
+            # extracted again on every run.
+            now = timezone.now()
+            updated, extracted = [], []
+            for file, text in zip(files, texts):
+                if current.get(file.pk) != file.file.name:
+                    continue
+                file.extracted_at = file.updated_at = now
+                updated.append(file)
+                if text is not None:
+                    file.content = text
+                    extracted.append(file)
+            DocumentFile.objects.bulk_update(
+                updated, ["content", "extracted_at", "updated_at"]
+            )
+            search.index_documents({file.document_id for file in extracted})
+        for file in files:
+            file_cache.invalidate(file.pk)
+            document_cache.invalidate(file.document_id)
+        self.stdout.write(f"{len(extracted)}/{len(files)} dosyanın metni çıkarıldı.")
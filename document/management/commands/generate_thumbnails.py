@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from document import thumbnails
+from document.jobs import thumbnail_queue
+from document.models import DocumentFile, Thumbnail
+from netbelge.db import discard_inherited_connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Kuyruktaki belge dosyalarının küçük resim ve önizlemelerini üretir; "
+        "önbellek sınırı aşılınca en uzun süredir kullanılmayanları siler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+        parser.add_argument("--batch-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        if not thumbnail_queue.enabled:
+            raise CommandError("REDIS_URL tanımlı değil, kuyruk kullanılamıyor.")
+
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=discard_inherited_connections
+        ) as pool:
+            while True:
+                if batch := thumbnail_queue.pop(options["batch_size"]):
+                    self.process(batch, pool)
+                    thumbnail_queue.ack()
+
+    def process(self, jobs, pool):
+        files = DocumentFile.objects.only("pk", "file", "storage").prefetch_related(
+            Prefetch("thumbnails", queryset=Thumbnail.objects.all())
+        )
+        files = files.in_bulk({pk for pk, _ in jobs})
+        # The same image is often requested several times before a worker
+        # gets to it; render each one once.
+        pending = {
+            (pk, kind)
+            for pk, kind in jobs
+            if pk in files and thumbnails.lookup(files[pk], kind) is None
+        }
+        pending = sorted(pending)
+        images = pool.map(
+            thumbnails.render,
+            [files[pk].file.name for pk, _ in pending],
+            [files[pk].storage for pk, _ in pending],
+            [kind for _, kind in pending],
+        )
+
+        stored = 0
+        for (pk, kind), data in zip(pending, images):
+            # Failures are stored too, so the file is not queued again.
+            thumbnails.store(files[pk], kind, data)
+            stored += data is not None
+        thumbnails.evict()
+        self.stdout.write(f"{stored}/{len(pending)} görüntü üretildi.")
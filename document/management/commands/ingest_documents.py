@@ -0,0 +1,314 @@
+import csv
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from account.models import Department
+from document import search, statistics
+from document.cache import list_cache
+from document.models import Document, DocumentFile, DocumentType
+from netbelge.db import closing_connections
+
+
+def read_manifest(path):
+    # Yields a dict per row; a JSONL line that cannot be parsed is yielded as
+    # its error so the row is reported and skipped like any other bad row.
+    with open(path, newline="", encoding="utf-8") as manifest:
+        if path.suffix == ".jsonl":
+            for line in manifest:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as exc:
+                        yield exc
+        else:
+            for row in csv.DictReader(manifest):
+                row["files"] = [
+                    name for name in (row.get("files") or "").split("|") if name
+                ]
+                yield row
+
+
+class Command(BaseCommand):
+    help = (
+        "Belgeleri ve dosyalarını bir manifest (CSV veya JSONL) ve dizin "
+        "ağacından toplu olarak içe aktarır."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", type=Path)
+        parser.add_argument(
+            "--root",
+            type=Path,
+            default=Path("."),
+            help="Manifestteki dosya yollarının göreli olduğu dizin.",
+        )
+        parser.add_argument(
+            "--user", required=True, help="Kayıtları oluşturan kullanıcı adı."
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="İşlenen son satırın kaydedileceği dosya. Varsayılan: <manifest>.checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        manifest = Path(options["manifest"])
+        if not manifest.exists():
+            raise CommandError(f"Manifest bulunamadı: {manifest}")
+        try:
+            self.user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Kullanıcı bulunamadı: {options['user']}")
+
+        self.root = Path(options["root"])
+        self.storage_alias = settings.DOCUMENT_FILE_STORAGE
+        self.storage = storages[self.storage_alias]
+        checkpoint = Path(
+            options["checkpoint"] or manifest.with_name(manifest.name + ".checkpoint")
+        )
+        done = int(checkpoint.read_text()) if checkpoint.exists() else 0
+        if done:
+            self.stdout.write(f"{done} satır atlanıyor (checkpoint).")
+
+        self.stats = {"documents": 0, "files": 0, "bytes": 0, "skipped": 0}
+        started = time.monotonic()
+        rows = islice(enumerate(read_manifest(manifest), start=1), done, None)
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            while batch := list(islice(rows, options["batch_size"])):
+                self.ingest_batch([row for _, row in batch], pool)
+                done = batch[-1][0]
+                checkpoint.write_text(str(done))
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{done} satır | {self.stats['documents']} belge, "
+                    f"{self.stats['files']} dosya | "
+                    f"{self.stats['documents'] / elapsed:.1f} belge/sn, "
+                    f"{self.stats['bytes'] / elapsed / 1024 / 1024:.1f} MB/sn"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Tamamlandı: {self.stats['documents']} belge, "
+                f"{self.stats['files']} dosya, {self.stats['skipped']} satır atlandı."
+            )
+        )
+
+    def resolve(self, rows):
+        departments = dict(
+            Department.objects.filter(
+                full_path__in={row["department"] for row in rows}
+            ).values_list("full_path", "pk")
+        )
+        document_types = {
+            (department_id, name): pk
+            for pk, department_id, name in DocumentType.objects.filter(
+                department_id__in=departments.values(),
+                name__in={row["document_type"] for row in rows},
+            ).values_list("pk", "department_id", "name")
+        }
+        return departments, document_types
+
+    def ingest_batch(self, rows, pool):
+        valid = []
+        for row in rows:
+            if not isinstance(row, dict):
+                self.skip(None, f"Geçersiz satır: {row}")
+            elif not isinstance(row.get("department"), str) or not isinstance(
+                row.get("document_type"), str
+            ):
+                self.skip(row.get("document_no"), "Birim veya belge türü eksik.")
+            else:
+                valid.append(row)
+        rows = valid
+        departments, document_types = self.resolve(rows)
+
+        documents = []
+        files = []
+        for row in rows:
+            department_id = departments.get(row["department"])
+            document_type_id = document_types.get((department_id, row["document_type"]))
+            if department_id is None or document_type_id is None:
+                self.skip(
+                    row.get("document_no"),
+                    f"Birim veya belge türü bulunamadı: {row['department']} / "
+                    f"{row['document_type']}",
+                )
+                continue
+            try:
+                document = Document(
+                    department_id=department_id,
+                    document_type_id=document_type_id,
+                    title=row["title"],
+                    date=datetime.date.fromisoformat(row["date"]),
+                    time=(
+                        datetime.time.fromisoformat(row["time"])
+                        if row.get("time")
+                        else None
+                    ),
+                    document_no=row["document_no"],
+                    description=row.get("description") or None,
+                    created_by=self.user,
+                    updated_by=self.user,
+                )
+                # Lengths and the document number's path rules; one bad row
+                # would otherwise fail the batch's bulk_create on every run.
+                document.full_clean(
+                    exclude=["department", "document_type", "created_by", "updated_by"],
+                    validate_unique=False,
+                    validate_constraints=False,
+                )
+                names = row.get("files") or []
+                if not isinstance(names, list) or not all(
+                    isinstance(name, str) for name in names
+                ):
+                    raise ValueError("files bir dosya adı listesi olmalıdır")
+            except ValidationError as exc:
+                self.skip(
+                    row.get("document_no"), f"Geçersiz satır: {'; '.join(exc.messages)}"
+                )
+                continue
+            except (KeyError, TypeError, ValueError) as exc:
+                self.skip(row.get("document_no"), f"Geçersiz satır: {exc!r}")
+                continue
+            documents.append(document)
+            files.append(names)
+
+        # Rows committed before an interrupted checkpoint write are skipped.
+        existing = set(
+            Document.objects.filter(
+                document_no__in={document.document_no for document in documents},
+                department_id__in={document.department_id for document in documents},
+            ).values_list("department_id", "document_type_id", "document_no")
+        )
+        pending = []
+        for document, names in zip(documents, files):
+            key = (
+                document.department_id,
+                document.document_type_id,
+                document.document_no,
+            )
+            if key in existing:
+                self.stats["skipped"] += 1
+                continue
+            existing.add(key)
+            pending.append((document, names))
+
+        # Each row's files are copied together; a row with an unreadable
+        # file is skipped and the files already copied for it are removed.
+        field = DocumentFile._meta.get_field("file")
+        rows_files = []
+        for document, names in pending:
+            copies = []
+            for name in names:
+                document_file = DocumentFile(
+                    document=document,
+                    storage=self.storage_alias,
+                    created_by=self.user,
+                    updated_by=self.user,
+                )
+                source = self.root / name
+                copies.append(
+                    (
+                        document_file,
+                        source,
+                        field.generate_filename(document_file, source.name),
+                    )
+                )
+            rows_files.append(copies)
+
+        documents = []
+        document_files = []
+        for (document, _), copies, error in zip(
+            pending,
+            rows_files,
+            pool.map(closing_connections(self.copy_row), rows_files),
+        ):
+            if error is not None:
+                self.skip(document.document_no, error)
+                continue
+            documents.append(document)
+            for document_file, _, _ in copies:
+                document_files.append(document_file)
+                self.stats["bytes"] += document_file.size
+
+        try:
+            self.save_batch(documents, document_files)
+        except Exception:
+            # Nothing of the batch was committed; do not leave its copies.
+            for document_file in document_files:
+                self.storage.delete(document_file.file.name)
+            raise
+
+        list_cache.clear()
+        self.stats["documents"] += len(documents)
+        self.stats["files"] += len(document_files)
+
+    def save_batch(self, documents, document_files):
+        with transaction.atomic():
+            Document.objects.bulk_create(documents)
+            for document_file in document_files:
+                document_file.document_id = document_file.document.pk
+            DocumentFile.objects.bulk_create(document_files)
+            # bulk_create sends no post_save, so roll up the statistics and
+            # index the batch explicitly.
+            rollup = statistics.Rollup()
+            for document in documents:
+                rollup.add_document(
+                    document.department_id,
+                    document.document_type_id,
+                    document.date,
+                    documents=1,
+                )
+            for document_file in document_files:
+                document = document_file.document
+                rollup.add_document(
+                    document.department_id,
+                    document.document_type_id,
+                    document.date,
+                    files=1,
+                    size=document_file.size,
+                )
+            rollup.apply()
+            transaction.on_commit(
+                lambda: search.index_documents([document.pk for document in documents])
+            )
+
+    def skip(self, document_no, reason):
+        self.stderr.write(f"Satır atlandı ({document_no}): {reason}")
+        self.stats["skipped"] += 1
+
+    def copy_row(self, copies):
+        # Returns None, or the reason the row's files could not be copied.
+        done = []
+        try:
+            for document_file, source, name in copies:
+                with open(source, "rb") as content:
+                    document_file.file.name = self.storage.save(
+                        name,
+                        File(content),
+                        max_length=DocumentFile._meta.get_field("file").max_length,
+                    )
+                document_file.size = source.stat().st_size
+                done.append(document_file.file.name)
+        except (OSError, SuspiciousFileOperation) as exc:
+            for name in done:
+                self.storage.delete(name)
+            return f"Dosya kopyalanamadı: {exc}"
+        return None
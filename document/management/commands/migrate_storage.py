@@ -0,0 +1,268 @@
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from document.cache import document_cache, file_cache
+from document.models import DocumentFile
+from document.uploads import PartsReader
+from netbelge.db import closing_connections
+
+MB = 1024 * 1024
+CHUNK_SIZE = 4 * MB
+
+
+class CopyError(Exception):
+    pass
+
+
+def configure_multipart(storage, threshold, part_size, concurrency):
+    # django-storages' S3 backend uploads through boto3's transfer manager,
+    # which switches to multipart uploads above ``threshold`` and sends the
+    # parts concurrently. django-minio-storage splits large objects on its
+    # own once the content size is known.
+    if hasattr(storage, "transfer_config"):
+        from boto3.s3.transfer import TransferConfig
+
+        storage.transfer_config = TransferConfig(
+            multipart_threshold=threshold,
+            multipart_chunksize=part_size,
+            max_concurrency=concurrency,
+        )
+
+
+def drain(storage, name):
+    reader = PartsReader(storage, [name])
+    try:
+        while reader.read(CHUNK_SIZE):
+            pass
+    finally:
+        reader.close()
+    return reader.position, reader.sha256.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Belge dosyalarını iki depolama (ör. default ve minio) arasında taşır. "
+        "Kopyalar sağlama ile doğrulanır, ilerleme bir günlüğe yazılır ve "
+        "kayıtlar toplu işlemlerle yeni depolamaya geçirilir; komut yarıda "
+        "kalırsa kaldığı yerden devam eder."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Kaynak STORAGES adı.")
+        parser.add_argument("target", help="Hedef STORAGES adı.")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--journal",
+            type=Path,
+            help="Doğrulanan kopyaların günlüğü. "
+            "Varsayılan: migrate_storage-<kaynak>-<hedef>.jsonl",
+        )
+        parser.add_argument(
+            "--multipart-threshold",
+            type=int,
+            default=64,
+            help="Bu boyutun (MB) üzerindeki dosyalar parçalı yüklenir.",
+        )
+        parser.add_argument("--part-size", type=int, default=16, help="MB")
+        parser.add_argument(
+            "--delete-source",
+            action="store_true",
+            help="Geçirilen dosyaları kaynak depolamadan siler.",
+        )
+
+    def handle(self, *args, **options):
+        for alias in (options["source"], options["target"]):
+            if alias not in settings.STORAGES:
+                raise CommandError(f"Depolama tanımlı değil: {alias}")
+        if options["source"] == options["target"]:
+            raise CommandError("Kaynak ve hedef aynı olamaz.")
+
+        self.source_alias = options["source"]
+        self.target_alias = options["target"]
+        self.source = storages[self.source_alias]
+        self.target = storages[self.target_alias]
+        self.max_length = DocumentFile._meta.get_field("file").max_length
+        configure_multipart(
+            self.target,
+            options["multipart_threshold"] * MB,
+            options["part_size"] * MB,
+            options["workers"],
+        )
+
+        path = options["journal"] or Path(
+            f"migrate_storage-{self.source_alias}-{self.target_alias}.jsonl"
+        )
+        self.journaled = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as journal:
+                for line in journal:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.journaled[entry["id"]] = entry
+            self.stdout.write(f"Günlükte {len(self.journaled)} doğrulanmış kopya var.")
+
+        self.stats = {"switched": 0, "copied": 0, "bytes": 0, "failed": 0}
+        self.lock = threading.Lock()
+        started = time.monotonic()
+        last = 0
+
+        with open(path, "a", encoding="utf-8") as self.journal, ThreadPoolExecutor(
+            max_workers=options["workers"]
+        ) as pool:
+            while True:
+                # Keyset over the rows still on the source; rows whose copy
+                # failed stay there and are retried by the next run.
+                batch = list(
+                    DocumentFile.objects.filter(storage=self.source_alias, pk__gt=last)
+                    .order_by("pk")
+                    .values_list("pk", "file")[: options["batch_size"]]
+                )
+                if not batch:
+                    break
+                last = batch[-1][0]
+
+                entries = [
+                    entry
+                    for entry in pool.map(closing_connections(self.copy), batch)
+                    if entry is not None
+                ]
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+
+                switched = self.switch(entries)
+                if options["delete_source"]:
+                    list(
+                        pool.map(
+                            closing_connections(self.source.delete),
+                            [entry["name"] for entry in switched],
+                        )
+                    )
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{self.stats['switched']} dosya geçirildi, "
+                    f"{self.stats['failed']} hata | "
+                    f"{self.stats['copied'] / elapsed:.1f} dosya/sn, "
+                    f"{self.stats['bytes'] / elapsed / MB:.1f} MB/sn"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Tamamlandı: {self.stats['switched']} dosya geçirildi, "
+                f"{self.stats['failed']} dosya kopyalanamadı."
+            )
+        )
+
+    def copy(self, row):
+        pk, name = row
+        entry = self.journaled.get(pk)
+        if entry is not None and entry["name"] == name:
+            return entry
+
+        try:
+            entry = self.copy_file(pk, name)
+        except (OSError, CopyError) as exc:
+            with self.lock:
+                self.stats["failed"] += 1
+            self.stderr.write(f"Kopyalanamadı: {name} ({exc})")
+            return None
+
+        with self.lock:
+            self.journal.write(json.dumps(entry) + "\n")
+            self.stats["copied"] += 1
+            self.stats["bytes"] += entry["size"]
+        return entry
+
+    def copy_file(self, pk, name):
+        size = self.source.size(name)
+        reader = PartsReader(self.source, [name])
+        content = File(
+            io.BufferedReader(reader, CHUNK_SIZE), name=os.path.basename(name)
+        )
+        content.size = size
+
+        if self.target.exists(name):
+            # Left over by an interrupted run: reuse it if the bytes match,
+            # otherwise store the copy next to it under a free name.
+            existing = drain(self.target, name)
+            source = drain(self.source, name)
+            if existing == source:
+                reader.close()
+                return {
+                    "id": pk,
+                    "name": name,
+                    "target": name,
+                    "size": size,
+                    "sha256": source[1],
+                }
+
+        try:
+            target_name = self.target.save(name, content, max_length=self.max_length)
+        finally:
+            reader.close()
+        digest = reader.sha256.hexdigest()
+        if reader.position != size:
+            self.target.delete(target_name)
+            raise CopyError(f"{reader.position}/{size} bayt okundu")
+
+        # Read the object back from the target before anything points at it.
+        if drain(self.target, target_name) != (size, digest):
+            self.target.delete(target_name)
+            raise CopyError("sağlama uyuşmuyor")
+        return {
+            "id": pk,
+            "name": name,
+            "target": target_name,
+            "size": size,
+            "sha256": digest,
+        }
+
+    def switch(self, entries):
+        # Only rows still on the source with the name that was copied are
+        # switched; a file replaced meanwhile is copied again next run.
+        with transaction.atomic():
+            current = {
+                pk: (name, document_id)
+                for pk, name, document_id in DocumentFile.objects.select_for_update()
+                .filter(
+                    pk__in=[entry["id"] for entry in entries],
+                    storage=self.source_alias,
+                )
+                .values_list("pk", "file", "document_id")
+            }
+            switched = [
+                entry
+                for entry in entries
+                if current.get(entry["id"], (None,))[0] == entry["name"]
+            ]
+            DocumentFile.objects.bulk_update(
+                [
+                    DocumentFile(
+                        pk=entry["id"], file=entry["target"], storage=self.target_alias
+                    )
+                    for entry in switched
+                ],
+                ["file", "storage"],
+            )
+
+            def invalidate():
+                for entry in switched:
+                    file_cache.invalidate(entry["id"])
+                    document_cache.invalidate(current[entry["id"]][1])
+
+            transaction.on_commit(invalidate)
+
+        self.stats["switched"] += len(switched)
+        return switched
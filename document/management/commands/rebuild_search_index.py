@@ -0,0 +1,28 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from document import search
+from document.models import Document
+
+
+class Command(BaseCommand):
+    help = "Belge arama dizinini baştan oluşturur."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("Veritabanı tam metin aramayı desteklemiyor.")
+
+        search.clear_index()
+        count = 0
+        ids = Document.objects.order_by("pk").values_list("pk", flat=True).iterator()
+        while batch := list(islice(ids, options["batch_size"])):
+            with transaction.atomic():
+                search.index_documents(batch)
+            count += len(batch)
+            self.stdout.write(f"{count} belge dizinlendi.")
+        self.stdout.write(self.style.SUCCESS(f"Tamamlandı: {count} belge."))
@@ -0,0 +1,38 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from document import statistics
+from document.models import DocumentFile
+
+
+class Command(BaseCommand):
+    help = (
+        "Birim istatistiklerini baştan hesaplar; boyutu bilinmeyen dosyaların "
+        "boyutunu depolamadan okur."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        missing = 0
+        files = (
+            DocumentFile.objects.filter(size__isnull=True)
+            .only("pk", "file", "storage")
+            .order_by("pk")
+            .iterator()
+        )
+        while batch := list(islice(files, options["batch_size"])):
+            for document_file in batch:
+                try:
+                    document_file.size = document_file.file.size
+                except OSError:
+                    missing += 1
+                    self.stderr.write(f"Dosya okunamadı: {document_file.file.name}")
+            DocumentFile.objects.bulk_update(batch, ["size"])
+
+        count = statistics.rebuild()
+        if missing:
+            self.stderr.write(f"{missing} dosyanın boyutu okunamadı.")
+        self.stdout.write(self.style.SUCCESS(f"Tamamlandı: {count} satır."))
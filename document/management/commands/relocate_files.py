@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from document import relocation
+from document.cache import document_cache, file_cache
+from document.jobs import relocation_queue
+from document.models import DocumentFile, Thumbnail
+from netbelge.db import closing_connections
+from netbelge.storage import copy_file
+
+DOCUMENT_FIELDS = (
+    "pk",
+    "file",
+    "storage",
+    "document__document_type_id",
+    "document__date",
+    "document__time",
+    "document__document_no",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Birim veya belge türü yolu değişen belge dosyalarını yeni yollarına "
+        "taşır. --all ile tüm dosyaları bir kez denetler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Kuyruk yerine tüm dosyaları denetle ve çık.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["all"] and not relocation_queue.enabled:
+            raise CommandError("REDIS_URL tanımlı değil, kuyruk kullanılamıyor.")
+
+        self.batch_size = options["batch_size"]
+        self.max_length = DocumentFile._meta.get_field("file").max_length
+        with ThreadPoolExecutor(max_workers=options["workers"]) as self.pool:
+            if options["all"]:
+                self.relocate(DocumentFile.objects.all())
+                return
+            while True:
+                # A rename often queues the same subtree several times.
+                jobs = {
+                    (kind, tuple(pk) if isinstance(pk, list) else pk)
+                    for kind, pk in relocation_queue.pop(10)
+                }
+                for kind, pk in jobs:
+                    self.relocate(relocation.affected_files(kind, pk))
+                relocation_queue.ack()
+
+    def relocate(self, files):
+        files = files.select_related("document").only(*DOCUMENT_FIELDS)
+        last = 0
+        while batch := list(
+            files.filter(pk__gt=last).order_by("pk")[: self.batch_size]
+        ):
+            last = batch[-1].pk
+            moves = list(relocation.misplaced(batch))
+            copies = [
+                copy
+                for copy in self.pool.map(closing_connections(self.copy), moves)
+                if copy is not None
+            ]
+            switched = self.switch(copies)
+            if copies:
+                self.stdout.write(f"{len(switched)}/{len(moves)} dosya taşındı.")
+
+    def copy(self, move):
+        document_file, target = move
+        name = document_file.file.name
+        try:
+            target = copy_file(
+                document_file.file.storage, name, target, max_length=self.max_length
+            )
+        except Exception as exc:
+            self.stderr.write(f"Taşınamadı: {name} ({exc})")
+            return None
+        return document_file, name, target
+
+    def switch(self, copies):
+        # Rows still pointing at the copied name are switched to the copy; a
+        # file replaced meanwhile keeps its row and the copy is dropped.
+        with transaction.atomic():
+            current = dict(
+                DocumentFile.objects.select_for_update()
+                .filter(pk__in=[document_file.pk for document_file, *_ in copies])
+                .values_list("pk", "file")
+            )
+            switched, stale = [], []
+            for document_file, name, target in copies:
+                if current.get(document_file.pk) == name:
+                    document_file.file.name = target
+                    switched.append((document_file, name))
+                else:
+                    stale.append((document_file, target))
+            DocumentFile.objects.bulk_update(
+                [document_file for document_file, _ in switched], ["file"]
+            )
+            # Thumbnails are stored next to the old name; they are rendered
+            # again on the next request.
+            Thumbnail.objects.filter(
+                document_file__in=[document_file for document_file, _ in switched]
+            ).delete()
+
+            def cleanup():
+                for document_file, name in switched:
+                    document_file.file.storage.delete(name)
+                    file_cache.invalidate(document_file.pk)
+                    document_cache.invalidate(document_file.document_id)
+                for document_file, target in stale:
+                    document_file.file.storage.delete(target)
+
+            transaction.on_commit(cleanup)
+        return switched
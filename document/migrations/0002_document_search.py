@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# The statements are kept here rather than imported from document.search, so
+# the migration does not change when the application code does. Turkish
+# characters are folded before indexing, so PostgreSQL uses the
+# language-neutral "simple" configuration.
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE IF NOT EXISTS document_search (
+        document_id bigint PRIMARY KEY
+            REFERENCES document_document (id) ON DELETE CASCADE
+            DEFERRABLE INITIALLY DEFERRED,
+        body text NOT NULL,
+        vector tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS document_search_vector ON document_search "
+    "USING gin (vector)",
+]
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS document_search USING fts5("
+    "body, tokenize = 'unicode61 remove_diacritics 2')",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for sql in {"postgresql": POSTGRES_CREATE, "sqlite": SQLITE_CREATE}.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("postgresql", "sqlite"):
+        schema_editor.execute("DROP TABLE IF EXISTS document_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("document", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:57
+
+import django.db.models.deletion
+import document.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("document", "0003_uploadsession"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "digest",
+                    models.CharField(
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="SHA-256",
+                    ),
+                ),
+                ("size", models.PositiveBigIntegerField(verbose_name="Boyut")),
+                (
+                    "refcount",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Referans Sayısı"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Oluşturulma Tarihi"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Dosya İçeriği",
+                "verbose_name_plural": "Dosya İçerikleri",
+            },
+        ),
+        migrations.AlterField(
+            model_name="documentfile",
+            name="file",
+            field=models.FileField(
+                max_length=1000,
+                storage=document.models.document_storage,
+                upload_to=document.models.upload_to,
+                verbose_name="Dosya",
+            ),
+        ),
+        migrations.CreateModel(
+            name="BlobReference",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=1000, unique=True, verbose_name="Dosya Yolu"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Oluşturulma Tarihi"
+                    ),
+                ),
+                (
+                    "blob",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="references",
+                        to="document.blob",
+                        verbose_name="Dosya İçeriği",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Dosya Referansı",
+                "verbose_name_plural": "Dosya Referansları",
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+# icontains compiles to UPPER("document_no"::text) LIKE UPPER(%s) on
+# PostgreSQL, so the trigram index is built on exactly that expression.
+TRIGRAM_INDEXES = {
+    "document_no_trgm_idx": 'UPPER("document_no"::text)',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, expression in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON document_document "
+            f"USING gin (({expression}) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0002_department_full_path"),
+        ("document", "0004_blob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                fields=["document_type", "department", "-date", "-id"],
+                name="document_type_dept_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                fields=["department", "-date", "-id"], name="document_dept_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(fields=["-date", "-id"], name="document_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(fields=["document_no"], name="document_no_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="documentfile",
+            index=models.Index(
+                condition=models.Q(
+                    ("content__isnull", True), ("content", ""), _connector="OR"
+                ),
+                fields=["id"],
+                name="documentfile_pending_idx",
+            ),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0002_department_full_path"),
+        ("document", "0005_document_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentfile",
+            name="size",
+            field=models.PositiveBigIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Boyut"
+            ),
+        ),
+        migrations.CreateModel(
+            name="DepartmentStatistics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.CharField(max_length=32, verbose_name="Grup")),
+                (
+                    "document_count",
+                    models.BigIntegerField(default=0, verbose_name="Belge Sayısı"),
+                ),
+                (
+                    "file_count",
+                    models.BigIntegerField(default=0, verbose_name="Dosya Sayısı"),
+                ),
+                (
+                    "total_bytes",
+                    models.BigIntegerField(default=0, verbose_name="Toplam Boyut"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Güncellenme Tarihi"
+                    ),
+                ),
+                (
+                    "department",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statistics",
+                        to="account.department",
+                        verbose_name="Birim",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Birim İstatistiği",
+                "verbose_name_plural": "Birim İstatistikleri",
+                "unique_together": {("department", "bucket")},
+            },
+        ),
+    ]
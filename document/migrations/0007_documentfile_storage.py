@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:15
+
+import document.models
+import netbelge.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("document", "0006_departmentstatistics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentfile",
+            name="storage",
+            field=models.CharField(
+                default=document.models.document_storage_alias,
+                editable=False,
+                max_length=32,
+                verbose_name="Depolama",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="documentfile",
+            name="file",
+            field=netbelge.storage.AliasedFileField(
+                max_length=1000,
+                storage=document.models.document_storage,
+                upload_to=document.models.upload_to,
+                verbose_name="Dosya",
+            ),
+        ),
+    ]
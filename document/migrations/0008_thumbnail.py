@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("document", "0007_documentfile_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Thumbnail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=16, verbose_name="Tür")),
+                ("name", models.CharField(max_length=1000, verbose_name="Dosya")),
+                ("storage", models.CharField(max_length=32, verbose_name="Depolama")),
+                ("source", models.CharField(max_length=1000, verbose_name="Kaynak")),
+                ("size", models.PositiveIntegerField(verbose_name="Boyut")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Oluşturulma Tarihi"
+                    ),
+                ),
+                (
+                    "accessed_at",
+                    models.DateTimeField(db_index=True, verbose_name="Son Erişim"),
+                ),
+                (
+                    "document_file",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="thumbnails",
+                        to="document.documentfile",
+                        verbose_name="Belge Dosyası",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Önizleme",
+                "verbose_name_plural": "Önizlemeler",
+                "unique_together": {("document_file", "kind")},
+            },
+        ),
+    ]
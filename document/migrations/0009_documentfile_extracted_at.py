@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:52
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_extracted(apps, schema_editor):
+    # Files that already have text were extracted before the field existed.
+    DocumentFile = apps.get_model("document", "DocumentFile")
+    DocumentFile.objects.exclude(content__isnull=True).exclude(content="").update(
+        extracted_at=F("updated_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("document", "0008_thumbnail"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="documentfile",
+            name="documentfile_pending_idx",
+        ),
+        migrations.AddField(
+            model_name="documentfile",
+            name="extracted_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Metin Çıkarma Tarihi",
+            ),
+        ),
+        migrations.RunPython(mark_extracted, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="documentfile",
+            index=models.Index(
+                condition=models.Q(("extracted_at__isnull", True)),
+                fields=["id"],
+                name="documentfile_pending_idx",
+            ),
+        ),
+    ]
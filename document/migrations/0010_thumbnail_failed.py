@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("document", "0009_documentfile_extracted_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thumbnail",
+            name="failed",
+            field=models.BooleanField(default=False, verbose_name="Üretilemedi"),
+        ),
+        migrations.AlterField(
+            model_name="thumbnail",
+            name="name",
+            field=models.CharField(blank=True, max_length=1000, verbose_name="Dosya"),
+        ),
+    ]
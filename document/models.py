@@ -1,10 +1,18 @@
+import datetime
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.storage import storages
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from mptt.models import TreeForeignKey
 
-from account.models import Department
-from netbelge.path import normalize_path, validate_path
+from account.models import Department, SubtreeQuerySet
+from netbelge.path import compile_path_template, normalize_path, validate_path
+from netbelge.storage import AliasedFileField
+
+from .cache import department_full_path, document_type_full_path, document_type_slug
 
 
 class DocumentType(models.Model):
@@ -47,6 +55,8 @@ class DocumentType(models.Model):
         related_name="updated_document_types",
     )
 
+    objects = SubtreeQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Belge Türü")
         verbose_name_plural = _("Belge Türleri")
@@ -56,7 +66,9 @@ class DocumentType(models.Model):
         return self.name
 
     def full_path(self):
-        return f"{self.department.full_path}/{self.path}"
+        if self.pk is None:
+            return f"{department_full_path(self.department_id)}/{self.path}"
+        return document_type_full_path(self.pk)
 
 
 class DocumentSection(models.Model):
@@ -134,25 +146,53 @@ class Document(models.Model):
         related_name="updated_documents",
     )
 
+    objects = SubtreeQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Belge")
         verbose_name_plural = _("Belgeler")
         unique_together = ("department", "document_type", "document_no")
+        indexes = [
+            models.Index(
+                fields=["document_type", "department", "-date", "-id"],
+                name="document_type_dept_date_idx",
+            ),
+            models.Index(
+                fields=["department", "-date", "-id"], name="document_dept_date_idx"
+            ),
+            models.Index(fields=["-date", "-id"], name="document_date_idx"),
+            models.Index(fields=["document_no"], name="document_no_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
 def upload_to(instance, filename):
-    path = instance.document.document_type.full_path()
-    path = path.replace("{yil}", str(instance.document.date.year))
-    path = path.replace("{ay}", str(instance.document.date.month))
-    path = path.replace("{gun}", str(instance.document.date.day))
-    path = path.replace(
-        "{belge_no}",
-        normalize_path(instance.document.document_no),
-    )
-    return f"{path}/{filename}"
+    document = instance.document
+    template = compile_path_template(document_type_full_path(document.document_type_id))
+    time = document.time or datetime.time()
+    context = {
+        "yil": str(document.date.year),
+        "ay": str(document.date.month),
+        "gun": str(document.date.day),
+        "saat": str(time.hour),
+        "dakika": str(time.minute),
+        "saniye": str(time.second),
+    }
+    if "belge_turu" in template.placeholders:
+        context["belge_turu"] = document_type_slug(document.document_type_id)
+    if "belge_no" in template.placeholders:
+        context["belge_no"] = normalize_path(document.document_no)
+    return f"{template.render(context)}/{filename}"
+
+
+def document_storage():
+    return storages[settings.DOCUMENT_FILE_STORAGE]
+
+
+def document_storage_alias():
+    return settings.DOCUMENT_FILE_STORAGE
 
 
 class DocumentFile(models.Model):
@@ -162,12 +202,25 @@ class DocumentFile(models.Model):
         related_name="files",
         verbose_name=_("Belge"),
     )
-    file = models.FileField(
+    file = AliasedFileField(
         _("Dosya"),
         upload_to=upload_to,
+        storage=document_storage,
         max_length=1000,
     )
+    # The STORAGES alias holding the file; migrate_storage switches it.
+    storage = models.CharField(
+        _("Depolama"), max_length=32, default=document_storage_alias, editable=False
+    )
+    size = models.PositiveBigIntegerField(
+        _("Boyut"), blank=True, null=True, editable=False
+    )
     content = models.TextField(_("İçerik"), blank=True, null=True)
+    # Set once text extraction has run for the current file, even when it
+    # found no text.
+    extracted_at = models.DateTimeField(
+        _("Metin Çıkarma Tarihi"), blank=True, null=True, editable=False
+    )
 
     created_at = models.DateTimeField(_("Oluşturulma Tarihi"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Güncellenme Tarihi"), auto_now=True)
@@ -188,6 +241,146 @@ class DocumentFile(models.Model):
     class Meta:
         verbose_name = _("Belge Dosyası")
         verbose_name_plural = _("Belge Dosyaları")
+        indexes = [
+            # Files still waiting for text extraction.
+            models.Index(
+                fields=["id"],
+                condition=models.Q(extracted_at__isnull=True),
+                name="documentfile_pending_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.file.name
+
+    def save(self, *args, **kwargs):
+        # A freshly assigned upload knows its size; otherwise ask the storage
+        # only once and keep the answer for the statistics rollup. A file
+        # missing from the storage leaves the size unknown.
+        if self.file and (self.size is None or not self.file._committed):
+            try:
+                self.size = self.file.size
+            except OSError:
+                self.size = None
+        # A replaced file needs its text extracted again.
+        if self.file and not self.file._committed:
+            self.extracted_at = None
+        super().save(*args, **kwargs)
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+        verbose_name=_("Belge"),
+    )
+    filename = models.CharField(_("Dosya Adı"), max_length=255)
+    size = models.PositiveBigIntegerField(_("Boyut"))
+    checksum = models.CharField(_("SHA-256"), max_length=64)
+    offset = models.PositiveBigIntegerField(_("Alınan Bayt"), default=0)
+    parts = models.PositiveIntegerField(_("Parça Sayısı"), default=0)
+
+    created_at = models.DateTimeField(_("Oluşturulma Tarihi"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Güncellenme Tarihi"), auto_now=True)
+    created_by = models.ForeignKey(
+        User,
+        verbose_name=_("Oluşturan"),
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+    )
+
+    class Meta:
+        verbose_name = _("Yükleme Oturumu")
+        verbose_name_plural = _("Yükleme Oturumları")
+
+    def __str__(self):
+        return self.filename
+
+    def part_name(self, index):
+        return f"uploads/{self.pk}/{index:06d}"
+
+
+class Blob(models.Model):
+    digest = models.CharField(_("SHA-256"), max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField(_("Boyut"))
+    refcount = models.PositiveIntegerField(_("Referans Sayısı"), default=0)
+    created_at = models.DateTimeField(_("Oluşturulma Tarihi"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Dosya İçeriği")
+        verbose_name_plural = _("Dosya İçerikleri")
+
+    def __str__(self):
+        return self.digest
+
+
+class BlobReference(models.Model):
+    name = models.CharField(_("Dosya Yolu"), max_length=1000, unique=True)
+    blob = models.ForeignKey(
+        Blob,
+        on_delete=models.PROTECT,
+        related_name="references",
+        verbose_name=_("Dosya İçeriği"),
+    )
+    created_at = models.DateTimeField(_("Oluşturulma Tarihi"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Dosya Referansı")
+        verbose_name_plural = _("Dosya Referansları")
+
+    def __str__(self):
+        return self.name
+
+
+class DepartmentStatistics(models.Model):
+    # Running totals for a department and all of its descendants. ``bucket``
+    # is "total", "type:<document type id>" or "month:<YYYY-MM>".
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.CASCADE,
+        related_name="statistics",
+        verbose_name=_("Birim"),
+    )
+    bucket = models.CharField(_("Grup"), max_length=32)
+    document_count = models.BigIntegerField(_("Belge Sayısı"), default=0)
+    file_count = models.BigIntegerField(_("Dosya Sayısı"), default=0)
+    total_bytes = models.BigIntegerField(_("Toplam Boyut"), default=0)
+    updated_at = models.DateTimeField(_("Güncellenme Tarihi"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Birim İstatistiği")
+        verbose_name_plural = _("Birim İstatistikleri")
+        unique_together = ("department", "bucket")
+
+    def __str__(self):
+        return f"{self.department_id} {self.bucket}"
+
+
+class Thumbnail(models.Model):
+    # A cached first-page image of a DocumentFile, stored next to the file in
+    # the same storage. ``source`` is the file name it was rendered from. A
+    # ``failed`` row has no image and records that rendering did not work.
+    document_file = models.ForeignKey(
+        DocumentFile,
+        on_delete=models.CASCADE,
+        related_name="thumbnails",
+        verbose_name=_("Belge Dosyası"),
+    )
+    kind = models.CharField(_("Tür"), max_length=16)
+    name = models.CharField(_("Dosya"), max_length=1000, blank=True)
+    storage = models.CharField(_("Depolama"), max_length=32)
+    source = models.CharField(_("Kaynak"), max_length=1000)
+    size = models.PositiveIntegerField(_("Boyut"))
+    failed = models.BooleanField(_("Üretilemedi"), default=False)
+    created_at = models.DateTimeField(_("Oluşturulma Tarihi"), auto_now_add=True)
+    accessed_at = models.DateTimeField(_("Son Erişim"), db_index=True)
+
+    class Meta:
+        verbose_name = _("Önizleme")
+        verbose_name_plural = _("Önizlemeler")
+        unique_together = ("document_file", "kind")
+
+    def __str__(self):
+        return self.name
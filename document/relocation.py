@@ -0,0 +1,42 @@
+import os
+
+from account.models import Department
+
+from .models import DocumentFile, DocumentType
+
+# Files are stored under the path upload_to built when they were uploaded.
+# Renaming or moving a department, or editing a document type, changes that
+# path, and so does moving documents to another type in bulk; the
+# relocate_files worker then copies the affected files to their new place
+# and points the rows at the copies.
+
+
+def affected_files(kind, pk):
+    # Files whose path is built from the department subtree or the document
+    # type of a queued ("department" | "document_type", pk) job, or the files
+    # of the documents in a ("documents", [pk, ...]) job from a bulk move.
+    if kind == "documents":
+        return DocumentFile.objects.filter(document_id__in=pk)
+    if kind == "department":
+        department = (
+            Department.objects.filter(pk=pk).only("tree_id", "lft", "rght").first()
+        )
+        if department is None:
+            return DocumentFile.objects.none()
+        document_types = DocumentType.objects.in_subtree(department)
+        return DocumentFile.objects.filter(document__document_type__in=document_types)
+    return DocumentFile.objects.filter(document__document_type_id=pk)
+
+
+def target_name(document_file):
+    # Where upload_to would store the file today, under its current file name.
+    return document_file.file.field.generate_filename(
+        document_file, os.path.basename(document_file.file.name)
+    )
+
+
+def misplaced(document_files):
+    for document_file in document_files:
+        target = target_name(document_file)
+        if os.path.dirname(target) != os.path.dirname(document_file.file.name):
+            yield document_file, target
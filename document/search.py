@@ -0,0 +1,137 @@
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.models import Case, Q, When
+
+from netbelge.path import fold_turkish
+
+TOKEN_RE = re.compile(r"\w+")
+BATCH_SIZE = 500
+
+
+def normalize_text(text):
+    return " ".join(TOKEN_RE.findall(fold_turkish(text)))
+
+
+def is_supported():
+    return connection.vendor in ("postgresql", "sqlite")
+
+
+def index_documents(document_ids):
+    from .models import Document, DocumentFile
+
+    document_ids = list(document_ids)
+    if not document_ids or not is_supported():
+        return
+
+    contents = defaultdict(list)
+    for document_id, content in DocumentFile.objects.filter(
+        document_id__in=document_ids, content__isnull=False
+    ).values_list("document_id", "content"):
+        contents[document_id].append(content)
+
+    rows = [
+        (
+            pk,
+            normalize_text(
+                " ".join([title, document_no, description or "", *contents.get(pk, [])])
+            ),
+        )
+        for pk, title, document_no, description in Document.objects.filter(
+            pk__in=document_ids
+        ).values_list("pk", "title", "document_no", "description")
+    ]
+    found = {pk for pk, _ in rows}
+    missing = [pk for pk in document_ids if pk not in found]
+
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), BATCH_SIZE):
+            batch = rows[offset : offset + BATCH_SIZE]
+            values = ", ".join(["(%s, %s)"] * len(batch))
+            params = [value for row in batch for value in row]
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    f"INSERT INTO document_search (document_id, body) VALUES {values} "
+                    "ON CONFLICT (document_id) DO UPDATE SET body = EXCLUDED.body",
+                    params,
+                )
+            else:
+                _delete(cursor, [pk for pk, _ in batch])
+                cursor.execute(
+                    f"INSERT INTO document_search (rowid, body) VALUES {values}",
+                    params,
+                )
+        _delete(cursor, missing)
+
+
+def _delete(cursor, document_ids):
+    column = "document_id" if connection.vendor == "postgresql" else "rowid"
+    for offset in range(0, len(document_ids), BATCH_SIZE):
+        batch = document_ids[offset : offset + BATCH_SIZE]
+        cursor.execute(
+            f"DELETE FROM document_search WHERE {column} IN "
+            f"({', '.join(['%s'] * len(batch))})",
+            batch,
+        )
+
+
+def remove_documents(document_ids):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        _delete(cursor, list(document_ids))
+
+
+def clear_index():
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM document_search")
+
+
+def search_ids(query, limit=None):
+    terms = TOKEN_RE.findall(fold_turkish(query))
+    if not terms or not is_supported():
+        return []
+    limit = limit or settings.SEARCH_RESULT_LIMIT
+
+    from .models import Document
+
+    # A read like any other: served by a replica when the router picks one.
+    database = connections[router.db_for_read(Document)]
+    with database.cursor() as cursor:
+        if database.vendor == "postgresql":
+            # Turkish characters are folded before indexing and querying, so
+            # the language-neutral "simple" configuration is used.
+            cursor.execute(
+                "SELECT document_id FROM document_search, to_tsquery('simple', %s) q "
+                "WHERE vector @@ q ORDER BY ts_rank_cd(vector, q) DESC LIMIT %s",
+                [" & ".join(f"{term}:*" for term in terms), limit],
+            )
+        else:
+            cursor.execute(
+                "SELECT rowid FROM document_search WHERE document_search MATCH %s "
+                "ORDER BY rank LIMIT %s",
+                [" ".join(f'"{term}"*' for term in terms), limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_documents(queryset, query):
+    if not is_supported():
+        return queryset.filter(
+            Q(title__icontains=query)
+            | Q(document_no__icontains=query)
+            | Q(description__icontains=query)
+        )
+    ids = search_ids(query)
+    # Tokens never match inside identifiers such as "2024/0153", so document
+    # numbers are also matched by substring, after the ranked results.
+    return queryset.filter(Q(pk__in=ids) | Q(document_no__icontains=query)).order_by(
+        Case(
+            *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+            default=len(ids),
+        ),
+        "-date",
+        "-id",
+    )
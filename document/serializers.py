@@ -0,0 +1,139 @@
+import re
+
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from netbelge.api import SparseModelSerializer
+
+from .models import (
+    DepartmentStatistics,
+    Document,
+    DocumentFile,
+    DocumentType,
+    UploadSession,
+)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = (
+            "id",
+            "document",
+            "filename",
+            "size",
+            "checksum",
+            "offset",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = ("id", "offset", "created_at", "updated_at")
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if not re.fullmatch(r"[0-9a-f]{64}", value):
+            raise serializers.ValidationError(_("Geçersiz SHA-256 değeri."))
+        return value
+
+
+class DocumentTypeSerializer(SparseModelSerializer):
+    full_path = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentType
+        fields = (
+            "id",
+            "department",
+            "name",
+            "description",
+            "path",
+            "full_path",
+            "created_at",
+            "updated_at",
+        )
+
+    def get_full_path(self, obj):
+        return f"{obj.department.full_path}/{obj.path}"
+
+
+class DocumentFileListSerializer(SparseModelSerializer):
+    # The file name is returned as stored; bytes are fetched through
+    # download_url so listing never touches the storage backend.
+    file = serializers.CharField(source="file.name", read_only=True)
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentFile
+        fields = (
+            "id",
+            "document",
+            "file",
+            "size",
+            "download_url",
+            "thumbnail_url",
+            "preview_url",
+            "created_at",
+            "updated_at",
+        )
+
+    def absolute_url(self, name, obj, query=""):
+        url = reverse(name, args=[obj.pk]) + query
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def get_download_url(self, obj):
+        return self.absolute_url("documentfile-download", obj)
+
+    def get_thumbnail_url(self, obj):
+        return self.absolute_url("documentfile-thumbnail", obj)
+
+    def get_preview_url(self, obj):
+        return self.absolute_url("documentfile-thumbnail", obj, "?kind=preview")
+
+
+class DocumentFileSerializer(DocumentFileListSerializer):
+    class Meta(DocumentFileListSerializer.Meta):
+        fields = DocumentFileListSerializer.Meta.fields + ("content",)
+
+
+class DocumentSerializer(SparseModelSerializer):
+    department_path = serializers.CharField(
+        source="department.full_path", read_only=True
+    )
+    document_type_name = serializers.CharField(
+        source="document_type.name", read_only=True
+    )
+    files = DocumentFileListSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Document
+        fields = (
+            "id",
+            "department",
+            "department_path",
+            "document_type",
+            "document_type_name",
+            "title",
+            "date",
+            "time",
+            "document_no",
+            "description",
+            "files",
+            "created_at",
+            "updated_at",
+        )
+
+
+class DepartmentStatisticsSerializer(SparseModelSerializer):
+    class Meta:
+        model = DepartmentStatistics
+        fields = (
+            "department",
+            "document_count",
+            "file_count",
+            "total_bytes",
+            "updated_at",
+        )
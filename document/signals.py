@@ -0,0 +1,261 @@
+from django.core.files.storage import storages
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from account.models import Department
+from netbelge.storage import DeduplicatedStorage
+
+from . import search, statistics
+from .cache import document_cache, file_cache, list_cache, path_cache
+from .jobs import extraction_queue, relocation_queue
+from .models import (
+    DepartmentStatistics,
+    Document,
+    DocumentFile,
+    DocumentType,
+    Thumbnail,
+)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(node_moved, sender=Department)
+def invalidate_department_paths(sender, instance, created=False, **kwargs):
+    # A rename or move rewrites the paths of the whole subtree and of every
+    # document type under it, so drop the cache wholesale.
+    if not created:
+        path_cache.clear()
+
+
+@receiver(post_save, sender=DocumentType)
+@receiver(post_delete, sender=DocumentType)
+def invalidate_document_type_path(sender, instance, **kwargs):
+    path_cache.delete(f"document_type:{instance.pk}")
+    path_cache.delete(f"document_type_slug:{instance.pk}")
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def invalidate_document_list(sender, **kwargs):
+    list_cache.clear()
+
+
+@receiver(post_save, sender=Document)
+def index_document(sender, instance, **kwargs):
+    transaction.on_commit(lambda: search.index_documents([instance.pk]))
+
+
+@receiver(post_delete, sender=Document)
+def remove_document_from_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: search.remove_documents([instance.pk]))
+
+
+@receiver(post_save, sender=DocumentFile)
+@receiver(post_delete, sender=DocumentFile)
+def index_document_file(sender, instance, **kwargs):
+    document_id = instance.document_id
+    transaction.on_commit(lambda: search.index_documents([document_id]))
+
+
+@receiver(post_save, sender=DocumentFile)
+def enqueue_text_extraction(sender, instance, created, **kwargs):
+    if instance.extracted_at is None:
+        pk = instance.pk
+        transaction.on_commit(lambda: extraction_queue.push(pk))
+
+
+@receiver(post_delete, sender=DocumentFile)
+def release_deduplicated_blob(sender, instance, **kwargs):
+    storage = instance.file.storage
+    if isinstance(storage, DeduplicatedStorage) and instance.file.name:
+        name = instance.file.name
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(post_delete, sender=Thumbnail)
+def delete_thumbnail_file(sender, instance, **kwargs):
+    alias, name = instance.storage, instance.name
+    if name:
+        transaction.on_commit(lambda: storages[alias].delete(name))
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(node_moved, sender=Department)
+@receiver(post_save, sender=DocumentType)
+@receiver(post_delete, sender=DocumentType)
+def invalidate_documents(sender, **kwargs):
+    # Document representations embed department paths and type names.
+    document_cache.clear()
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def invalidate_document(sender, instance, **kwargs):
+    document_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=DocumentFile)
+@receiver(post_delete, sender=DocumentFile)
+def invalidate_document_file(sender, instance, **kwargs):
+    file_cache.invalidate(instance.pk)
+    document_cache.invalidate(instance.document_id)
+
+
+@receiver(pre_save, sender=Document)
+def remember_document_bucket(sender, instance, **kwargs):
+    instance._previous_bucket = None
+    if not instance._state.adding:
+        instance._previous_bucket = (
+            Document.objects.filter(pk=instance.pk)
+            .values_list("department_id", "document_type_id", "date")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Document)
+def count_document(sender, instance, created, **kwargs):
+    bucket = (instance.department_id, instance.document_type_id, instance.date)
+    previous = getattr(instance, "_previous_bucket", None)
+    rollup = statistics.Rollup()
+    if created or previous is None:
+        rollup.add_document(*bucket, documents=1)
+    elif previous != bucket:
+        # Moving a document carries its files' totals along with it.
+        files = instance.files.aggregate(count=Count("pk"), size=Sum("size"))
+        counts = {
+            "documents": 1,
+            "files": files["count"],
+            "size": files["size"] or 0,
+        }
+        rollup.add_document(*previous, **{k: -v for k, v in counts.items()})
+        rollup.add_document(*bucket, **counts)
+    rollup.apply()
+
+
+def in_deleted_subtree(origin):
+    # Rows inside a deleted department subtree go away with it; mptt has
+    # already shifted the lft/rght ranges, so they must not be rolled up.
+    return isinstance(origin, Department)
+
+
+@receiver(post_delete, sender=Document)
+def uncount_document(sender, instance, origin=None, **kwargs):
+    # Its files are deleted first and uncount themselves.
+    if in_deleted_subtree(origin):
+        return
+    rollup = statistics.Rollup()
+    rollup.add_document(
+        instance.department_id, instance.document_type_id, instance.date, documents=-1
+    )
+    rollup.apply()
+
+
+@receiver(pre_save, sender=DocumentFile)
+def remember_document_file_size(sender, instance, update_fields=None, **kwargs):
+    instance._previous_size = None
+    if update_fields is not None and not {"document", "size"} & set(update_fields):
+        # Neither can change, so there is nothing to roll up.
+        instance._previous_size = (instance.document_id, instance.size)
+    elif not instance._state.adding:
+        instance._previous_size = (
+            DocumentFile.objects.filter(pk=instance.pk)
+            .values_list("document_id", "size")
+            .first()
+        )
+
+
+def document_bucket(document_id):
+    return (
+        Document.objects.filter(pk=document_id)
+        .values_list("department_id", "document_type_id", "date")
+        .first()
+    )
+
+
+@receiver(post_save, sender=DocumentFile)
+def count_document_file(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_size", None)
+    if previous == (instance.document_id, instance.size):
+        return
+    bucket = document_bucket(instance.document_id)
+    previous_bucket = None
+    if previous is not None:
+        previous_bucket = (
+            bucket
+            if previous[0] == instance.document_id
+            else document_bucket(previous[0])
+        )
+        if (previous_bucket, previous[1]) == (bucket, instance.size):
+            # Nothing that is counted has changed.
+            return
+    rollup = statistics.Rollup()
+    if previous_bucket:
+        rollup.add_document(*previous_bucket, files=-1, size=-(previous[1] or 0))
+    if bucket:
+        rollup.add_document(*bucket, files=1, size=instance.size)
+    rollup.apply()
+
+
+@receiver(post_delete, sender=DocumentFile)
+def uncount_document_file(sender, instance, origin=None, **kwargs):
+    if in_deleted_subtree(origin):
+        return
+    bucket = document_bucket(instance.document_id)
+    if bucket:
+        rollup = statistics.Rollup()
+        rollup.add_document(*bucket, files=-1, size=-(instance.size or 0))
+        rollup.apply()
+
+
+@receiver(post_save, sender=Department)
+def move_department_statistics(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_parent_id", None)
+    if not created and previous != instance.parent_id:
+        statistics.move_subtree(instance.pk, previous, instance.parent_id)
+
+
+@receiver(pre_delete, sender=Department)
+def remove_department_statistics(sender, instance, origin=None, **kwargs):
+    # Only the node delete() was called on has surviving ancestors; mptt has
+    # already closed the gap, so they are found from the parent's range.
+    if instance == origin and instance.parent_id:
+        rollup = statistics.Rollup()
+        rollup.add_rows(
+            instance.parent_id,
+            DepartmentStatistics.objects.filter(department_id=instance.pk),
+            sign=-1,
+        )
+        rollup.apply()
+
+
+@receiver(post_save, sender=Department)
+def relocate_department_files(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_full_path", None)
+    if not created and previous and previous != instance.full_path:
+        pk = instance.pk
+        transaction.on_commit(lambda: relocation_queue.push(["department", pk]))
+
+
+@receiver(pre_save, sender=DocumentType)
+def remember_document_type_path(sender, instance, **kwargs):
+    instance._previous_path = None
+    if not instance._state.adding:
+        instance._previous_path = (
+            DocumentType.objects.filter(pk=instance.pk)
+            .values_list("department_id", "name", "path")
+            .first()
+        )
+
+
+@receiver(post_save, sender=DocumentType)
+def relocate_document_type_files(sender, instance, created, **kwargs):
+    # The name matters to templates using {belge_turu}.
+    previous = getattr(instance, "_previous_path", None)
+    current = (instance.department_id, instance.name, instance.path)
+    if not created and previous and previous != current:
+        pk = instance.pk
+        transaction.on_commit(lambda: relocation_queue.push(["document_type", pk]))
@@ -0,0 +1,252 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Now, TruncMonth
+
+from account.models import Department
+
+from .models import DepartmentStatistics, Document, DocumentFile
+
+# Every department keeps running totals for itself and all of its
+# descendants, so a subtree total is a single row lookup. Changes are
+# accumulated as deltas and added to the department and its ancestors,
+# found through the stored lft/rght range, with a few set-based UPDATEs.
+
+TOTAL = "total"
+COUNTERS = ("document_count", "file_count", "total_bytes")
+BATCH_SIZE = 1000
+
+
+def buckets(document_type_id, date):
+    return (TOTAL, f"type:{document_type_id}", f"month:{date:%Y-%m}")
+
+
+def ancestors(department_ids):
+    # Map every department to itself and its ancestors with two queries.
+    nodes = list(
+        Department.objects.filter(pk__in=department_ids).values_list(
+            "pk", "tree_id", "lft", "rght"
+        )
+    )
+    if not nodes:
+        return {}
+    query = reduce(
+        or_,
+        (
+            Q(tree_id=tree_id, lft__lte=lft, rght__gte=rght)
+            for _, tree_id, lft, rght in nodes
+        ),
+    )
+    candidates = list(
+        Department.objects.filter(query).values_list("pk", "tree_id", "lft", "rght")
+    )
+    return {
+        pk: [
+            ancestor
+            for ancestor, ancestor_tree, ancestor_lft, ancestor_rght in candidates
+            if ancestor_tree == tree_id
+            and ancestor_lft <= lft
+            and ancestor_rght >= rght
+        ]
+        for pk, tree_id, lft, rght in nodes
+    }
+
+
+class Rollup:
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0, 0, 0])
+
+    def add(self, department_id, bucket, documents=0, files=0, size=0):
+        delta = self.deltas[department_id, bucket]
+        delta[0] += documents
+        delta[1] += files
+        delta[2] += size or 0
+
+    def add_document(self, department_id, document_type_id, date, **counts):
+        for bucket in buckets(document_type_id, date):
+            self.add(department_id, bucket, **counts)
+
+    def add_rows(self, department_id, rows, sign=1):
+        for row in rows:
+            self.add(
+                department_id,
+                row.bucket,
+                sign * row.document_count,
+                sign * row.file_count,
+                sign * row.total_bytes,
+            )
+
+    def add_documents(self, documents, sign=1):
+        # The documents of a queryset, counted with one grouped query.
+        rows = documents.values(
+            "department_id", "document_type_id", month=TruncMonth("date")
+        ).annotate(count=Count("pk"))
+        for row in rows.order_by():
+            self.add_document(
+                row["department_id"],
+                row["document_type_id"],
+                row["month"],
+                documents=sign * row["count"],
+            )
+
+    def add_files(self, files, sign=1):
+        rows = files.values(
+            department=F("document__department_id"),
+            document_type=F("document__document_type_id"),
+            month=TruncMonth("document__date"),
+        ).annotate(count=Count("pk"), size=Sum("size"))
+        for row in rows.order_by():
+            self.add_document(
+                row["department"],
+                row["document_type"],
+                row["month"],
+                files=sign * row["count"],
+                size=sign * (row["size"] or 0),
+            )
+
+    def apply(self):
+        deltas = {key: tuple(delta) for key, delta in self.deltas.items() if any(delta)}
+        self.deltas.clear()
+        if not deltas:
+            return
+
+        lineage = ancestors({department_id for department_id, _ in deltas})
+        rolled = defaultdict(lambda: [0, 0, 0])
+        for (department_id, bucket), delta in deltas.items():
+            for ancestor in lineage.get(department_id, ()):
+                total = rolled[ancestor, bucket]
+                for index, value in enumerate(delta):
+                    total[index] += value
+
+        DepartmentStatistics.objects.bulk_create(
+            [
+                DepartmentStatistics(department_id=department_id, bucket=bucket)
+                for department_id, bucket in rolled
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+        # Rows sharing a delta (a document counted once in each of its
+        # buckets, all the way up the tree) are updated together.
+        groups = defaultdict(lambda: defaultdict(set))
+        for (department_id, bucket), delta in rolled.items():
+            groups[tuple(delta)][department_id].add(bucket)
+        for delta, departments in groups.items():
+            by_buckets = defaultdict(list)
+            for department_id, names in departments.items():
+                by_buckets[frozenset(names)].append(department_id)
+            query = reduce(
+                or_,
+                (
+                    Q(department_id__in=department_ids, bucket__in=names)
+                    for names, department_ids in by_buckets.items()
+                ),
+            )
+            DepartmentStatistics.objects.filter(query).update(
+                updated_at=Now(),
+                **{
+                    counter: F(counter) + value
+                    for counter, value in zip(COUNTERS, delta)
+                    if value
+                },
+            )
+
+        if any(value < 0 for delta in deltas.values() for value in delta):
+            DepartmentStatistics.objects.filter(
+                department_id__in={department_id for department_id, _ in rolled},
+                document_count__lte=0,
+                file_count__lte=0,
+                total_bytes__lte=0,
+            ).delete()
+
+
+def move_subtree(department_id, old_parent_id, new_parent_id):
+    # The subtree's own rows stay put; only the ancestors on either side of
+    # the move change.
+    rows = list(DepartmentStatistics.objects.filter(department_id=department_id))
+    rollup = Rollup()
+    if old_parent_id:
+        rollup.add_rows(old_parent_id, rows, sign=-1)
+    if new_parent_id:
+        rollup.add_rows(new_parent_id, rows)
+    rollup.apply()
+
+
+def rebuild():
+    # Recompute every row from scratch: one grouped query per model, rolled
+    # up the tree in memory and written back in batches.
+    parents = dict(Department.objects.values_list("pk", "parent_id"))
+    totals = defaultdict(lambda: [0, 0, 0])
+
+    def add(department_id, document_type_id, month, delta):
+        while department_id:
+            for bucket in buckets(document_type_id, month):
+                total = totals[department_id, bucket]
+                for index, value in enumerate(delta):
+                    total[index] += value or 0
+            department_id = parents.get(department_id)
+
+    documents = Document.objects.values(
+        "department_id", "document_type_id", month=TruncMonth("date")
+    ).annotate(count=Count("pk"))
+    for row in documents.order_by():
+        add(
+            row["department_id"],
+            row["document_type_id"],
+            row["month"],
+            (row["count"], 0, 0),
+        )
+
+    files = DocumentFile.objects.values(
+        department=F("document__department_id"),
+        document_type=F("document__document_type_id"),
+        month=TruncMonth("document__date"),
+    ).annotate(count=Count("pk"), size=Sum("size"))
+    for row in files.order_by():
+        add(
+            row["department"],
+            row["document_type"],
+            row["month"],
+            (0, row["count"], row["size"]),
+        )
+
+    with transaction.atomic():
+        DepartmentStatistics.objects.all().delete()
+        DepartmentStatistics.objects.bulk_create(
+            [
+                DepartmentStatistics(
+                    department_id=department_id,
+                    bucket=bucket,
+                    **dict(zip(COUNTERS, total)),
+                )
+                for (department_id, bucket), total in totals.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    return len(totals)
+
+
+def _counters(row):
+    return {counter: getattr(row, counter) for counter in COUNTERS}
+
+
+def subtree_totals(department_id):
+    row = DepartmentStatistics.objects.filter(
+        department_id=department_id, bucket=TOTAL
+    ).first()
+    return _counters(row) if row else dict.fromkeys(COUNTERS, 0)
+
+
+def subtree_breakdown(department_id):
+    result = {"total": dict.fromkeys(COUNTERS, 0), "types": {}, "months": {}}
+    for row in DepartmentStatistics.objects.filter(department_id=department_id):
+        if row.bucket == TOTAL:
+            result["total"] = _counters(row)
+        else:
+            kind, _, key = row.bucket.partition(":")
+            result[f"{kind}s"][key] = _counters(row)
+    return result
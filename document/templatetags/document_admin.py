@@ -0,0 +1,18 @@
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+
+register = template.Library()
+
+
+class DateHierarchyChangeList:
+    def __init__(self, cl):
+        self.cl = cl
+        self.queryset = cl.date_queryset
+
+    def __getattr__(self, name):
+        return getattr(self.cl, name)
+
+
+@register.inclusion_tag("admin/date_hierarchy.html")
+def cached_date_hierarchy(cl):
+    return date_hierarchy(DateHierarchyChangeList(cl))
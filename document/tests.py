@@ -1,3 +1,2004 @@
-from django.test import TestCase
+import copy
+import datetime
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from account.models import Department
+from netbelge import db, metrics
+from netbelge.api import ModelViewPermissions
+from netbelge.cache import TieredCache
+from netbelge.pagination import keyset_before
+from netbelge.path import compile_path_template, normalize_path, validate_path
+from netbelge.queue import JobQueue
+from netbelge.storage import copy_file
+
+from . import benchmark, search, statistics, thumbnails, uploads
+from .admin import DocumentAdmin
+from .cache import department_full_path, document_type_full_path, path_cache
+from .jobs import relocation_queue, thumbnail_queue
+from .management.commands import extract_text
+from .models import (
+    Blob,
+    BlobReference,
+    DepartmentStatistics,
+    Document,
+    DocumentFile,
+    DocumentType,
+    Thumbnail,
+    UploadSession,
+)
+
+
+def has_open_connection():
+    return connections[DEFAULT_DB_ALIAS].connection is not None
+
+
+def temporary_storages(*aliases):
+    # Keeps files written by tests out of the media directory: "default" and
+    # the given aliases get directories of their own for the decorated class,
+    # removed once its tests have run.
+    def decorator(cls):
+        set_up_class = cls.setUpClass.__func__
+
+        def setUpClass(cls):
+            root = tempfile.mkdtemp(prefix="netbelge-test-")
+            cls.addClassCleanup(shutil.rmtree, root)
+            overridden = override_settings(
+                STORAGES={
+                    **settings.STORAGES,
+                    **{
+                        alias: {
+                            "BACKEND": "django.core.files.storage.FileSystemStorage",
+                            "OPTIONS": {"location": os.path.join(root, alias)},
+                        }
+                        for alias in ("default", *aliases)
+                    },
+                }
+            )
+            overridden.enable()
+            cls.addClassCleanup(overridden.disable)
+            set_up_class(cls)
+
+        cls.setUpClass = classmethod(setUpClass)
+        return cls
+
+    return decorator
+
+
+class ChangelistQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.parent = None
+
+    def add_rows(self, depth, count):
+        for level in range(depth):
+            self.parent = Department.objects.create(
+                name=f"Birim {Department.objects.count()} {level}",
+                parent=self.parent,
+                created_by=self.user,
+                updated_by=self.user,
+            )
+        for index in range(count):
+            document_type = DocumentType.objects.create(
+                department=self.parent,
+                name=f"Tür {DocumentType.objects.count()}",
+                path="tur/{yil}",
+                created_by=self.user,
+                updated_by=self.user,
+            )
+            Document.objects.create(
+                department=self.parent,
+                document_type=document_type,
+                title=f"Belge {index}",
+                date=datetime.date(2024, 1, 1),
+                document_no=f"no-{Document.objects.count()}",
+                created_by=self.user,
+                updated_by=self.user,
+            )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assertConstantQueries(self, url):
+        self.add_rows(depth=2, count=2)
+        small = self.count_queries(url)
+        self.add_rows(depth=6, count=30)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_document_changelist(self):
+        self.assertConstantQueries("/admin/document/document/")
+
+    def test_document_type_changelist(self):
+        self.assertConstantQueries("/admin/document/documenttype/")
+
+    def test_department_changelist(self):
+        self.assertConstantQueries("/admin/account/department/grid/")
+
+
+class KeysetChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=cls.user, updated_by=cls.user
+        )
+        document_type = DocumentType.objects.create(
+            department=department,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=cls.user,
+            updated_by=cls.user,
+        )
+        # Several documents share a date, so pages split between equal dates.
+        for index, day in enumerate([3, 1, 2, 2, 2, 1, 3]):
+            Document.objects.create(
+                department=department,
+                document_type=document_type,
+                title=f"Belge {index}",
+                date=datetime.date(2024, 1, day),
+                document_no=str(index),
+                created_by=cls.user,
+                updated_by=cls.user,
+            )
+        cls.url = reverse("admin:document_document_changelist")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        patcher = mock.patch.object(DocumentAdmin, "list_per_page", 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pages_follow_date_and_id(self):
+        expected = list(
+            Document.objects.order_by("-date", "-id").values_list("pk", flat=True)
+        )
+        pages, url = [], self.url
+        while url:
+            response = self.client.get(url)
+            cl = response.context["cl"]
+            pages.append([document.pk for document in cl.result_list])
+            url = cl.next_cursor and self.url + cl.next_page_url
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+        self.assertContains(response, "İlk sayfa")
+        self.assertNotContains(response, "Sonraki sayfa")
+
+    def test_cursor_keeps_filters(self):
+        response = self.client.get(self.url, {"date__day": 2})
+        cl = response.context["cl"]
+        self.assertIsNone(cl.next_cursor)
+        self.assertEqual(len(cl.result_list), 3)
+        self.assertTrue(all(d.date.day == 2 for d in cl.result_list))
+
+        response = self.client.get(self.url, {"date__year": 2024})
+        self.assertIn("date__year=2024", response.context["cl"].next_page_url)
+
+    def test_invalid_cursor(self):
+        for cursor in ("yok", "2024-13-01_5", "2024-01-01_x"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {"c": cursor})
+                self.assertRedirects(
+                    response, f"{self.url}?e=1", fetch_redirect_response=False
+                )
+
+    def test_column_ordering_uses_numbered_pages(self):
+        response = self.client.get(self.url, {"o": "1", "p": "2"})
+        cl = response.context["cl"]
+        self.assertFalse(cl.keyset)
+        self.assertEqual(
+            [document.title for document in cl.result_list],
+            ["Belge 3", "Belge 4", "Belge 5"],
+        )
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class IngestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=self.user, updated_by=self.user
+        )
+        DocumentType.objects.create(
+            department=department,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        (self.root / "a.pdf").write_bytes(b"a" * 10)
+        (self.root / "b.pdf").write_bytes(b"b" * 20)
+        self.manifest = self.root / "manifest.jsonl"
+
+    def write(self, *rows):
+        with open(self.manifest, "a", encoding="utf-8") as manifest:
+            for document_no, date, files in rows:
+                row = {
+                    "department": "genel-mudurluk",
+                    "document_type": "Yazı",
+                    "title": f"Belge {document_no}",
+                    "date": date,
+                    "document_no": document_no,
+                    "files": files,
+                }
+                manifest.write(json.dumps(row) + "\n")
+
+    def ingest(self):
+        errors = io.StringIO()
+        call_command(
+            "ingest_documents",
+            str(self.manifest),
+            root=self.root,
+            user="admin",
+            stdout=io.StringIO(),
+            stderr=errors,
+        )
+        return errors.getvalue()
+
+    def stored_files(self):
+        storage = storages["default"]
+        return sorted(
+            DocumentFile.objects.values_list("file", "storage", "size")
+        ), sorted(
+            str(path.relative_to(storage.location))
+            for path in Path(storage.location).rglob("*")
+            if path.is_file()
+        )
+
+    def test_ingest_skips_bad_rows_and_resumes(self):
+        self.write(
+            ("no-1", "2024-01-02", ["a.pdf"]),
+            ("no-2", "02.01.2024", ["a.pdf"]),
+            ("no-3", "2024-01-03", ["b.pdf", "yok.pdf"]),
+            ("no-4", "2023-05-06", ["b.pdf"]),
+        )
+        errors = self.ingest()
+        self.assertIn("Satır atlandı (no-2)", errors)
+        self.assertIn("Satır atlandı (no-3)", errors)
+        self.assertEqual(
+            sorted(Document.objects.values_list("document_no", flat=True)),
+            ["no-1", "no-4"],
+        )
+        # The copy of b.pdf made for row 3 was removed again.
+        rows, names = self.stored_files()
+        self.assertEqual(
+            rows,
+            [
+                ("genel-mudurluk/yazi/2023/b.pdf", "default", 20),
+                ("genel-mudurluk/yazi/2024/a.pdf", "default", 10),
+            ],
+        )
+        self.assertEqual(names, [name for name, _, _ in rows])
+        self.assertEqual(DepartmentStatistics.objects.get(bucket="total").file_count, 2)
+
+        # Resumes after the checkpoint; without it, rows already imported
+        # are recognised and not duplicated.
+        self.write(("no-5", "2024-02-01", []))
+        self.ingest()
+        self.assertEqual(Document.objects.count(), 3)
+        (self.root / "manifest.jsonl.checkpoint").unlink()
+        self.ingest()
+        self.assertEqual(Document.objects.count(), 3)
+        self.assertEqual(len(self.stored_files()[1]), 2)
+
+    def test_ingest_skips_malformed_and_invalid_rows(self):
+        self.write(("no-1", "2024-01-02", ["a.pdf"]))
+        with open(self.manifest, "a", encoding="utf-8") as manifest:
+            manifest.write("{bozuk\n")
+            manifest.write(json.dumps({"title": "Birimsiz", "document_no": "no-2"}))
+            manifest.write("\n")
+        self.write(
+            ("x" * 101, "2024-01-03", []),
+            ("-no-4", "2024-01-04", []),
+            ("no-5", "2024-01-05", "a.pdf"),
+            ("no-6", "2024-01-06", ["b.pdf"]),
+        )
+        errors = self.ingest()
+        self.assertIn("Satır atlandı (None): Geçersiz satır: Expecting", errors)
+        self.assertIn("Satır atlandı (no-2): Birim veya belge türü eksik.", errors)
+        self.assertIn(f"Satır atlandı ({'x' * 101})", errors)
+        self.assertIn("Satır atlandı (-no-4)", errors)
+        self.assertIn("Satır atlandı (no-5)", errors)
+        self.assertEqual(
+            sorted(Document.objects.values_list("document_no", flat=True)),
+            ["no-1", "no-6"],
+        )
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages("archive")
+class MigrateStorageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=self.user, updated_by=self.user
+        )
+        self.document = Document.objects.create(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=self.user,
+                updated_by=self.user,
+            ),
+            title="Yazı",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        journal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal)
+        self.journal = Path(journal) / "journal.jsonl"
+
+    def add_file(self, data):
+        return DocumentFile.objects.create(
+            document=self.document,
+            file=ContentFile(data, name="tarama.pdf"),
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def migrate(self, *args):
+        errors = io.StringIO()
+        with mock.patch.object(
+            connections, "close_all", wraps=connections.close_all
+        ) as close_all:
+            call_command(
+                "migrate_storage",
+                "default",
+                "archive",
+                *args,
+                journal=self.journal,
+                workers=2,
+                stdout=io.StringIO(),
+                stderr=errors,
+            )
+        return errors.getvalue(), close_all.call_count
+
+    def test_copies_verifies_and_resumes(self):
+        first = self.add_file(b"birinci")
+        missing = self.add_file(b"ikinci")
+        storages["default"].delete(missing.file.name)
+
+        errors, closed = self.migrate()
+        self.assertIn(f"Kopyalanamadı: {missing.file.name}", errors)
+        # Every copy task closes the connections of its pool thread.
+        self.assertEqual(closed, 2)
+        first.refresh_from_db()
+        self.assertEqual(first.storage, "archive")
+        with first.file.open("rb") as file:
+            self.assertEqual(file.read(), b"birinci")
+        self.assertTrue(storages["default"].exists(first.file.name))
+        self.assertEqual(DocumentFile.objects.get(pk=missing.pk).storage, "default")
+        entries = [json.loads(line) for line in self.journal.read_text().splitlines()]
+        self.assertEqual([entry["id"] for entry in entries], [first.pk])
+        self.assertEqual(entries[0]["sha256"], hashlib.sha256(b"birinci").hexdigest())
+
+        # The next run retries the failed row and copies new ones; verified
+        # copies in the journal are not copied again.
+        storages["default"].save(missing.file.name, ContentFile(b"ikinci"))
+        third = self.add_file(b"ucuncu")
+        DocumentFile.objects.filter(pk=first.pk).update(storage="default")
+        with mock.patch.object(
+            storages["archive"], "save", wraps=storages["archive"].save
+        ) as save:
+            self.migrate("--delete-source")
+        self.assertEqual(save.call_count, 2)
+        self.assertEqual(
+            set(DocumentFile.objects.values_list("storage", flat=True)), {"archive"}
+        )
+        for document_file in (first, missing, third):
+            self.assertFalse(storages["default"].exists(document_file.file.name))
+
+    def test_copied_rows_keep_their_storage(self):
+        document_file = DocumentFile.objects.create(
+            document=self.document,
+            file=ContentFile(b"arsiv", name="tarama.pdf"),
+            storage="archive",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        self.addCleanup(storages["archive"].delete, document_file.file.name)
+        for restored in (
+            copy.deepcopy(document_file),
+            pickle.loads(pickle.dumps(document_file)),
+        ):
+            self.assertIs(restored.file.storage, storages["archive"])
+            with restored.file.open("rb") as file:
+                self.assertEqual(file.read(), b"arsiv")
+
+
+class PathCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidation_reaches_other_processes(self):
+        # Two caches with one prefix stand for two worker processes.
+        first, second = TieredCache("test-tiered"), TieredCache("test-tiered")
+        load = iter(range(100)).__next__
+        self.assertEqual(first.get_or_set("key", load), 0)
+        self.assertEqual(second.get_or_set("key", load), 0)
+
+        first.delete("key")
+        self.assertEqual(second.get_or_set("key", load), 1)
+        first.clear()
+        self.assertEqual(second.get_or_set("key", load), 2)
+
+        # A reader between the invalidation and the commit caches the old
+        # value again; the commit drops it once more.
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete("key")
+            self.assertEqual(second.get_or_set("key", load), 3)
+        self.assertEqual(second.get_or_set("key", load), 4)
+        self.assertEqual(first.get_or_set("key", load), 4)
+
+    def test_follows_department_and_type_changes(self):
+        user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=user, updated_by=user
+        )
+        document_type = DocumentType.objects.create(
+            department=department,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=user,
+            updated_by=user,
+        )
+        self.assertEqual(
+            document_type_full_path(document_type.pk), "genel-mudurluk/yazi/{yil}"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            department.name = "Merkez"
+            department.save()
+        self.assertEqual(department_full_path(department.pk), "merkez")
+        self.assertEqual(document_type_full_path(document_type.pk), "merkez/yazi/{yil}")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            document_type.path = "yazisma"
+            document_type.save()
+        self.assertEqual(document_type_full_path(document_type.pk), "merkez/yazisma")
+
+
+class PathTemplateTests(TestCase):
+    def test_render(self):
+        template = compile_path_template("arsiv/{yil}/{ay}-{belge_no}")
+        self.assertIs(template, compile_path_template("arsiv/{yil}/{ay}-{belge_no}"))
+        self.assertEqual(template.placeholders, {"yil", "ay", "belge_no"})
+        self.assertEqual(
+            template.render({"yil": "2024", "ay": "3", "belge_no": "a-1"}),
+            "arsiv/2024/3-a-1",
+        )
+        # Unknown values are left in place rather than dropped.
+        self.assertEqual(template.render({"yil": "2024"}), "arsiv/2024/{ay}-{belge_no}")
+
+    def test_normalize_path(self):
+        self.assertEqual(normalize_path("İnsan Kaynakları"), "insan-kaynaklari")
+        self.assertEqual(normalize_path(" Çağrı  Merkezi- "), "cagri-merkezi")
+        self.assertEqual(normalize_path("İK"), "ik-birim")
+        self.assertEqual(normalize_path(""), "birim")
+        self.assertEqual(len(normalize_path("a" * 100)), 63)
+
+    def test_validate_path(self):
+        for value in ("yazi/{yil}/{ay}", "{belge_turu}/{belge_no}", "arsiv"):
+            validate_path(value)
+        for value, message in (
+            ("yazi/{hafta}", "Geçersiz değişken"),
+            ("ab", "en az 3"),
+            ("a" * 64, "en fazla 63"),
+            ("/yazi", "ile başlayamaz"),
+            ("yazi-", "ile bitemez"),
+            ("yazı", "sadece harf"),
+        ):
+            with self.assertRaisesMessage(ValidationError, message):
+                validate_path(value)
+
+    def test_upload_to(self):
+        user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=user, updated_by=user
+        )
+        document = Document(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Gelen Yazı",
+                path="{belge_turu}/{yil}/{ay}/{gun}/{saat}-{belge_no}",
+                created_by=user,
+                updated_by=user,
+            ),
+            date=datetime.date(2024, 3, 9),
+            time=datetime.time(14, 5),
+            document_no="Sayı 12",
+        )
+        self.assertEqual(
+            DocumentFile._meta.get_field("file").generate_filename(
+                DocumentFile(document=document), "tarama.pdf"
+            ),
+            "genel-mudurluk/gelen-yazi/2024/3/9/14-sayi-12/tarama.pdf",
+        )
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class SearchTests(TestCase):
+    def setUp(self):
+        if not search.is_supported():
+            self.skipTest("Full-text search needs PostgreSQL or SQLite.")
+        self.user = User.objects.create_superuser("admin", password="admin")
+        self.department = Department.objects.create(
+            name="Mali İşler", created_by=self.user, updated_by=self.user
+        )
+        self.document_type = DocumentType.objects.create(
+            department=self.department,
+            name="Rapor",
+            path="rapor/{yil}",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def create(self, title, document_no, description=""):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Document.objects.create(
+                department=self.department,
+                document_type=self.document_type,
+                title=title,
+                date=datetime.date(2024, 1, 2),
+                document_no=document_no,
+                description=description,
+                created_by=self.user,
+                updated_by=self.user,
+            )
+
+    def test_index_follows_documents_and_files(self):
+        document = self.create("Kira sözleşmesi", "2024/0153")
+        self.assertEqual(search.search_ids("SÖZLEŞME"), [document.pk])
+
+        document.title = "Kira bedeli"
+        with self.captureOnCommitCallbacks(execute=True):
+            document.save()
+        self.assertEqual(search.search_ids("sözleşme"), [])
+        self.assertEqual(search.search_ids("bedel"), [document.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DocumentFile.objects.create(
+                document=document,
+                file=ContentFile(b"%PDF", name="ek.pdf"),
+                content="Tahsilat makbuzu",
+                created_by=self.user,
+                updated_by=self.user,
+            )
+        self.assertEqual(search.search_ids("makbuz"), [document.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            document.delete()
+        self.assertEqual(search.search_ids("bedel"), [])
+        self.assertEqual(search.search_ids("makbuz"), [])
+
+    def test_ranking_and_document_no_substring(self):
+        other = self.create(
+            "Bütçe raporu",
+            "2024/0001",
+            "Yıllık faaliyet, personel, yatırım ve bütçe ayrıntıları",
+        )
+        best = self.create("Bütçe", "2024/0002", "Bütçe bütçe bütçe")
+        self.assertEqual(search.search_ids("bütçe"), [best.pk, other.pk])
+        self.assertEqual(search.search_ids("bütçe", limit=1), [best.pk])
+
+        # "4/000" is not a token prefix; only the substring match finds it.
+        self.assertEqual(search.search_ids("4/000"), [])
+        matches = search.search_documents(Document.objects.all(), "4/000")
+        self.assertEqual(list(matches), [best, other])
+
+    @override_settings(SEARCH_RESULT_LIMIT=1)
+    def test_admin_search(self):
+        self.create("Bütçe raporu", "2024/0001")
+        self.create("Bütçe", "2024/0002")
+        self.client.force_login(self.user)
+        url = reverse("admin:document_document_changelist")
+
+        response = self.client.get(url, {"q": "bütçe"})
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+        self.assertContains(response, "Yalnızca en iyi eşleşen 1 belge")
+
+        response = self.client.get(url, {"q": "4/0002"})
+        self.assertEqual(
+            [document.document_no for document in response.context["cl"].result_list],
+            ["2024/0002"],
+        )
+        self.assertNotContains(response, "Yalnızca en iyi eşleşen")
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class ExtractionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=self.user, updated_by=self.user
+        )
+        self.document = Document.objects.create(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=self.user,
+                updated_by=self.user,
+            ),
+            title="Yazı",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def add_file(self, name, data):
+        return DocumentFile.objects.create(
+            document=self.document,
+            file=ContentFile(data, name=name),
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def extract(self):
+        # Threads instead of forked workers, so they see the test database
+        # and the connection stays open.
+        output = io.StringIO()
+        with mock.patch.object(extract_text, "ProcessPoolExecutor", ThreadPoolExecutor):
+            call_command(
+                "extract_text", pending=True, workers=2, batch_size=1, stdout=output
+            )
+        return output.getvalue()
+
+    def test_pending_files_are_processed_once(self):
+        text = self.add_file("not.txt", "Kira bedeli ödendi".encode())
+        blank = self.add_file("bos.txt", b"")
+        unsupported = self.add_file("arsiv.bin", b"\x00\x01")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.extract().count("dosyanın metni çıkarıldı"), 3)
+        values = DocumentFile.objects.in_bulk()
+        self.assertEqual(values[text.pk].content, "Kira bedeli ödendi")
+        self.assertEqual(values[blank.pk].content, "")
+        self.assertIsNone(values[unsupported.pk].content)
+        self.assertFalse(
+            DocumentFile.objects.filter(extracted_at__isnull=True).exists()
+        )
+        if search.is_supported():
+            self.assertEqual(search.search_ids("kira"), [self.document.pk])
+
+        # Nothing is pending any more, including the files without text.
+        with mock.patch.object(extract_text, "extract_file") as extract_file:
+            self.assertEqual(self.extract(), "")
+        extract_file.assert_not_called()
+
+    def test_replaced_file_is_extracted_again(self):
+        document_file = self.add_file("not.txt", b"eski")
+        self.extract()
+        document_file.refresh_from_db()
+        self.assertIsNotNone(document_file.extracted_at)
+
+        document_file.file = ContentFile(b"yeni", name="not.txt")
+        document_file.save()
+        self.assertIsNone(document_file.extracted_at)
+        self.extract()
+        document_file.refresh_from_db()
+        self.assertEqual(document_file.content, "yeni")
+
+    def test_file_replaced_during_extraction_stays_pending(self):
+        document_file = self.add_file("not.txt", b"eski")
+
+        class ReplacingPool:
+            def map(self, function, names, aliases):
+                texts = list(map(function, names, aliases))
+                document_file.file = ContentFile(b"yeni", name="not.txt")
+                document_file.save()
+                return texts
+
+        extract_text.Command(stdout=io.StringIO()).process(
+            [document_file.pk], ReplacingPool()
+        )
+        document_file.refresh_from_db()
+        self.assertIsNone(document_file.extracted_at)
+        self.assertIsNone(document_file.content)
+
+    def test_forked_workers_open_their_own_connections(self):
+        connection.ensure_connection()
+        with ProcessPoolExecutor(
+            max_workers=1, initializer=db.discard_inherited_connections
+        ) as pool:
+            self.assertFalse(pool.submit(has_open_connection).result())
+        self.assertIsNotNone(connection.connection)
+
+
+@skipUnless(os.environ.get("TEST_REDIS_URL"), "TEST_REDIS_URL tanımlı değil.")
+class JobQueueTests(SimpleTestCase):
+    def setUp(self):
+        patcher = override_settings(
+            REDIS_URL=os.environ.get("TEST_REDIS_URL"), JOB_QUEUE_LEASE_SECONDS=60
+        )
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.name = f"test-{os.getpid()}"
+        self.addCleanup(self.flush)
+
+    def flush(self):
+        queue = JobQueue(self.name)
+        keys = list(queue.client.scan_iter(f"{queue.key}*"))
+        if keys:
+            queue.client.delete(*keys)
+
+    def consumer(self, name):
+        queue = JobQueue(self.name)
+        queue.processing_key = f"{queue.key}:processing:{name}"
+        return queue
+
+    def test_unacknowledged_jobs_are_recovered(self):
+        first, second = self.consumer("a"), self.consumer("b")
+        first.push(1, 2, 3)
+        self.assertEqual(first.pop(2), [1, 2])
+        self.assertEqual(second.pop(2), [3])
+        second.ack()
+
+        # The first consumer holds its lease: its jobs are not handed out.
+        self.assertEqual(second.pop(2, timeout=1), [])
+        self.assertEqual(len(second), 0)
+
+        # It dies without acknowledging; the jobs go back in order.
+        first.client.delete(f"{first.processing_key}:lease")
+        self.assertEqual(second.pop(2, timeout=1), [])
+        self.assertEqual(second.pop(5), [1, 2])
+        second.ack()
+        self.assertFalse(second.client.exists(second.processing_key))
+
+
+@override_settings(REDIS_URL=None, UPLOAD_CHUNK_MAX_SIZE=4)
+@temporary_storages()
+class UploadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=self.user, updated_by=self.user
+        )
+        self.document = Document.objects.create(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=self.user,
+                updated_by=self.user,
+            ),
+            title="Yazı",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        self.client.force_login(self.user)
+
+    def start(self, data, checksum=None):
+        response = self.client.post(
+            "/api/uploads/",
+            {
+                "document": self.document.pk,
+                "filename": "tarama.pdf",
+                "size": len(data),
+                "checksum": checksum or hashlib.sha256(data).hexdigest(),
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def put(self, session_id, offset, data):
+        return self.client.put(
+            f"/api/uploads/{session_id}/chunk/",
+            data,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def stored_names(self):
+        storage = storages["default"]
+        return sorted(
+            str(path.relative_to(storage.location))
+            for path in Path(storage.location).rglob("*")
+            if path.is_file()
+        )
+
+    def test_chunks_are_limited_ordered_and_completed(self):
+        session_id = self.start(b"abcdef")
+        # Parts are capped at UPLOAD_CHUNK_MAX_SIZE and at the declared size.
+        self.assertEqual(self.put(session_id, 0, b"abcdefgh").json(), {"offset": 4})
+        response = self.put(session_id, 0, b"abcd")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"offset": 4})
+        response = self.client.post(f"/api/uploads/{session_id}/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.put(session_id, 4, b"efgh").json(), {"offset": 6})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/uploads/{session_id}/complete/")
+        self.assertEqual(response.status_code, 201)
+        document_file = DocumentFile.objects.get()
+        self.assertEqual(document_file.storage, "default")
+        self.assertEqual(document_file.size, 6)
+        with document_file.file.open("rb") as file:
+            self.assertEqual(file.read(), b"abcdef")
+        self.assertEqual(self.stored_names(), [document_file.file.name])
+
+        # A request that lost the race finds the session already gone.
+        with self.assertRaises(uploads.AlreadyCompleted):
+            uploads.complete(session_id, self.user)
+        response = self.client.post(f"/api/uploads/{session_id}/complete/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_checksum_mismatch_discards_the_upload(self):
+        session_id = self.start(b"abc", checksum="0" * 64)
+        self.put(session_id, 0, b"abc")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/uploads/{session_id}/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DocumentFile.objects.exists())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.stored_names(), [])
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class DeduplicatedStorageTests(TestCase):
+    def setUp(self):
+        self.storage = storages["deduplicated"]
+
+    def blobs(self):
+        inner = Path(self.storage.inner.location)
+        return sorted(path.name for path in inner.rglob("*") if path.is_file())
+
+    def test_identical_content_is_stored_once(self):
+        same = hashlib.sha256(b"ayni").hexdigest()
+        other = hashlib.sha256(b"farkli").hexdigest()
+        self.storage.save("a/bir.pdf", ContentFile(b"ayni"))
+        self.storage.save("b/iki.pdf", ContentFile(b"ayni"))
+        self.storage.save("c/uc.pdf", ContentFile(b"farkli"))
+        self.assertEqual(self.blobs(), sorted([same, other]))
+        self.assertEqual(
+            dict(Blob.objects.values_list("digest", "refcount")), {same: 2, other: 1}
+        )
+
+        self.storage.link("a/bir.pdf", "d/dort.pdf")
+        self.assertEqual(Blob.objects.get(pk=same).refcount, 3)
+        with self.storage.open("d/dort.pdf") as file:
+            self.assertEqual(file.read(), b"ayni")
+        self.assertEqual(self.storage.size("d/dort.pdf"), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete("a/bir.pdf")
+            self.storage.delete("b/iki.pdf")
+        self.assertFalse(self.storage.exists("a/bir.pdf"))
+        self.assertEqual(Blob.objects.get(pk=same).refcount, 1)
+        self.assertIn(same, self.blobs())
+
+        # The last reference takes the blob with it.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete("d/dort.pdf")
+            self.storage.delete("d/dort.pdf")
+        self.assertFalse(Blob.objects.filter(pk=same).exists())
+        self.assertEqual(self.blobs(), [other])
+
+    def test_document_files_share_blobs(self):
+        user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=user, updated_by=user
+        )
+        document = Document.objects.create(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=user,
+                updated_by=user,
+            ),
+            title="Yazı",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=user,
+            updated_by=user,
+        )
+        files = [
+            DocumentFile.objects.create(
+                document=document,
+                storage="deduplicated",
+                file=ContentFile(b"tarama", name=f"tarama-{index}.pdf"),
+                created_by=user,
+                updated_by=user,
+            )
+            for index in range(2)
+        ]
+        self.assertEqual(BlobReference.objects.count(), 2)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            files[0].delete()
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            files[1].delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertEqual(self.blobs(), [])
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class DownloadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=self.user, updated_by=self.user
+        )
+        self.document = Document.objects.create(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=self.user,
+                updated_by=self.user,
+            ),
+            title="Yazı",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        self.document_file = self.add_file("default")
+        self.url = reverse("documentfile-download", args=[self.document_file.pk])
+
+    def add_file(self, storage):
+        return DocumentFile.objects.create(
+            document=self.document,
+            storage=storage,
+            file=ContentFile(b"0123456789", name="tarama.pdf"),
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def test_requires_permission(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        clerk = User.objects.create_user("memur", password="memur")
+        self.client.force_login(clerk)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_full_and_inline_download(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="tarama.pdf"'
+        )
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        response = self.client.get(self.url, {"inline": 1})
+        self.assertEqual(
+            response["Content-Disposition"], 'inline; filename="tarama.pdf"'
+        )
+
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_ranges(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"234")
+        self.assertEqual(response["Content-Range"], "bytes 2-4/10")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        # A stale If-Range sends the whole file.
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=2-4", HTTP_IF_RANGE='"eski"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    @override_settings(DOWNLOAD_OFFLOAD="x-accel-redirect")
+    def test_offloaded_deduplicated_file(self):
+        document_file = self.add_file("deduplicated")
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("documentfile-download", args=[document_file.pk])
+        )
+        digest = hashlib.sha256(b"0123456789").hexdigest()
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"/protected/blobs/{digest[:2]}/{digest[2:4]}/{digest}",
+        )
+        self.assertEqual(response.content, b"")
+        self.assertIn("tarama", response["Content-Disposition"])
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+        cls.root = Department.objects.create(
+            name="Genel Müdürlük", created_by=cls.user, updated_by=cls.user
+        )
+        cls.child = Department.objects.create(
+            name="Arşiv", parent=cls.root, created_by=cls.user, updated_by=cls.user
+        )
+        cls.document_type = DocumentType.objects.create(
+            department=cls.root,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=cls.user,
+            updated_by=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_documents(self, department, count):
+        for _ in range(count):
+            document = Document.objects.create(
+                department=department,
+                document_type=self.document_type,
+                title="Yazı",
+                date=datetime.date(2024, 1, 1),
+                document_no=f"2024/{Document.objects.count():04d}",
+                created_by=self.user,
+                updated_by=self.user,
+            )
+            DocumentFile.objects.create(
+                document=document,
+                file=ContentFile(b"metin", name="yazi.txt"),
+                content="metin",
+                created_by=self.user,
+                updated_by=self.user,
+            )
+        return document
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_requires_view_permission(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/documents/").status_code, 403)
+        clerk = User.objects.create_user("memur", password="memur")
+        self.client.force_login(clerk)
+        self.assertEqual(self.client.get("/api/documents/").status_code, 403)
+        clerk.user_permissions.add(
+            Permission.objects.get(codename="view_document"),
+        )
+        self.client.force_login(User.objects.get(pk=clerk.pk))
+        self.assertEqual(self.client.get("/api/documents/").status_code, 200)
+
+    def test_sparse_fields_and_filters(self):
+        self.add_documents(self.root, 1)
+        document = self.add_documents(self.child, 1)
+
+        rows = self.get("/api/documents/", fields="id,document_no")["results"]
+        self.assertEqual(
+            rows,
+            [
+                {"id": pk, "document_no": document_no}
+                for pk, document_no in Document.objects.order_by(
+                    "-date", "-id"
+                ).values_list("pk", "document_no")
+            ],
+        )
+        rows = self.get("/api/documents/", document_no=document.document_no)
+        self.assertEqual([row["id"] for row in rows["results"]], [document.pk])
+        rows = self.get("/api/documents/", department=self.root.pk)["results"]
+        self.assertEqual(len(rows), 1)
+        rows = self.get("/api/documents/", department=self.root.pk, subtree=1)
+        self.assertEqual(len(rows["results"]), 2)
+
+        # File bodies are left out of lists and nested files.
+        row = self.get(f"/api/documents/{document.pk}/")
+        self.assertNotIn("content", row["files"][0])
+        rows = self.get("/api/files/", document=document.pk)["results"]
+        self.assertNotIn("content", rows[0])
+        row = self.get(f"/api/files/{rows[0]['id']}/")
+        self.assertEqual(row["content"], "metin")
+
+    def test_detail_cache_and_conditional_get(self):
+        document = self.add_documents(self.child, 1)
+        url = f"/api/documents/{document.pk}/"
+        with CaptureQueriesContext(connection) as miss:
+            response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        with CaptureQueriesContext(connection) as hit:
+            cached = self.client.get(url, {"fields": "id,title"})
+        self.assertEqual(cached.json(), {"id": document.pk, "title": "Yazı"})
+        self.assertEqual(cached["ETag"], etag)
+        self.assertLess(len(hit), len(miss))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # Saving the document, or anything it embeds, changes the ETag.
+        document.title = "Yeni başlık"
+        document.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Yeni başlık")
+        etag = response["ETag"]
+        self.child.name = "Arşiv Birimi"
+        self.child.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["department_path"], self.child.full_path)
+
+    def test_cached_detail_is_checked_like_a_fresh_one(self):
+        document = self.add_documents(self.child, 1)
+        url = f"/api/documents/{document.pk}/"
+        etag = self.client.get(url)["ETag"]
+
+        # Filters of the request still apply to a cached document.
+        response = self.client.get(url, {"department": self.root.pk})
+        self.assertEqual(response.status_code, 404)
+        with mock.patch.object(
+            ModelViewPermissions, "has_object_permission", return_value=False
+        ):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 403)
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        self.add_documents(self.child, 2)
+        with CaptureQueriesContext(connection) as small:
+            self.get("/api/documents/")
+        self.add_documents(self.root, 10)
+        with self.assertNumQueries(len(small)):
+            rows = self.get("/api/documents/")["results"]
+        self.assertEqual(len(rows), 12)
+
+
+class QueryPlanTests(TestCase):
+    # Guards the indexes added for the admin filter, changelist ordering and
+    # lookup paths: none of these queries may fall back to a table scan.
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan", plan)
+        else:
+            for line in plan.splitlines():
+                if "document_document" in line or "document_documentfile" in line:
+                    self.assertIn("SEARCH", line)
+
+    def test_department_and_type_filter(self):
+        self.assertUsesIndex(
+            Document.objects.filter(
+                department_id__in=[1, 2, 3], document_type_id=4
+            ).order_by("-date", "-id")[:100]
+        )
+
+    def test_department_filter(self):
+        self.assertUsesIndex(
+            Document.objects.filter(department_id__in=[1, 2, 3]).order_by(
+                "-date", "-id"
+            )[:100]
+        )
+
+    def test_subtree_filter(self):
+        department = Department(tree_id=1, lft=2, rght=9)
+        self.assertUsesIndex(
+            Document.objects.in_subtree(department).order_by("-date", "-id")[:100]
+        )
+
+    def test_changelist_cursor(self):
+        self.assertUsesIndex(
+            Document.objects.filter(
+                keyset_before(datetime.date(2024, 1, 1), 100)
+            ).order_by("-date", "-id")[:100]
+        )
+
+    def test_document_no_lookup(self):
+        self.assertUsesIndex(Document.objects.filter(document_no="2024-001"))
+
+    def test_document_no_infix_search(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("Trigram indexes are PostgreSQL only.")
+        self.assertUsesIndex(Document.objects.filter(document_no__icontains="001"))
+
+    def test_pending_extraction(self):
+        self.assertUsesIndex(
+            DocumentFile.objects.filter(extracted_at__isnull=True, pk__gt=100)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+
+class StatisticsRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+
+    def department(self, name, parent=None):
+        return Department.objects.create(
+            name=name, parent=parent, created_by=self.user, updated_by=self.user
+        )
+
+    def document(self, department, document_no, date, sizes=()):
+        document = Document.objects.create(
+            department=department,
+            document_type=self.document_type,
+            title=document_no,
+            date=date,
+            document_no=document_no,
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        for index, size in enumerate(sizes):
+            DocumentFile.objects.create(
+                document=document,
+                file=f"belgeler/{document_no}-{index}.pdf",
+                size=size,
+                created_by=self.user,
+                updated_by=self.user,
+            )
+        return document
+
+    def assertRollupFresh(self):
+        def rows():
+            return sorted(
+                DepartmentStatistics.objects.values_list(
+                    "department_id", "bucket", *statistics.COUNTERS
+                )
+            )
+
+        incremental = rows()
+        statistics.rebuild()
+        self.assertEqual(incremental, rows())
+
+    def test_incremental_matches_rebuild(self):
+        root = self.department("Genel Müdürlük")
+        hr = self.department("İnsan Kaynakları", root)
+        payroll = self.department("Bordro", hr)
+        archive = self.department("Arşiv")
+        self.document_type = DocumentType.objects.create(
+            department=root,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        first = self.document(payroll, "1", datetime.date(2024, 1, 5), [10, 20])
+        self.document(hr, "2", datetime.date(2024, 2, 1), [5])
+        self.assertEqual(
+            statistics.subtree_totals(root.pk),
+            {"document_count": 2, "file_count": 3, "total_bytes": 35},
+        )
+        self.assertRollupFresh()
+
+        first.department = archive
+        first.date = datetime.date(2023, 5, 1)
+        first.save()
+        self.assertRollupFresh()
+
+        payroll.refresh_from_db()
+        payroll.move_to(archive)
+        self.assertRollupFresh()
+
+        first.files.first().delete()
+        self.assertRollupFresh()
+
+        Department.objects.get(pk=hr.pk).delete()
+        self.assertRollupFresh()
+        self.assertEqual(
+            statistics.subtree_breakdown(archive.pk)["months"],
+            {"2023-05": {"document_count": 1, "file_count": 1, "total_bytes": 20}},
+        )
+
+    def test_unchanged_and_missing_files(self):
+        department = self.department("Genel Müdürlük")
+        self.document_type = DocumentType.objects.create(
+            department=department,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        first = self.document(department, "1", datetime.date(2024, 1, 5), [10])
+        second = self.document(department, "2", datetime.date(2024, 1, 5))
+
+        # A file missing from the storage is counted without a size.
+        missing = DocumentFile.objects.create(
+            document=first,
+            file="belgeler/yok.pdf",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        self.assertIsNone(missing.size)
+        self.assertRollupFresh()
+
+        document_file = first.files.get(size=10)
+        with self.assertNumQueries(1):
+            document_file.content = "metin"
+            document_file.save(update_fields=["content"])
+        # Moving a file between documents counted in the same buckets leaves
+        # the statistics alone.
+        document_file.document = second
+        with CaptureQueriesContext(connection) as context:
+            document_file.save()
+        self.assertFalse(
+            [q for q in context if "document_departmentstatistics" in q["sql"]]
+        )
+        self.assertRollupFresh()
+
+
+class SubtreeFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+
+    def department(self, name, parent=None):
+        return Department.objects.create(
+            name=name, parent=parent, created_by=self.user, updated_by=self.user
+        )
+
+    def test_in_subtree(self):
+        root = self.department("Genel Müdürlük")
+        hr = self.department("İnsan Kaynakları", root)
+        payroll = self.department("Bordro", hr)
+        it = self.department("Bilgi İşlem", root)
+        for department in (root, hr, payroll, it):
+            document_type = DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=self.user,
+                updated_by=self.user,
+            )
+            Document.objects.create(
+                department=department,
+                document_type=document_type,
+                title=department.name,
+                date=datetime.date(2024, 1, 1),
+                document_no="1",
+                created_by=self.user,
+                updated_by=self.user,
+            )
+        hr.refresh_from_db()
+
+        titles = {"İnsan Kaynakları", "Bordro"}
+        self.assertEqual(
+            set(Document.objects.in_subtree(hr).values_list("title", flat=True)),
+            titles,
+        )
+        self.assertEqual(DocumentType.objects.in_subtree(hr.pk).count(), 2)
+
+        self.client.force_login(self.user)
+        response = self.client.get(
+            "/admin/document/document/", {"department__id__inhierarchy": hr.pk}
+        )
+        self.assertEqual(
+            {document.title for document in response.context["cl"].result_list},
+            titles,
+        )
+        response = self.client.get(
+            "/api/documents/",
+            {"department": hr.pk, "subtree": 1, "fields": "title"},
+        )
+        self.assertEqual({row["title"] for row in response.json()["results"]}, titles)
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+        cls.root = Department.objects.create(
+            name="Genel Müdürlük", created_by=cls.user, updated_by=cls.user
+        )
+        cls.archive = Department.objects.create(
+            name="Arşiv", parent=cls.root, created_by=cls.user, updated_by=cls.user
+        )
+        document_type = DocumentType.objects.create(
+            department=cls.root,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=cls.user,
+            updated_by=cls.user,
+        )
+        for day in range(1, 4):
+            Document.objects.create(
+                department=cls.root,
+                document_type=document_type,
+                title=f"Belge {day}",
+                date=datetime.date(2024, day, 1),
+                document_no=str(day),
+                created_by=cls.user,
+                updated_by=cls.user,
+            )
+
+    def setUp(self):
+        path_cache.clear()
+        self.client.force_login(self.user)
+        # Stored files outlive the test transaction, so each test saves its own.
+        for day, document in enumerate(Document.objects.order_by("date"), start=1):
+            document_file = DocumentFile(
+                document=document, created_by=self.user, updated_by=self.user
+            )
+            document_file.file.save(f"{day}.txt", ContentFile(b"x" * day))
+
+    def run_action(self, action, **data):
+        url = "/admin/document/document/"
+        selected = list(Document.objects.values_list("pk", flat=True))
+        data = {"action": action, "_selected_action": selected, **data}
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {**data, "apply": "yes"})
+        self.assertEqual(response.status_code, 302)
+
+    def assertRollupFresh(self):
+        def rows():
+            return sorted(
+                DepartmentStatistics.objects.values_list(
+                    "department_id", "bucket", *statistics.COUNTERS
+                )
+            )
+
+        incremental = rows()
+        statistics.rebuild()
+        self.assertEqual(incremental, rows())
+
+    def test_move_and_reassign(self):
+        self.run_action("move_documents", department=self.archive.pk)
+        self.assertEqual(Document.objects.in_subtree(self.archive).count(), 3)
+        self.assertEqual(
+            statistics.subtree_totals(self.archive.pk),
+            {"document_count": 3, "file_count": 3, "total_bytes": 6},
+        )
+        self.assertRollupFresh()
+
+        owner = User.objects.create_user("sahip")
+        self.run_action("reassign_owner", owner=owner.pk)
+        self.assertEqual(DocumentFile.objects.filter(created_by=owner).count(), 3)
+
+    def test_move_to_another_type_relocates_files(self):
+        document_type = DocumentType.objects.create(
+            department=self.archive,
+            name="Karar",
+            path="karar/{yil}",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        with mock.patch.object(relocation_queue, "push") as push:
+            self.run_action("move_documents", document_type=document_type.pk)
+        push.assert_called_once()
+        kind, ids = push.call_args.args[0]
+        self.assertEqual(kind, "documents")
+        self.assertCountEqual(ids, Document.objects.values_list("pk", flat=True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("relocate_files", "--all", stdout=io.StringIO())
+        for document_file in DocumentFile.objects.order_by("document__date"):
+            self.assertEqual(
+                os.path.dirname(document_file.file.name),
+                "genel-mudurluk/arsiv/karar/2024",
+            )
+            self.assertEqual(len(document_file.file.read()), document_file.size)
+
+    def test_delete_with_files(self):
+        storage = DocumentFile.objects.first().file.storage
+        names = list(DocumentFile.objects.values_list("file", flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            self.run_action("delete_documents")
+        deletes = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('DELETE FROM "document_documentfile"')
+        ]
+        self.assertEqual(len(deletes), 1)
+        self.assertFalse(Document.objects.exists())
+        self.assertFalse(DocumentFile.objects.exists())
+        self.assertFalse(any(storage.exists(name) for name in names))
+        self.assertFalse(DepartmentStatistics.objects.exists())
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class RelocationTests(TestCase):
+    def setUp(self):
+        path_cache.clear()
+
+    def test_follows_department_and_type_paths(self):
+        user = User.objects.create_superuser("admin", password="admin")
+        root = Department.objects.create(
+            name="Genel Müdürlük", created_by=user, updated_by=user
+        )
+        hr = Department.objects.create(
+            name="Personel", parent=root, created_by=user, updated_by=user
+        )
+        document_type = DocumentType.objects.create(
+            department=hr,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=user,
+            updated_by=user,
+        )
+        document = Document.objects.create(
+            department=hr,
+            document_type=document_type,
+            title="Belge",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=user,
+            updated_by=user,
+        )
+        document_file = DocumentFile(
+            document=document, created_by=user, updated_by=user
+        )
+        document_file.file.save("belge.txt", ContentFile(b"belge"))
+        storage = document_file.file.storage
+        self.assertEqual(
+            document_file.file.name, "genel-mudurluk/personel/yazi/2024/belge.txt"
+        )
+
+        root.name = "Merkez"
+        root.save()
+        document_type.refresh_from_db()
+        document_type.path = "yazilar/{yil}/{ay}"
+        document_type.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("relocate_files", "--all", stdout=io.StringIO())
+
+        document_file.refresh_from_db()
+        self.assertEqual(
+            document_file.file.name, "merkez/personel/yazilar/2024/1/belge.txt"
+        )
+        self.assertEqual(document_file.file.read(), b"belge")
+        self.assertFalse(storage.exists("genel-mudurluk/personel/yazi/2024/belge.txt"))
+
+    def test_copies_s3_objects_with_a_managed_copy(self):
+        storage = mock.Mock(bucket_name="media")
+        storage.exists.return_value = False
+        storage._normalize_name.side_effect = lambda name: f"media/{name}"
+        storage.get_object_parameters.return_value = {"ACL": "private"}
+        target = copy_file(storage, "eski/belge.pdf", "yeni/belge.pdf")
+        self.assertEqual(target, "yeni/belge.pdf")
+        storage.bucket.copy.assert_called_once_with(
+            {"Bucket": "media", "Key": "media/eski/belge.pdf"},
+            "media/yeni/belge.pdf",
+            ExtraArgs={"ACL": "private"},
+            Config=storage.transfer_config,
+        )
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.values.clear()
+
+    def test_exports_request_query_and_storage_metrics(self):
+        user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=user, updated_by=user
+        )
+        document = Document.objects.create(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=user,
+                updated_by=user,
+            ),
+            title="Belge",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=user,
+            updated_by=user,
+        )
+        document_file = DocumentFile(
+            document=document, created_by=user, updated_by=user
+        )
+        document_file.file.save("belge.txt", ContentFile(b"x" * 1000))
+        self.client.force_login(user)
+        response = self.client.get(
+            f"/api/files/{document_file.pk}/download/", HTTP_RANGE="bytes=0-99"
+        )
+        self.assertEqual(b"".join(response.streaming_content), b"x" * 100)
+
+        with self.settings(METRICS_ALLOWED_IPS=["127.0.0.1"]):
+            exported = self.client.get("/metrics").content.decode()
+        labels = 'view="documentfile-download",method="GET"'
+        self.assertIn(f'netbelge_requests_total{{{labels},status="2xx"}} 1.0', exported)
+        self.assertIn(
+            f'netbelge_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1.0',
+            exported,
+        )
+        self.assertRegex(exported, rf"netbelge_db_queries_total{{{labels}}} [1-9]")
+        self.assertIn('operation="write",storage="default"', exported)
+        self.assertIn('operation="read",storage="default"', exported)
+
+    def test_scraping_requires_an_allowed_address_or_the_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=["10.0.0.1"]):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            response = self.client.get("/metrics", REMOTE_ADDR="10.0.0.1")
+            self.assertEqual(response.status_code, 200)
+        with self.settings(METRICS_TOKEN="gizli"):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer yanlis")
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer gizli")
+            self.assertEqual(response.status_code, 200)
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class BenchmarkTests(TestCase):
+    def test_generates_archive_and_runs_scenarios(self):
+        generated = benchmark.generate(
+            depth=3, fanout=2, document_types=10, documents=200, files=2, seed=7
+        )
+        self.assertEqual(generated["departments"], benchmark.department_count(3, 2))
+        self.assertEqual(generated["documents"], 200)
+        self.assertGreaterEqual(generated["files"], 200)
+
+        # The nested sets built in bulk are the ones mptt would maintain.
+        for department in Department.objects.all():
+            self.assertEqual(
+                sorted(department.get_descendants().values_list("pk", flat=True)),
+                sorted(
+                    Department.objects.filter(
+                        full_path__startswith=f"{department.full_path}/"
+                    ).values_list("pk", flat=True)
+                ),
+            )
+        root = Department.objects.get(level=0, tree_id=1)
+        self.assertEqual(
+            Document.objects.in_subtree(root).count(),
+            Document.objects.filter(
+                department__full_path__startswith="kurum-01"
+            ).count(),
+        )
+
+        runner = benchmark.Runner(repeat=1, ingest=5)
+        report = {"results": runner.run(benchmark.SCENARIOS)}
+        self.assertEqual(list(report["results"]), list(benchmark.SCENARIOS))
+        self.assertEqual(report["results"]["upload_path_warm"]["queries"], 0)
+        self.assertEqual(Document.objects.count(), 200)
+
+        slower = {"results": {"search": {"median": 2.0}}}
+        self.assertEqual(
+            benchmark.compare({"results": {"search": {"median": 1.0}}}, slower),
+            [("search", 1.0, 2.0, 100.0)],
+        )
+
+    def test_command_stores_files_in_a_temporary_directory(self):
+        locations = []
+
+        def run(command, parameters, options):
+            storage = storages[settings.DOCUMENT_FILE_STORAGE]
+            locations.append(Path(storage.location))
+            storage.save("deneme.txt", ContentFile(b"deneme"))
+            return {"results": {}}
+
+        with mock.patch.dict(connection.settings_dict["TEST"]), mock.patch.object(
+            connection.creation, "create_test_db"
+        ), mock.patch.object(connection.creation, "destroy_test_db"), mock.patch(
+            "document.management.commands.benchmark.Command.run", run
+        ):
+            call_command("benchmark", stdout=io.StringIO())
+        self.assertNotEqual(locations[0], settings.BASE_DIR / "media")
+        self.assertFalse(locations[0].exists())
+
+
+# Not a TestCase: its transaction would pin every read to the primary.
+@override_settings(DATABASE_REPLICAS=["mirror"])
+class ReplicaRoutingTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A second connection to the test database, the way replicas are
+        # configured for tests (TEST["MIRROR"]), so each query shows where it
+        # ran. Added here because the test runner only sets up the aliases in
+        # DATABASES.
+        connections.settings["mirror"] = connections.settings["default"]
+        cls.databases = {*cls.databases, "mirror"}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["mirror"].close()
+        del connections["mirror"]
+        del connections.settings["mirror"]
+        del cls.databases
+        super().tearDownClass()
+
+    def setUp(self):
+        self.writes = 0
+        patcher = mock.patch.object(db, "replica_lag", return_value=0.0)
+        self.replica_lag = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, method="get", write=False, **cookies):
+        # Runs a view through the middleware and returns the databases its
+        # queries ran on: a read, and with ``write`` an insert and another
+        # read. The view also asks the router for the write database before
+        # any write, which must not pin the request.
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(context["connection"].alias)
+            return execute(sql, params, many, context)
+
+        def view(request):
+            router.db_for_write(Document)
+            Document.objects.exists()
+            if write:
+                self.writes += 1
+                User.objects.create(username=f"user{self.writes}")
+                Document.objects.exists()
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)("/")
+        request.COOKIES.update(cookies)
+        with connections["default"].execute_wrapper(record), connections[
+            "mirror"
+        ].execute_wrapper(record):
+            response = db.PrimaryReplicaMiddleware(view)(request)
+        return queries, response
+
+    def test_routes_reads_and_sticks_to_primary_after_writes(self):
+        self.assertEqual(router.db_for_read(Document), "default")
+        self.assertEqual(router.db_for_write(Document), "default")
+
+        queries, response = self.request()
+        self.assertEqual(queries, ["mirror"])
+        self.assertNotIn(db.STICKY_COOKIE, response.cookies)
+
+        queries, response = self.request(write=True)
+        self.assertEqual(queries, ["mirror", "default", "default"])
+        cookie = response.cookies[db.STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], 5)
+
+        queries, _ = self.request(**{db.STICKY_COOKIE: cookie.value})
+        self.assertEqual(queries, ["default"])
+        queries, _ = self.request(method="post")
+        self.assertEqual(queries, ["default"])
+
+        with transaction.atomic():
+            queries, response = self.request()
+        self.assertEqual(queries, ["default"])
+        self.assertNotIn(db.STICKY_COOKIE, response.cookies)
+
+        # A lagging replica is skipped, and the client stays on the primary
+        # for as long as the remaining replicas lag.
+        self.replica_lag.return_value = 60.0
+        queries, _ = self.request()
+        self.assertEqual(queries, ["default"])
+        self.replica_lag.return_value = 12.5
+        _, response = self.request(write=True)
+        self.assertEqual(response.cookies[db.STICKY_COOKIE]["max-age"], 13)
+
+
+class AsyncDocumentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=cls.user, updated_by=cls.user
+        )
+        document_type = DocumentType.objects.create(
+            department=department,
+            name="Yazı",
+            path="yazi/{yil}",
+            created_by=cls.user,
+            updated_by=cls.user,
+        )
+        for day in range(1, 6):
+            Document.objects.create(
+                department=department,
+                document_type=document_type,
+                title=f"Belge {day}",
+                date=datetime.date(2024, 1, day),
+                document_no=str(day),
+                created_by=cls.user,
+                updated_by=cls.user,
+            )
+
+    async def test_pages_by_date_cursor(self):
+        await self.async_client.aforce_login(self.user)
+        url = "/api/async/documents/?page_size=2&fields=id,date"
+        dates = []
+        while url:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            dates += [row["date"] for row in response.json()["results"]]
+            url = response.json()["next"]
+        self.assertEqual(dates, [f"2024-01-0{day}" for day in range(5, 0, -1)])
+
+    async def test_requires_view_permission(self):
+        response = await self.async_client.get("/api/async/documents/")
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(REDIS_URL=None)
+@temporary_storages()
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+        department = Department.objects.create(
+            name="Genel Müdürlük", created_by=cls.user, updated_by=cls.user
+        )
+        document = Document.objects.create(
+            department=department,
+            document_type=DocumentType.objects.create(
+                department=department,
+                name="Yazı",
+                path="yazi/{yil}",
+                created_by=cls.user,
+                updated_by=cls.user,
+            ),
+            title="Tarama",
+            date=datetime.date(2024, 1, 1),
+            document_no="1",
+            created_by=cls.user,
+            updated_by=cls.user,
+        )
+        image = io.BytesIO()
+        Image.new("RGB", (2000, 1000), "white").save(image, "PNG")
+        cls.document_file = DocumentFile(
+            document=document, created_by=cls.user, updated_by=cls.user
+        )
+        cls.document_file.file.save("tarama.png", ContentFile(image.getvalue()))
+
+    def test_renders_caches_and_evicts(self):
+        self.client.force_login(self.user)
+        url = f"/api/files/{self.document_file.pk}/thumbnail/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (256, 128))
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        response = self.client.get(url, {"kind": "preview"})
+        response.close()
+        names = list(Thumbnail.objects.values_list("name", flat=True))
+        self.assertEqual(len(names), 2)
+
+        with override_settings(THUMBNAIL_CACHE_MAX_BYTES=1):
+            with self.captureOnCommitCallbacks(execute=True):
+                thumbnails.evict()
+        self.assertEqual(Thumbnail.objects.count(), 0)
+        storage = self.document_file.file.storage
+        self.assertFalse(any(storage.exists(name) for name in names))
+
+    def test_admin_never_renders_previews(self):
+        self.client.force_login(self.user)
+        self.add_file("not.txt", b"metin")
+        url = f"/admin/document/document/{self.document_file.document_id}/change/"
+        with mock.patch.object(thumbnails, "render") as render:
+            response = self.client.get(url)
+        render.assert_not_called()
+        self.assertContains(response, "Önizlemeyi oluştur")
+        self.assertContains(response, "Önizleme yok")
+        self.assertFalse(Thumbnail.objects.exists())
+
+        with mock.patch.object(
+            type(thumbnail_queue), "enabled", new_callable=mock.PropertyMock
+        ) as enabled, mock.patch.object(thumbnail_queue, "push") as push:
+            enabled.return_value = True
+            response = self.client.get(url)
+        self.assertContains(response, "Önizleme hazırlanıyor")
+        push.assert_called_once_with([self.document_file.pk, "thumbnail"])
+
+        thumbnails.generate(self.document_file, "thumbnail")
+        response = self.client.get(url)
+        self.assertContains(response, '<img src="/api/files/')
+
+    def add_file(self, name, data):
+        return DocumentFile.objects.create(
+            document=self.document_file.document,
+            file=ContentFile(data, name=name),
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def test_unrenderable_files_are_not_retried(self):
+        self.client.force_login(self.user)
+        text = self.add_file("not.txt", b"metin")
+        response = self.client.get(f"/api/files/{text.pk}/thumbnail/")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Thumbnail.objects.exists())
+
+        broken = self.add_file("bozuk.png", b"png degil")
+        url = f"/api/files/{broken.pk}/thumbnail/"
+        with mock.patch.object(
+            thumbnails, "render", wraps=thumbnails.render
+        ) as render, self.assertLogs("document.thumbnails", "ERROR"):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(render.call_count, 1)
+        failure = Thumbnail.objects.get(document_file=broken)
+        self.assertTrue(failure.failed)
+        self.assertEqual(failure.name, "")
+
+        # Tried again once the failure has expired.
+        with override_settings(THUMBNAIL_FAILURE_TIMEOUT=0), mock.patch.object(
+            thumbnails, "render", return_value=None
+        ) as render:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        render.assert_called_once()
+
+        # Queued requests wait for a worker instead.
+        with mock.patch.object(
+            type(thumbnail_queue), "enabled", new_callable=mock.PropertyMock
+        ) as enabled, mock.patch.object(thumbnail_queue, "push") as push:
+            enabled.return_value = True
+            other = self.add_file("tarama.jpg", b"")
+            response = self.client.get(f"/api/files/{other.pk}/thumbnail/")
+        self.assertEqual(response.status_code, 202)
+        push.assert_called_once_with([other.pk, "thumbnail"])
@@ -0,0 +1,176 @@
+import datetime
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db.models import Sum
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .jobs import thumbnail_queue
+from .models import Thumbnail
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp")
+EVICTION_BATCH_SIZE = 500
+
+
+class Unavailable(Exception):
+    # The file has no first page that can be rendered.
+    pass
+
+
+def renderable(name):
+    extension = os.path.splitext(name)[1].lower()
+    return extension == ".pdf" or extension in IMAGE_EXTENSIONS
+
+
+def thumbnail_name(name, kind):
+    directory, filename = os.path.split(name)
+    return f"{directory}/.thumbnails/{filename}.{kind}.jpg"
+
+
+def first_page(file, extension):
+    if extension == ".pdf":
+        # Scanned PDFs carry each page as an embedded image; pillow cannot
+        # rasterize vector pages, so those get no thumbnail.
+        from pypdf import PdfReader
+
+        images = PdfReader(file).pages[0].images
+        return Image.open(io.BytesIO(images[0].data)) if images else None
+    if extension in IMAGE_EXTENSIONS:
+        return Image.open(file)
+    return None
+
+
+def render(name, storage_alias, kind):
+    # Runs in worker processes: returns JPEG bytes, or None when the file has
+    # no renderable first page.
+    extension = os.path.splitext(name)[1].lower()
+    edge = settings.THUMBNAIL_SIZES[kind]
+    try:
+        with storages[storage_alias].open(name, "rb") as file:
+            image = first_page(file, extension)
+            if image is None:
+                return None
+            with image:
+                # JPEG scans are decoded at a reduced scale straight away.
+                image.draft("RGB", (edge, edge))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((edge, edge))
+                output = io.BytesIO()
+                image.convert("RGB").save(output, "JPEG", quality=80, optimize=True)
+                return output.getvalue()
+    except ImportError as exc:
+        logger.warning("No renderer library for %s: %s", name, exc)
+    except Exception:
+        logger.exception("Thumbnail rendering failed for %s", name)
+    return None
+
+
+def lookup(document_file, kind):
+    thumbnail = next(
+        (
+            thumbnail
+            for thumbnail in document_file.thumbnails.all()
+            if thumbnail.kind == kind
+        ),
+        None,
+    )
+    if thumbnail is None or thumbnail.source != document_file.file.name:
+        return None
+    # Failures are retried once THUMBNAIL_FAILURE_TIMEOUT has passed, in case
+    # the storage or a renderer library was only missing for a while.
+    retry = timezone.now() - datetime.timedelta(
+        seconds=settings.THUMBNAIL_FAILURE_TIMEOUT
+    )
+    if thumbnail.failed and thumbnail.created_at < retry:
+        return None
+    return thumbnail
+
+
+def store(document_file, kind, data):
+    # ``data`` None records a failed rendering.
+    name = ""
+    if data is not None:
+        storage = document_file.file.storage
+        name = thumbnail_name(document_file.file.name, kind)
+        if storage.exists(name):
+            storage.delete(name)
+        name = storage.save(name, ContentFile(data))
+    now = timezone.now()
+    thumbnail, created = Thumbnail.objects.update_or_create(
+        document_file=document_file,
+        kind=kind,
+        defaults={
+            "name": name,
+            "storage": document_file.storage,
+            "source": document_file.file.name,
+            "size": len(data or b""),
+            "failed": data is None,
+            "created_at": now,
+            "accessed_at": now,
+        },
+    )
+    return thumbnail
+
+
+def generate(document_file, kind):
+    data = render(document_file.file.name, document_file.storage, kind)
+    thumbnail = store(document_file, kind, data)
+    evict()
+    return thumbnail
+
+
+def request(document_file, kind, generate_missing=True):
+    # The image if it is cached; otherwise a background worker renders it
+    # and None is returned. Without a queue this request renders it instead,
+    # unless ``generate_missing`` is false (pages listing many files).
+    # Raises Unavailable for files that cannot be rendered.
+    if not renderable(document_file.file.name):
+        raise Unavailable
+    thumbnail = lookup(document_file, kind)
+    if thumbnail is None:
+        if thumbnail_queue.enabled:
+            thumbnail_queue.push([document_file.pk, kind])
+            return None
+        if not generate_missing:
+            return None
+        thumbnail = generate(document_file, kind)
+    if thumbnail.failed:
+        raise Unavailable
+    touch(thumbnail)
+    return thumbnail
+
+
+def touch(thumbnail):
+    # Access times only need hour precision for LRU eviction, so most reads
+    # cost no write.
+    now = timezone.now()
+    interval = datetime.timedelta(seconds=settings.THUMBNAIL_TOUCH_INTERVAL)
+    if thumbnail.accessed_at < now - interval:
+        Thumbnail.objects.filter(pk=thumbnail.pk).update(accessed_at=now)
+        thumbnail.accessed_at = now
+
+
+def evict():
+    # Drop the least recently used images until the cache fits its budget;
+    # the files are removed by the Thumbnail post_delete signal.
+    total = Thumbnail.objects.aggregate(total=Sum("size"))["total"] or 0
+    excess = total - settings.THUMBNAIL_CACHE_MAX_BYTES
+    while excess > 0:
+        evicted = []
+        for pk, size in Thumbnail.objects.order_by("accessed_at", "pk").values_list(
+            "pk", "size"
+        )[:EVICTION_BATCH_SIZE]:
+            if excess <= 0:
+                break
+            evicted.append(pk)
+            excess -= size
+        if not evicted:
+            break
+        Thumbnail.objects.filter(pk__in=evicted).delete()
@@ -0,0 +1,194 @@
+import hashlib
+import io
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from netbelge import metrics
+
+from .models import DocumentFile, UploadSession
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset):
+        super().__init__(offset)
+        self.offset = offset
+
+
+class AlreadyCompleted(Exception):
+    pass
+
+
+class LimitedReader(io.RawIOBase):
+    # Reads at most ``limit`` bytes from ``stream`` and counts them.
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.limit - self.count)
+        if size <= 0:
+            return 0
+        data = self.stream.read(size)
+        buffer[: len(data)] = data
+        self.count += len(data)
+        return len(data)
+
+
+class PartsReader(io.RawIOBase):
+    # Streams the stored parts of an upload session in order while hashing,
+    # so the assembled file is never held in memory or on local disk.
+
+    def __init__(self, storage, names):
+        self.storage = storage
+        self.names = iter(names)
+        self.current = None
+        self.position = 0
+        self.sha256 = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if (offset, whence) not in ((0, io.SEEK_SET), (0, io.SEEK_CUR)) or (
+            whence == io.SEEK_SET and self.position
+        ):
+            raise io.UnsupportedOperation("PartsReader can only be rewound at start")
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        while True:
+            if self.current is None:
+                name = next(self.names, None)
+                if name is None:
+                    return 0
+                self.current = self.storage.open(name, "rb")
+            data = self.current.read(len(buffer))
+            if data:
+                buffer[: len(data)] = data
+                self.sha256.update(data)
+                self.position += len(data)
+                return len(data)
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+        super().close()
+
+
+def get_storage():
+    # Parts are kept where the finished file will be stored.
+    return storages[settings.DOCUMENT_FILE_STORAGE]
+
+
+def write_chunk(session_id, offset, stream):
+    storage = get_storage()
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id)
+        if offset != session.offset:
+            raise OffsetMismatch(session.offset)
+
+        name = session.part_name(session.parts)
+        if storage.exists(name):
+            storage.delete(name)
+        reader = LimitedReader(
+            stream,
+            min(settings.UPLOAD_CHUNK_MAX_SIZE, session.size - session.offset),
+        )
+        start = time.perf_counter()
+        storage.save(name, File(io.BufferedReader(reader), name=name))
+        metrics.record_storage(
+            "write",
+            settings.DOCUMENT_FILE_STORAGE,
+            reader.count,
+            time.perf_counter() - start,
+        )
+        if reader.count:
+            session.offset += reader.count
+            session.parts += 1
+            session.save(update_fields=["offset", "parts", "updated_at"])
+        else:
+            storage.delete(name)
+    return session
+
+
+def discard(session):
+    # The parts are removed once the session row is gone for good.
+    storage = get_storage()
+    names = [session.part_name(index) for index in range(session.parts)]
+    session.delete()
+
+    def delete_parts():
+        for name in names:
+            storage.delete(name)
+
+    transaction.on_commit(delete_parts)
+
+
+def complete(session_id, user):
+    storage = get_storage()
+    with transaction.atomic():
+        # A second request for the same session waits here and then finds
+        # it gone.
+        session = (
+            UploadSession.objects.select_for_update()
+            .select_related("document")
+            .filter(pk=session_id)
+            .first()
+        )
+        if session is None:
+            raise AlreadyCompleted
+        if session.offset != session.size:
+            raise ValidationError(_("Dosyanın tamamı yüklenmedi."))
+
+        reader = PartsReader(
+            storage, [session.part_name(index) for index in range(session.parts)]
+        )
+        document_file = DocumentFile(
+            document=session.document,
+            storage=settings.DOCUMENT_FILE_STORAGE,
+            size=session.size,
+            created_by=user,
+            updated_by=user,
+        )
+        content = File(io.BufferedReader(reader), name=session.filename)
+        content.size = session.size
+        document_file.file.save(session.filename, content, save=False)
+        reader.close()
+
+        verified = (
+            reader.position == session.size
+            and reader.sha256.hexdigest() == session.checksum
+        )
+        try:
+            if verified:
+                document_file.save()
+            discard(session)
+        except Exception:
+            verified = False
+            raise
+        finally:
+            if not verified:
+                document_file.file.delete(save=False)
+
+    if not verified:
+        raise ValidationError(_("Dosya sağlaması doğrulanamadı."))
+    return document_file
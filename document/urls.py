@@ -0,0 +1,38 @@
+from django.urls import path
+from rest_framework.routers import DefaultRouter
+
+from . import async_views, views
+
+router = DefaultRouter()
+router.register("documents", views.DocumentViewSet, basename="document")
+router.register("files", views.DocumentFileViewSet, basename="documentfile")
+router.register("document-types", views.DocumentTypeViewSet, basename="documenttype")
+router.register("uploads", views.UploadSessionViewSet, basename="upload")
+router.register(
+    "statistics", views.DepartmentStatisticsViewSet, basename="departmentstatistics"
+)
+
+urlpatterns = router.urls + [
+    path(
+        "files/<int:pk>/download/",
+        views.download_file,
+        name="documentfile-download",
+    ),
+    path(
+        "files/<int:pk>/thumbnail/",
+        views.thumbnail,
+        name="documentfile-thumbnail",
+    ),
+    # Async endpoints for the ASGI (uvicorn worker) deployment.
+    path("async/documents/", async_views.document_list, name="async-document-list"),
+    path(
+        "async/documents/<int:pk>/",
+        async_views.document_detail,
+        name="async-document-detail",
+    ),
+    path(
+        "async/files/<int:pk>/download/",
+        async_views.download_file,
+        name="async-documentfile-download",
+    ),
+]
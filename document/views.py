@@ -1,3 +1,263 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, permission_required
+from django.core.exceptions import ValidationError
+from django.core.files.storage import storages
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
 
-# Create your views here.
+from account.models import Department
+from netbelge.api import CachedRetrieveMixin, CursorPagination, ModelViewPermissions
+
+from . import downloads, statistics, thumbnails, uploads
+from .cache import document_cache, file_cache
+from .models import (
+    DepartmentStatistics,
+    Document,
+    DocumentFile,
+    DocumentType,
+    Thumbnail,
+    UploadSession,
+)
+from .serializers import (
+    DepartmentStatisticsSerializer,
+    DocumentFileListSerializer,
+    DocumentFileSerializer,
+    DocumentSerializer,
+    DocumentTypeSerializer,
+    UploadSessionSerializer,
+)
+
+
+def filter_department(request, queryset):
+    # ?department=<id> matches that department only; adding ?subtree=1
+    # includes every descendant through the mptt lft/rght range.
+    department_id = request.query_params.get("department")
+    if not department_id:
+        return queryset
+    if request.query_params.get("subtree") not in ("1", "true"):
+        return queryset.filter(department_id=department_id)
+    department = get_object_or_404(
+        Department.objects.only("tree_id", "lft", "rght"), pk=department_id
+    )
+    return queryset.in_subtree(department)
+
+
+def document_filters(params):
+    lookups = {}
+    if params.get("document_no"):
+        lookups["document_no"] = params["document_no"]
+    if params.get("document_type"):
+        lookups["document_type_id"] = params["document_type"]
+    if params.get("date_from"):
+        lookups["date__gte"] = params["date_from"]
+    if params.get("date_to"):
+        lookups["date__lte"] = params["date_to"]
+    return lookups
+
+
+class DocumentPagination(CursorPagination):
+    ordering = ("-date", "-id")
+
+
+class IdPagination(CursorPagination):
+    ordering = ("-id",)
+
+
+class DocumentViewSet(CachedRetrieveMixin, viewsets.ReadOnlyModelViewSet):
+    object_cache = document_cache
+    serializer_class = DocumentSerializer
+    permission_classes = (permissions.IsAuthenticated, ModelViewPermissions)
+    pagination_class = DocumentPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = filter_department(
+            self.request, Document.objects.select_related("department", "document_type")
+        )
+        fields = params.get("fields")
+        if not fields or "files" in fields.split(","):
+            queryset = queryset.prefetch_related(
+                Prefetch("files", queryset=DocumentFile.objects.defer("content"))
+            )
+        return queryset.filter(**document_filters(params))
+
+    def get_last_modified(self, obj):
+        return max(
+            [
+                obj.updated_at,
+                obj.department.updated_at,
+                obj.document_type.updated_at,
+                *(file.updated_at for file in obj.files.all()),
+            ]
+        )
+
+
+class DocumentFileViewSet(CachedRetrieveMixin, viewsets.ReadOnlyModelViewSet):
+    object_cache = file_cache
+    permission_classes = (permissions.IsAuthenticated, ModelViewPermissions)
+    pagination_class = IdPagination
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return DocumentFileListSerializer
+        return DocumentFileSerializer
+
+    def get_queryset(self):
+        queryset = DocumentFile.objects.all()
+        if self.action == "list":
+            queryset = queryset.defer("content")
+        if self.request.query_params.get("document"):
+            queryset = queryset.filter(
+                document_id=self.request.query_params["document"]
+            )
+        return queryset
+
+
+class DocumentTypeViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = DocumentTypeSerializer
+    permission_classes = (permissions.IsAuthenticated, ModelViewPermissions)
+    pagination_class = IdPagination
+
+    def get_queryset(self):
+        return filter_department(
+            self.request, DocumentType.objects.select_related("department")
+        )
+
+
+class StatisticsPagination(CursorPagination):
+    ordering = ("department_id",)
+
+
+class DepartmentStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
+    # Subtree totals read from the rollup table: the list returns one row per
+    # department (the children of ?parent=<id>, or the roots with ?parent=),
+    # and a detail adds the per-type and per-month breakdown.
+    serializer_class = DepartmentStatisticsSerializer
+    permission_classes = (permissions.IsAuthenticated, ModelViewPermissions)
+    pagination_class = StatisticsPagination
+    lookup_field = "department"
+
+    def get_queryset(self):
+        queryset = DepartmentStatistics.objects.filter(bucket=statistics.TOTAL)
+        if "parent" in self.request.query_params:
+            parent = self.request.query_params["parent"]
+            if parent:
+                queryset = queryset.filter(department__parent_id=parent)
+            else:
+                queryset = queryset.filter(department__parent__isnull=True)
+        return queryset
+
+    def retrieve(self, request, department=None):
+        department = get_object_or_404(Department.objects.only("pk"), pk=department)
+        return Response(
+            {
+                "department": department.pk,
+                **statistics.subtree_breakdown(department.pk),
+            }
+        )
+
+
+class CanAddDocumentFile(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.has_perm("document.add_documentfile")
+
+
+class UploadSessionViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    serializer_class = UploadSessionSerializer
+    permission_classes = (permissions.IsAuthenticated, CanAddDocumentFile)
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    @action(detail=True, methods=["put"], parser_classes=())
+    def chunk(self, request, pk=None):
+        session = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            raise ParseError("Upload-Offset başlığı gerekli.")
+
+        try:
+            session = uploads.write_chunk(session.pk, offset, request.stream)
+        except uploads.OffsetMismatch as exc:
+            return Response({"offset": exc.offset}, status=status.HTTP_409_CONFLICT)
+        return Response({"offset": session.offset})
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        session = self.get_object()
+        try:
+            document_file = uploads.complete(session.pk, request.user)
+        except uploads.AlreadyCompleted:
+            return Response(
+                {"detail": "Yükleme oturumu zaten tamamlandı."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except ValidationError as exc:
+            return Response(
+                {"detail": exc.messages}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            DocumentFileSerializer(document_file, context={"request": request}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+@login_required
+@permission_required("document.view_documentfile", raise_exception=True)
+def download_file(request, pk):
+    document_file = get_object_or_404(DocumentFile, pk=pk)
+    return downloads.serve(
+        request, document_file, as_attachment="inline" not in request.GET
+    )
+
+
+@login_required
+@permission_required("document.view_documentfile", raise_exception=True)
+def thumbnail(request, pk):
+    kind = request.GET.get("kind", "thumbnail")
+    if kind not in settings.THUMBNAIL_SIZES:
+        return HttpResponse(status=400)
+    document_file = get_object_or_404(
+        DocumentFile.objects.only("pk", "file", "storage").prefetch_related(
+            Prefetch("thumbnails", queryset=Thumbnail.objects.filter(kind=kind))
+        ),
+        pk=pk,
+    )
+    try:
+        image = thumbnails.request(document_file, kind)
+    except thumbnails.Unavailable:
+        raise Http404("Bu dosyanın önizlemesi yok.")
+    if image is None:
+        # Being rendered in the background.
+        response = HttpResponse(status=202)
+        response["Retry-After"] = "5"
+        return response
+
+    etag = quote_etag(f"{image.pk}-{image.created_at.timestamp():.6f}")
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(
+            storages[image.storage].open(image.name, "rb"), content_type="image/jpeg"
+        )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import transaction
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.timeout if self.timeout else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    # A per-process LRU in front of a shared Django cache (Redis in
+    # production). Shared entries are namespaced by a generation counter that
+    # ``clear`` bumps and a per-key version that ``delete`` bumps. Local
+    # entries remember both and are checked against the shared counters on
+    # every hit (one get_many), so an invalidation made by any process takes
+    # effect everywhere at once; ``local_timeout`` only bounds memory use.
+    #
+    # Invalidations run immediately and again when the surrounding
+    # transaction commits: a concurrent reader may re-cache the old value
+    # from the database until then.
+
+    def __init__(
+        self, prefix, alias="default", maxsize=1024, timeout=None, local_timeout=30
+    ):
+        self.prefix = prefix
+        self.alias = alias
+        self.timeout = timeout
+        self.local = LRUCache(maxsize=maxsize, timeout=local_timeout)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _generation_key(self):
+        return f"{self.prefix}:generation"
+
+    def _version_key(self, key):
+        return f"{self.prefix}:{key}:version"
+
+    def _stamp(self, key):
+        # (generation, version) of ``key`` as currently seen by all processes.
+        generation_key = self._generation_key()
+        version_key = self._version_key(key)
+        counters = self.shared.get_many([generation_key, version_key])
+        return counters.get(generation_key, 0), counters.get(version_key, 0)
+
+    def get_or_set(self, key, default):
+        stamp = self._stamp(key)
+        entry = self.local.get(key)
+        if entry is not None and entry[1] == stamp:
+            return entry[0]
+
+        shared_key = f"{self.prefix}:{stamp[0]}:{key}:{stamp[1]}"
+        value = self.shared.get(shared_key)
+        if value is None:
+            value = default()
+            self.shared.set(shared_key, value, timeout=self.timeout)
+        self.local.set(key, (value, stamp))
+        return value
+
+    def _bump(self, counter):
+        try:
+            self.shared.incr(counter)
+        except ValueError:
+            self.shared.set(counter, 1, timeout=None)
+
+    def _invalidate(self, counter):
+        self._bump(counter)
+        transaction.on_commit(lambda: self._bump(counter))
+
+    def delete(self, key):
+        self.local.delete(key)
+        self._invalidate(self._version_key(key))
+
+    def clear(self):
+        self.local.clear()
+        self._invalidate(self._generation_key())
+
+
+class ObjectCache:
+    # Shared cache of per-object values that may have several variants (for
+    # example one per host). ``invalidate`` bumps the object's version and
+    # ``clear`` bumps the version of the whole prefix, so every variant is
+    # dropped without knowing its key. There is no local layer: a response
+    # must never be served after its object has changed.
+
+    def __init__(self, prefix, alias="default", timeout=None):
+        self.prefix = prefix
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _key(self, key, variant):
+        generation_key = f"{self.prefix}:generation"
+        version_key = f"{self.prefix}:{key}:version"
+        versions = self.shared.get_many([generation_key, version_key])
+        return (
+            f"{self.prefix}:{versions.get(generation_key, 0)}:{key}:"
+            f"{versions.get(version_key, 0)}:{variant}"
+        )
+
+    def get(self, key, variant=""):
+        return self.shared.get(self._key(key, variant))
+
+    def set(self, key, value, variant=""):
+        self.shared.set(self._key(key, variant), value, timeout=self.timeout)
+
+    def _bump(self, key):
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            self.shared.set(key, 1, timeout=None)
+
+    def invalidate(self, key):
+        self._bump(f"{self.prefix}:{key}:version")
+
+    def clear(self):
+        self._bump(f"{self.prefix}:generation")
@@ -0,0 +1,226 @@
+import contextvars
+import functools
+import math
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.signals import connection_created
+
+# Read/write splitting between the primary and DATABASE_REPLICAS. Only reads
+# made while serving a request go to a replica; commands and queue workers
+# always use the primary. A request that writes pins the rest of itself to
+# the primary, and a cookie keeps the client there until the replicas have
+# caught up with the write. Only statements the primary actually ran count as
+# writes; asking the router for the write database does not.
+
+STICKY_COOKIE = "netbelge_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Statements that do not change data; anything else run on the primary
+# during a request pins it.
+READ_STATEMENTS = (
+    "SELECT",
+    "SAVEPOINT",
+    "RELEASE",
+    "ROLLBACK",
+    "BEGIN",
+    "SET",
+    "SHOW",
+    "EXPLAIN",
+)
+
+LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM now() - "
+    "pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class RoutingState:
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+current_state = contextvars.ContextVar("netbelge_routing_state", default=None)
+
+_lag_lock = threading.Lock()
+_lag = {}
+
+
+def replica_lag(alias):
+    # Seconds the replica is behind the primary, checked at most every
+    # REPLICA_LAG_CHECK_INTERVAL seconds per process. A replica that cannot
+    # be asked counts as infinitely behind, so reads fail over to the primary.
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag.get(alias)
+    if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+
+    lag = 0.0
+    connection = connections[alias]
+    try:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = float(cursor.fetchone()[0] or 0)
+    except DatabaseError:
+        lag = math.inf
+    with _lag_lock:
+        _lag[alias] = (now, lag)
+    return lag
+
+
+def available_replicas():
+    return [
+        alias
+        for alias in settings.DATABASE_REPLICAS
+        if replica_lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS
+    ]
+
+
+def sticky_seconds():
+    # Long enough for every usable replica to have replayed the write.
+    lags = [replica_lag(alias) for alias in available_replicas()]
+    return max([settings.REPLICA_STICKY_SECONDS, *lags])
+
+
+def record_write(execute, sql, params, many, context):
+    # Runs for every query on every connection; the routing state is found
+    # through the context variable from sync_to_async threads as well.
+    result = execute(sql, params, many, context)
+    state = current_state.get()
+    if (
+        state is not None
+        and context["connection"].alias == DEFAULT_DB_ALIAS
+        and not str(sql).lstrip().upper().startswith(READ_STATEMENTS)
+    ):
+        # Reads that follow a write in the same request must see it.
+        state.pinned = state.wrote = True
+    return result
+
+
+def install_write_recorder(connection, **kwargs):
+    if record_write not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_write)
+
+
+connection_created.connect(install_write_recorder)
+for connection in connections.all(initialized_only=True):
+    install_write_recorder(connection)
+
+
+_inherited_connections = []
+
+
+def discard_inherited_connections():
+    # Initializer for ProcessPoolExecutor workers. A forked worker inherits
+    # the parent's open connections, whose sockets and handles it must not
+    # use; closing them would also end the parent's sessions. They are kept
+    # aside untouched and every alias opens a new connection in the worker
+    # when it needs one (deduplicated storages query their references).
+    for alias in connections:
+        _inherited_connections.append(connections[alias])
+        del connections[alias]
+
+
+def closing_connections(func):
+    # For work handed to pool threads. Each thread opens its own database
+    # connections (deduplicated storages query their references), and
+    # nothing else would close them.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_state.get()
+        if (
+            state is None
+            or state.pinned
+            or not settings.DATABASE_REPLICAS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        replicas = available_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class PrimaryReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = current_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = current_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.finish(response, state)
+
+    def start(self, request):
+        try:
+            sticky_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            sticky_until = 0
+        return RoutingState(
+            pinned=request.method not in SAFE_METHODS or sticky_until > time.time()
+        )
+
+    def finish(self, response, state):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            seconds = sticky_seconds()
+            response.set_cookie(
+                STICKY_COOKIE,
+                f"{time.time() + seconds:.3f}",
+                max_age=math.ceil(seconds),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,331 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import cached_property
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("netbelge.slow_query")
+
+# Production-safe request instrumentation exported in the Prometheus text
+# format. Samples are kept in process memory; with REDIS_URL every process
+# adds its deltas to one shared Redis hash every METRICS_FLUSH_INTERVAL
+# seconds, so a scrape of any worker sees the whole deployment.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+METRICS = {
+    "netbelge_requests_total": ("counter", "HTTP requests by view and status."),
+    "netbelge_request_duration_seconds": ("histogram", "HTTP request latency."),
+    "netbelge_db_queries_total": ("counter", "Database queries by view."),
+    "netbelge_db_query_duration_seconds_total": (
+        "counter",
+        "Time spent in database queries by view.",
+    ),
+    "netbelge_db_slow_queries_total": (
+        "counter",
+        "Queries slower than METRICS_SLOW_QUERY_SECONDS by view.",
+    ),
+    "netbelge_storage_bytes_total": ("counter", "Bytes read from/written to storage."),
+    "netbelge_storage_duration_seconds": ("histogram", "Storage operation latency."),
+}
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def sample_key(name, **labels):
+    # The exposition line without its value; histogram buckets keep "le"
+    # as their last label.
+    if not labels:
+        return name
+    pairs = ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+    return f"{name}{{{pairs}}}"
+
+
+class Registry:
+    def __init__(self, key="netbelge:metrics"):
+        self.key = key
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        self.pending = defaultdict(float)
+        self.flushed_at = time.monotonic()
+
+    @cached_property
+    def client(self):
+        return redis.Redis.from_url(settings.REDIS_URL)
+
+    def inc(self, name, value=1, **labels):
+        key = sample_key(name, **labels)
+        with self.lock:
+            self.values[key] += value
+            self.pending[key] += value
+        self.maybe_flush()
+
+    def observe(self, name, value, **labels):
+        # Cumulative buckets: only the first bucket holding the value is
+        # counted here, the rest is summed when rendering.
+        index = bisect.bisect_left(BUCKETS, value)
+        le = str(BUCKETS[index]) if index < len(BUCKETS) else "+Inf"
+        keys = (
+            sample_key(f"{name}_bucket", **labels, le=le),
+            sample_key(f"{name}_sum", **labels),
+            sample_key(f"{name}_count", **labels),
+        )
+        with self.lock:
+            for key, amount in zip(keys, (1, value, 1)):
+                self.values[key] += amount
+                self.pending[key] += amount
+        self.maybe_flush()
+
+    def maybe_flush(self, force=False):
+        if not settings.REDIS_URL:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(float)
+            self.flushed_at = now
+        if not pending:
+            return
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for key, value in pending.items():
+                pipeline.hincrbyfloat(self.key, key, value)
+            pipeline.execute()
+        except redis.RedisError:
+            logger.exception("Could not flush %d metric samples", len(pending))
+            with self.lock:
+                for key, value in pending.items():
+                    self.pending[key] += value
+
+    def collect(self):
+        if not settings.REDIS_URL:
+            with self.lock:
+                return dict(self.values)
+        self.maybe_flush(force=True)
+        return {
+            key.decode(): float(value)
+            for key, value in self.client.hgetall(self.key).items()
+        }
+
+    def render(self):
+        families = defaultdict(list)
+        for key, value in self.collect().items():
+            name = key.partition("{")[0]
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+                    name = name[: -len(suffix)]
+            families[name].append((key, value))
+
+        lines = []
+        for name, samples in sorted(families.items()):
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == "histogram":
+                samples = cumulative_buckets(name, samples)
+            else:
+                samples = sorted(samples)
+            lines += [f"{key} {float(value)!r}" for key, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+def cumulative_buckets(name, samples):
+    # Stored bucket counts are per bucket; the exposition format wants each
+    # bucket to include every smaller one, up to an explicit +Inf bucket.
+    prefix = f"{name}_bucket{{"
+    series = defaultdict(dict)
+    result = []
+    for key, value in samples:
+        if key.startswith(prefix):
+            labels, _, le = key[len(prefix) : -1].rpartition('le="')
+            series[labels][le[:-1]] = value
+        else:
+            result.append((key, value))
+    result.sort()
+    bounds = [str(bound) for bound in BUCKETS] + ["+Inf"]
+    for labels, counts in sorted(series.items()):
+        total = 0
+        for bound in bounds:
+            total += counts.get(bound, 0)
+            result.append((f'{prefix}{labels}le="{bound}"}}', total))
+    return result
+
+
+registry = Registry()
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "view")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.view = "unmatched"
+
+
+current_request = contextvars.ContextVar("netbelge_request_stats", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every database connection. Context variables follow the
+    # request into sync_to_async threads, so async views are counted too.
+    stats = current_request.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += duration
+        if duration >= settings.METRICS_SLOW_QUERY_SECONDS:
+            view = stats.view if stats is not None else "-"
+            registry.inc("netbelge_db_slow_queries_total", view=view)
+            slow_query_logger.warning(
+                "Slow query (%.3fs) in %s: %s", duration, view, sql[:2000]
+            )
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+for connection in connections.all(initialized_only=True):
+    install_query_recorder(connection)
+
+
+def record_storage(operation, storage, size, duration):
+    registry.inc(
+        "netbelge_storage_bytes_total", size, operation=operation, storage=storage
+    )
+    registry.observe(
+        "netbelge_storage_duration_seconds",
+        duration,
+        operation=operation,
+        storage=storage,
+    )
+
+
+class MeteredFile:
+    # Wraps a file opened from a storage and records the bytes read and the
+    # time spent in read() once it is closed.
+
+    def __init__(self, file, storage):
+        self.file = file
+        self.storage = storage
+        self.bytes_read = 0
+        self.duration = 0.0
+
+    def read(self, *args):
+        start = time.perf_counter()
+        data = self.file.read(*args)
+        self.duration += time.perf_counter() - start
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        if self.bytes_read:
+            record_storage("read", self.storage, self.bytes_read, self.duration)
+            self.bytes_read = 0
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    def start(self):
+        stats = RequestStats()
+        return stats, current_request.set(stats), time.perf_counter()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Label by route name, never by path, to keep cardinality bounded.
+        stats = current_request.get()
+        if stats is not None:
+            stats.view = request.resolver_match.view_name or "unnamed"
+
+    def finish(self, request, response, stats, start):
+        # Streaming bodies are timed until the response starts.
+        duration = time.perf_counter() - start
+        labels = {"view": stats.view, "method": request.method}
+        registry.inc(
+            "netbelge_requests_total",
+            **labels,
+            status=f"{response.status_code // 100}xx",
+        )
+        registry.observe("netbelge_request_duration_seconds", duration, **labels)
+        registry.inc("netbelge_db_queries_total", stats.queries, **labels)
+        registry.inc(
+            "netbelge_db_query_duration_seconds_total", stats.query_time, **labels
+        )
+
+
+def scrape_allowed(request):
+    # REMOTE_ADDR is the proxy's address behind nginx, which must therefore
+    # deny /metrics itself; the token works through any proxy.
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return True
+    return request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+
+
+def export(request):
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,13 +1,18 @@
+import functools
 import re
 
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+TR_MAP = str.maketrans("ğĞıİöÖüÜşŞçÇ", "ggiioouusscc")
+
+
+def fold_turkish(text: str) -> str:
+    return text.translate(TR_MAP).lower()
+
 
 def normalize_path(name: str) -> str:
-    tr_map = name.maketrans("ğĞıİöÖüÜşŞçÇ", "ggiioouusscc")
-    path = name.translate(tr_map)
-    path = path.lower().replace(" ", "-")
+    path = fold_turkish(name).replace(" ", "-")
     parts = path.split("-")
     path = "-".join([part.replace("-", "") for part in parts if part])
     if path.startswith("/") or path.startswith("-"):
@@ -25,6 +30,51 @@ def normalize_path(name: str) -> str:
     return path
 
 
+PLACEHOLDER_RE = re.compile(r"{(\w+)}")
+VALID_PATH_RE = re.compile(r"[a-z0-9](?:[a-z0-9/-]*[a-z0-9])?")
+
+# Supported placeholders and the sample values used while validating a path.
+PLACEHOLDERS = {
+    "yil": "yil",
+    "ay": "ay",
+    "gun": "gun",
+    "saat": "saat",
+    "dakika": "dakika",
+    "saniye": "saniye",
+    "belge_turu": "belge-turu",
+    "belge_no": "belge-no",
+}
+
+
+class PathTemplate:
+    __slots__ = ("template", "segments", "placeholders")
+
+    def __init__(self, template: str):
+        self.template = template
+        segments = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(template):
+            if match.start() > position:
+                segments.append((template[position : match.start()], None))
+            segments.append((None, match.group(1)))
+            position = match.end()
+        if position < len(template):
+            segments.append((template[position:], None))
+        self.segments = tuple(segments)
+        self.placeholders = frozenset(name for _, name in segments if name)
+
+    def render(self, context: dict) -> str:
+        return "".join(
+            literal if name is None else context.get(name, f"{{{name}}}")
+            for literal, name in self.segments
+        )
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_path_template(template: str) -> PathTemplate:
+    return PathTemplate(template)
+
+
 def validate_path(value):
     # Rules for path:
     # - Must be unique
@@ -33,61 +83,26 @@ def validate_path(value):
     # - Must not contain special characters only letters, numbers and hyphen and /
     # - Must not start with hyphen or /
     # - Must not end with hyphen or /
-    # - Must have placeholder value {yil} {ay} {gun} {saat} {dakika} {saniye} {belge_turu} {belge_no}
+    # - May only use the placeholders in PLACEHOLDERS {yil} {ay} {gun} {saat} {dakika} {saniye} {belge_turu} {belge_no}
     # - Must not contain Turkish characters
-    allowed_chars = "abcdefghijklmnopqrstuvwxyz0123456789/-"
-    # replace {yil} {ay} {gun} {saat} {dakika} {saniye} {belge_turu} {belge_no}
-    placeholders = [
-        "{yil}",
-        "{ay}",
-        "{gun}",
-        "{saat}",
-        "{dakika}",
-        "{saniye}",
-        "{belge_turu}",
-        "{belge_no}",
-    ]
-
-    placeholders_default = {
-        "{yil}": "yil",
-        "{ay}": "ay",
-        "{gun}": "gun",
-        "{saat}": "saat",
-        "{dakika}": "dakika",
-        "{saniye}": "saniye",
-        "{belge_turu}": "belge-turu",
-        "{belge_no}": "belge-no",
-    }
-    # find all placeholders
-    found_placeholders = re.findall(r"{\w+}", value)
-    # check if all placeholders are valid
-    for placeholder in found_placeholders:
-        if placeholder not in placeholders:
+    template = compile_path_template(value)
+    for _literal, name in template.segments:
+        if name is not None and name not in PLACEHOLDERS:
             raise ValidationError(
-                _("Geçersiz değişken: {placeholder}").format(placeholder=placeholder)
+                _("Geçersiz değişken: {placeholder}").format(placeholder=f"{{{name}}}")
             )
 
-    value = value.replace("{yil}", "yil")
-    value = value.replace("{ay}", "ay")
-    value = value.replace("{gun}", "gun")
-    value = value.replace("{saat}", "saat")
-    value = value.replace("{dakika}", "dakika")
-    value = value.replace("{saniye}", "saniye")
-    value = value.replace("{belge_turu}", "belge-turu")
-    value = value.replace("{belge_no}", "belge-no")
+    value = template.render(PLACEHOLDERS)
 
     if len(value) > 63:
         raise ValidationError(_("Dosya yolu en fazla 63 karakter olmalıdır."))
     if len(value) < 3:
         raise ValidationError(_("Dosya yolu en az 3 karakter olmalıdır."))
 
-    if value[0] in "-/":
-        raise ValidationError(_("Dosya yolu - veya / ile başlayamaz."))
-    if value[-1] in "-/":
-        raise ValidationError(_("Dosya yolu - veya / ile bitemez."))
-    for char in value:
-        if char not in allowed_chars:
-            raise ValidationError(
-                _("Dosya yolu sadece harf, rakam, - ve / içerebilir.")
-            )
+    if not VALID_PATH_RE.fullmatch(value):
+        if value[0] in "-/":
+            raise ValidationError(_("Dosya yolu - veya / ile başlayamaz."))
+        if value[-1] in "-/":
+            raise ValidationError(_("Dosya yolu - veya / ile bitemez."))
+        raise ValidationError(_("Dosya yolu sadece harf, rakam, - ve / içerebilir."))
     return value
@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import socket
+from functools import cached_property
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    # A Redis list used as a FIFO job queue. Jobs are JSON encoded. When
+    # REDIS_URL is not configured pushes are dropped, so callers on the
+    # request path never fail because the queue is unavailable.
+    #
+    # Popped jobs are moved to a processing list of the consumer and stay
+    # there until ack(). A consumer refreshes a lease on every pop; the jobs
+    # of one whose lease has expired (it died or hung mid-batch) are put back
+    # on the queue by recover(), which idle consumers run.
+
+    def __init__(self, name):
+        self.name = name
+        self.key = f"netbelge:queue:{name}"
+
+    @cached_property
+    def processing_key(self):
+        return f"{self.key}:processing:{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def enabled(self):
+        return bool(settings.REDIS_URL)
+
+    @cached_property
+    def client(self):
+        return redis.Redis.from_url(settings.REDIS_URL)
+
+    def push(self, *jobs):
+        if not jobs or not self.enabled:
+            return
+        try:
+            self.client.rpush(self.key, *(json.dumps(job) for job in jobs))
+        except redis.RedisError:
+            logger.exception("Could not enqueue %d job(s) on %s", len(jobs), self.name)
+
+    def pop(self, count=1, timeout=5):
+        self.client.set(
+            f"{self.processing_key}:lease", 1, ex=settings.JOB_QUEUE_LEASE_SECONDS
+        )
+        item = self.client.blmove(
+            self.key, self.processing_key, timeout, "LEFT", "RIGHT"
+        )
+        if item is None:
+            self.recover()
+            return []
+        items = [item]
+        if count > 1:
+            with self.client.pipeline() as pipe:
+                for _ in range(count - 1):
+                    pipe.lmove(self.key, self.processing_key, "LEFT", "RIGHT")
+                items += [item for item in pipe.execute() if item is not None]
+        return [json.loads(item) for item in items]
+
+    def ack(self):
+        # Everything popped by this consumer so far has been handled.
+        self.client.delete(self.processing_key)
+
+    def recover(self):
+        for key in self.client.scan_iter(f"{self.key}:processing:*"):
+            key = key.decode()
+            if key.endswith(":lease") or self.client.exists(f"{key}:lease"):
+                continue
+            # Oldest jobs go back to the front of the queue, in order.
+            while self.client.lmove(key, self.key, "RIGHT", "LEFT") is not None:
+                pass
+
+    def __len__(self):
+        return self.client.llen(self.key)
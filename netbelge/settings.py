@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -21,11 +22,14 @@ INSTALLED_APPS = [
     "debug_toolbar",
     "mptt",
     "django_mptt_admin",
+    "rest_framework",
     "account.apps.AccountConfig",
     "document.apps.DocumentConfig",
 ]
 
 MIDDLEWARE = [
+    "netbelge.metrics.MetricsMiddleware",
+    "netbelge.db.PrimaryReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -72,6 +76,122 @@ DATABASES = {
     }
 }
 
+if os.environ.get("POSTGRES_DB"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ["POSTGRES_DB"],
+        "USER": os.environ.get("POSTGRES_USER", ""),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", ""),
+        "PORT": os.environ.get("POSTGRES_PORT", ""),
+        # Sync workers keep their connection between requests; an unusable
+        # one is replaced before the next request runs a query.
+        "CONN_MAX_AGE": int(os.environ.get("POSTGRES_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    if os.environ.get("POSTGRES_POOL_SIZE"):
+        # ASGI (and threaded) workers share a psycopg connection pool per
+        # process instead; Django requires CONN_MAX_AGE = 0 with a pool.
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": 1,
+                "max_size": int(os.environ["POSTGRES_POOL_SIZE"]),
+                "timeout": 10,
+            }
+        }
+
+    # Streaming replicas as comma separated host[:port][/name] entries; they
+    # share the primary's credentials and mirror it in tests.
+    for index, replica in enumerate(
+        filter(None, os.environ.get("POSTGRES_REPLICAS", "").split(",")), start=1
+    ):
+        address, _, name = replica.strip().partition("/")
+        host, _, port = address.partition(":")
+        DATABASES[f"replica{index}"] = {
+            **DATABASES["default"],
+            "HOST": host,
+            "PORT": port or DATABASES["default"]["PORT"],
+            "NAME": name or DATABASES["default"]["NAME"],
+            "TEST": {"MIRROR": "default"},
+        }
+
+# Reads made while serving requests go to a replica that is at most
+# REPLICA_MAX_LAG_SECONDS behind (checked every REPLICA_LAG_CHECK_INTERVAL
+# seconds). After a write the client reads from the primary for
+# REPLICA_STICKY_SECONDS, or longer while a replica lags more than that.
+DATABASE_ROUTERS = ["netbelge.db.PrimaryReplicaRouter"]
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+REPLICA_MAX_LAG_SECONDS = 30
+REPLICA_LAG_CHECK_INTERVAL = 5
+REPLICA_STICKY_SECONDS = 5
+
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+if REDIS_URL:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+
+# Seconds a queue worker may spend on one batch before the jobs it holds are
+# handed to another worker.
+JOB_QUEUE_LEASE_SECONDS = 10 * 60
+
+# Resolved department/document type storage paths
+PATH_CACHE_SIZE = 4096
+PATH_CACHE_TIMEOUT = 60 * 60
+PATH_CACHE_LOCAL_TIMEOUT = 30
+DEPARTMENT_TREE_CACHE_TIMEOUT = 60 * 60
+
+# Document changelist: cached counts/date buckets and the planner estimate
+# above which PostgreSQL counts are not computed exactly.
+DOCUMENT_LIST_CACHE_TIMEOUT = 5 * 60
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+REST_FRAMEWORK = {
+    "DEFAULT_PERMISSION_CLASSES": [
+        "rest_framework.permissions.IsAuthenticated",
+    ],
+}
+
+# Per-object API response cache, invalidated by model signals
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Chunked uploads
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024
+
+# Full-text search (PostgreSQL tsvector or SQLite FTS5)
+SEARCH_RESULT_LIMIT = 1000
+
+# Thumbnails and previews: longest edge in pixels per kind, the total size
+# kept before least recently used images are evicted, how often a read
+# refreshes an image's last access time, and how long a failed rendering is
+# remembered before it is tried again.
+THUMBNAIL_SIZES = {"thumbnail": 256, "preview": 1024}
+THUMBNAIL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+THUMBNAIL_TOUCH_INTERVAL = 60 * 60
+THUMBNAIL_FAILURE_TIMEOUT = 24 * 60 * 60
+
+# Prometheus metrics at /metrics: the addresses allowed to scrape and the
+# bearer token a scraper may send instead (neither by default, so the
+# endpoint is closed until one is configured), how often each process adds
+# its samples to the shared Redis hash, and the duration above which a
+# query is logged to "netbelge.slow_query".
+METRICS_ALLOWED_IPS = list(
+    filter(None, os.environ.get("METRICS_ALLOWED_IPS", "").split(","))
+)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+METRICS_FLUSH_INTERVAL = 10
+METRICS_SLOW_QUERY_SECONDS = 0.5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -115,6 +235,12 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
     },
+    "deduplicated": {
+        "BACKEND": "netbelge.storage.DeduplicatedStorage",
+        "OPTIONS": {
+            "backend": "default",
+        },
+    },
     "minio": {
         "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
         "OPTIONS": {
@@ -123,3 +249,13 @@ STORAGES = {
         },
     },
 }
+
+# Storage alias used for DocumentFile.file. Set to "deduplicated" to store
+# each distinct file content once.
+DOCUMENT_FILE_STORAGE = "default"
+
+# File downloads. DOWNLOAD_OFFLOAD may be None (serve with sendfile through
+# the WSGI server), "x-accel-redirect" (nginx, internal location at
+# DOWNLOAD_ACCEL_PREFIX) or "x-sendfile" (Apache/lighttpd).
+DOWNLOAD_OFFLOAD = None
+DOWNLOAD_ACCEL_PREFIX = "/protected/"
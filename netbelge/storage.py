@@ -0,0 +1,208 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from functools import cached_property
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+from django.utils.deconstruct import deconstructible
+
+from . import metrics
+
+
+@deconstructible
+class DeduplicatedStorage(Storage):
+    # Content-addressed storage: every distinct file is stored once in the
+    # ``backend`` storage under its SHA-256 digest, and the readable names
+    # built by upload_to are kept as references to it. A blob is removed
+    # when its last reference is deleted.
+
+    def __init__(self, backend="default", prefix="blobs"):
+        self.backend = backend
+        self.prefix = prefix
+
+    @cached_property
+    def inner(self):
+        return storages[self.backend]
+
+    def blob_name(self, digest):
+        return f"{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+    def digest(self, name):
+        from document.models import BlobReference
+
+        digest = (
+            BlobReference.objects.filter(name=name)
+            .values_list("blob_id", flat=True)
+            .first()
+        )
+        if digest is None:
+            raise FileNotFoundError(name)
+        return digest
+
+    def _open(self, name, mode="rb"):
+        return self.inner.open(self.blob_name(self.digest(name)), mode)
+
+    def _save(self, name, content):
+        from document.models import Blob, BlobReference
+
+        sha256 = hashlib.sha256()
+        size = 0
+        with tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        ) as spool:
+            for chunk in content.chunks():
+                sha256.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+            digest = sha256.hexdigest()
+            blob_name = self.blob_name(digest)
+
+            with transaction.atomic():
+                blob, _ = Blob.objects.select_for_update().get_or_create(
+                    digest=digest, defaults={"size": size}
+                )
+                if not self.inner.exists(blob_name):
+                    spool.seek(0)
+                    self.inner.save(blob_name, File(spool, name=blob_name))
+                BlobReference.objects.create(name=name, blob=blob)
+                Blob.objects.filter(pk=digest).update(refcount=F("refcount") + 1)
+        return name
+
+    def delete(self, name):
+        from document.models import Blob, BlobReference
+
+        with transaction.atomic():
+            reference = BlobReference.objects.filter(name=name).first()
+            if reference is None:
+                return
+            blob = Blob.objects.select_for_update().get(pk=reference.blob_id)
+            reference.delete()
+            if blob.refcount > 1:
+                Blob.objects.filter(pk=blob.pk).update(refcount=F("refcount") - 1)
+            else:
+                blob_name = self.blob_name(blob.pk)
+                blob.delete()
+                transaction.on_commit(lambda: self.inner.delete(blob_name))
+
+    def link(self, name, target):
+        # Another name for the same content: a copy that stores no bytes.
+        from document.models import Blob, BlobReference
+
+        with transaction.atomic():
+            digest = self.digest(name)
+            BlobReference.objects.create(name=target, blob_id=digest)
+            Blob.objects.filter(pk=digest).update(refcount=F("refcount") + 1)
+
+    def exists(self, name):
+        from document.models import BlobReference
+
+        return BlobReference.objects.filter(name=name).exists()
+
+    def size(self, name):
+        from document.models import Blob
+
+        return Blob.objects.values_list("size", flat=True).get(pk=self.digest(name))
+
+    def url(self, name):
+        return self.inner.url(self.blob_name(self.digest(name)))
+
+    def path(self, name):
+        return self.inner.path(self.blob_name(self.digest(name)))
+
+    def get_accessed_time(self, name):
+        return self.inner.get_accessed_time(self.blob_name(self.digest(name)))
+
+    def get_created_time(self, name):
+        return self.inner.get_created_time(self.blob_name(self.digest(name)))
+
+    def get_modified_time(self, name):
+        return self.inner.get_modified_time(self.blob_name(self.digest(name)))
+
+
+class AliasedFieldFile(FieldFile):
+    # Opens the file through the storage alias recorded on the row, so rows
+    # can live in different storages while a migration is in progress. The
+    # storage is looked up on every access: an unpickled or deep-copied row
+    # may not have its alias back yet when its file is restored.
+
+    @property
+    def storage(self):
+        return self.field.storage_for(self.instance)
+
+    @storage.setter
+    def storage(self, value):
+        # FieldFile assigns the field's storage; the row's alias wins.
+        pass
+
+    def save(self, name, content, save=True):
+        # Timed from upload_to to the stored file, without the row save.
+        start = time.perf_counter()
+        super().save(name, content, save=False)
+        metrics.record_storage(
+            "write",
+            getattr(self.instance, self.field.alias_field, None) or "default",
+            getattr(content, "size", None) or 0,
+            time.perf_counter() - start,
+        )
+        if save:
+            self.instance.save()
+
+
+class AliasedFileField(models.FileField):
+    attr_class = AliasedFieldFile
+
+    def __init__(self, *args, alias_field="storage", **kwargs):
+        self.alias_field = alias_field
+        super().__init__(*args, **kwargs)
+
+    def storage_for(self, instance):
+        alias = getattr(instance, self.alias_field, None)
+        return storages[alias] if alias else self.storage
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.alias_field != "storage":
+            kwargs["alias_field"] = self.alias_field
+        return name, path, args, kwargs
+
+
+def copy_file(storage, name, target, max_length=None):
+    # Copy a file to a free name next to ``target`` within the same storage,
+    # without passing the bytes through Python where the backend can avoid
+    # it. Returns the new name.
+    target = Storage.get_available_name(storage, target, max_length=max_length)
+    if isinstance(storage, DeduplicatedStorage):
+        storage.link(name, target)
+    elif isinstance(storage, FileSystemStorage):
+        path = storage.path(target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(storage.path(name), path)
+        except OSError:
+            shutil.copyfile(storage.path(name), path)
+    elif hasattr(storage, "bucket"):
+        # S3 and MinIO copy the object on the server. The managed copy splits
+        # objects above the multipart threshold into part copies; a single
+        # CopyObject request is limited to 5 GB.
+        from storages.utils import clean_name
+
+        storage.bucket.copy(
+            {
+                "Bucket": storage.bucket_name,
+                "Key": storage._normalize_name(clean_name(name)),
+            },
+            storage._normalize_name(clean_name(target)),
+            ExtraArgs=storage.get_object_parameters(target),
+            Config=storage.transfer_config,
+        )
+    else:
+        with storage.open(name, "rb") as file:
+            target = storage.save(target, file, max_length=max_length)
+    return target
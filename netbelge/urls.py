@@ -2,8 +2,13 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from . import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics.export, name="metrics"),
+    path("api/", include("account.urls")),
+    path("api/", include("document.urls")),
 ]
 
 if settings.DEBUG: